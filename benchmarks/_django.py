@@ -0,0 +1,58 @@
+"""
+Общая подготовка окружения для бенчмарков.
+
+Бенчмарки запускаются как модули (`python -m benchmarks.bench_pagination`)
+и работают на отдельной тестовой базе, которая удаляется по завершении.
+"""
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mainapp.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment  # noqa: E402
+
+
+@contextlib.contextmanager
+def test_database():
+    """
+    Создает тестовую базу и окружение тестового клиента на время бенчмарка.
+
+    Кеши — в отдельном временном каталоге: общие файлы кеша сервера могли
+    бы хранить версии и ответы от прошлой базы с теми же id.
+    """
+    directory = tempfile.mkdtemp(prefix='forum-bench-cache-')
+    isolated = {alias: {**config, 'LOCATION': os.path.join(directory, alias)} for alias, config in settings.CACHES.items()}
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with override_settings(CACHES=isolated):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def timed(func, repeat=20):
+    """
+    Возвращает медиану времени выполнения func() в миллисекундах.
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
@@ -0,0 +1,411 @@
+"""
+Задержки всех маршрутов API через тестовый клиент Django.
+
+Набор данных создается forum.bulk.seed. Каждый маршрут сначала проходит
+профилирующий прогон: проверяется статус ответа, считаются запросы к базе
+и выделенная память (tracemalloc). Затем идет отдельный прогон на время
+без инструментирования, по нему считаются p50/p95/p99: в нем выключены
+middleware метрик, Server-Timing и журнала медленных запросов.
+
+    python -m benchmarks.bench_api --posts 20000 --output results.json
+    python -m benchmarks.bench_api --baseline results.json --threshold 0.2
+
+С --baseline сравнивает результат с прошлым прогоном. Код возврата 1,
+если какой-то маршрут стал медленнее больше чем на threshold (и больше
+чем на --min-delta-ms), начал делать больше запросов или если маршрут
+из forum/urls.py не покрыт бенчмарком.
+"""
+import argparse
+import json
+import math
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from benchmarks._django import test_database
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, resolve
+
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from forum.bulk import seed
+from forum.models import CustomUser, Forum, GlobalRating, Post, Rating
+
+# Дорогие маршруты (хеширование пароля, генерация схемы) гоняются меньше раз
+SLOW_REQUESTS = 20
+METHODS = ('get', 'post', 'put', 'patch', 'delete')
+# Middleware, которые замеряют запросы сами и искажали бы время прогона
+INSTRUMENTATION = (
+    'mainapp.metrics.MetricsMiddleware',
+    'mainapp.server_timing.ServerTimingMiddleware',
+    'forum.slow_queries.SlowQueryMiddleware',
+)
+
+
+class Dataset:
+    """
+    Идентификаторы засеянных строк и клиенты, от имени которых идут запросы.
+    """
+    def __init__(self, rng):
+        self.rng = rng
+        self.user = CustomUser.objects.create_user(username='bench', password='password')
+        self.admin = CustomUser.objects.create_superuser(username='bench-admin', password='password')
+        self.forum_ids = list(Forum.objects.values_list('id', flat=True))
+        self.post_ids = list(Post.objects.values_list('id', flat=True))
+        self.rating_ids = list(Rating.objects.values_list('id', flat=True))
+        self.rated_user_ids = list(GlobalRating.objects.values_list('user_id', flat=True))
+        self.seeded_username = CustomUser.objects.filter(username__startswith='seed-').values_list('username', flat=True).first()
+        # Инкрементальные выгрузки — около тысячи последних строк
+        self.export_since = {name: self.since(model) for name, model in (('posts', Post), ('ratings', Rating))}
+        self.counter = 0
+
+    @staticmethod
+    def since(model):
+        updated_at, pk = model.objects.order_by('-updated_at', '-id').values_list('updated_at', 'id')[1000]
+        return urlencode({'since': updated_at.isoformat(), 'since_id': pk})
+
+    def forum(self):
+        return self.rng.choice(self.forum_ids)
+
+    def post(self):
+        return self.rng.choice(self.post_ids)
+
+    def rating(self):
+        return self.rng.choice(self.rating_ids)
+
+    def rated_user(self):
+        return self.rng.choice(self.rated_user_ids)
+
+    def unique(self, prefix):
+        self.counter += 1
+        return f'{prefix}-{self.counter}'
+
+    def new_forum(self):
+        return Forum.objects.create(name=self.unique('bench-forum'), description='').id
+
+    def new_post(self):
+        return Post.objects.create(forum_id=self.forum(), author=self.user, title=self.unique('bench-post'), content='').id
+
+    def new_rating(self):
+        return Rating.objects.create(user=self.user, post_id=self.new_post(), score=1).id
+
+
+class Route:
+    """
+    Один замеряемый запрос. path и data — функции от Dataset и результата
+    prepare (подготовка вне замера, например создание удаляемой строки).
+    """
+    def __init__(self, name, method, path, data=None, status=200, client='user', prepare=None, slow=False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.status = status
+        self.client = client
+        self.prepare = prepare
+        self.slow = slow
+
+    def build(self, dataset):
+        prepared = self.prepare(dataset) if self.prepare else None
+        path = self.path(dataset, prepared)
+        data = self.data(dataset, prepared) if self.data else None
+        return path, data
+
+
+def _vote_batch(dataset, prepared):
+    return {'votes': [{'post_id': post_id, 'score': dataset.rng.choice((-1, 0, 1))} for post_id in dataset.rng.sample(dataset.post_ids, 20)]}
+
+
+ROUTES = [
+    Route('api-root', 'get', lambda d, p: '/api/'),
+    # Форумы
+    Route('forum-list', 'get', lambda d, p: '/api/forums/'),
+    Route('forum-create', 'post', lambda d, p: '/api/forums/', lambda d, p: {'name': d.unique('forum'), 'description': 'bench'}, status=201),
+    Route('forum-retrieve', 'get', lambda d, p: f'/api/forums/{d.forum()}/'),
+    Route('forum-update', 'put', lambda d, p: f'/api/forums/{d.forum()}/', lambda d, p: {'name': d.unique('forum'), 'description': 'bench'}),
+    Route('forum-partial-update', 'patch', lambda d, p: f'/api/forums/{d.forum()}/', lambda d, p: {'description': d.unique('description')}),
+    Route('forum-destroy', 'delete', lambda d, p: f'/api/forums/{p}/', status=204, prepare=Dataset.new_forum),
+    Route('forum-detail', 'get', lambda d, p: f'/api/forums/{d.forum()}/detail/'),
+    Route('forum-posts', 'get', lambda d, p: f'/api/forums/{d.forum()}/posts/'),
+    Route('forum-remove', 'delete', lambda d, p: f'/api/forums/{p}/remove/', status=204, prepare=Dataset.new_forum),
+    # Посты
+    Route('post-list', 'get', lambda d, p: '/api/posts/'),
+    Route('post-list-by-score', 'get', lambda d, p: '/api/posts/?ordering=-score'),
+    Route('post-list-sparse', 'get', lambda d, p: '/api/posts/?fields=id,title,created_at'),
+    Route('post-list-include', 'get', lambda d, p: '/api/posts/?include=author,forum'),
+    Route('post-create', 'post', lambda d, p: '/api/posts/',
+          lambda d, p: {'forum': d.forum(), 'author': d.user.id, 'title': d.unique('post'), 'content': 'bench'}, status=201),
+    Route('post-retrieve', 'get', lambda d, p: f'/api/posts/{d.post()}/'),
+    Route('post-update', 'put', lambda d, p: f'/api/posts/{p}/',
+          lambda d, p: {'forum': d.forum(), 'author': d.user.id, 'title': d.unique('post'), 'content': 'bench'}, prepare=Dataset.new_post),
+    Route('post-partial-update', 'patch', lambda d, p: f'/api/posts/{d.post()}/', lambda d, p: {'title': d.unique('post')}),
+    Route('post-destroy', 'delete', lambda d, p: f'/api/posts/{p}/', status=204, prepare=Dataset.new_post),
+    Route('post-detail', 'get', lambda d, p: f'/api/posts/{d.post()}/detail/'),
+    Route('post-search', 'get', lambda d, p: f'/api/posts/search/?q=Post+{d.rng.randrange(1000)}'),
+    Route('post-remove', 'delete', lambda d, p: f'/api/posts/{p}/remove/', status=204, prepare=Dataset.new_post),
+    # Оценки
+    Route('rating-list', 'get', lambda d, p: '/api/ratings/'),
+    Route('rating-create', 'post', lambda d, p: '/api/ratings/',
+          lambda d, p: {'user': d.user.id, 'post': p, 'score': 1}, status=201, prepare=Dataset.new_post),
+    Route('rating-retrieve', 'get', lambda d, p: f'/api/ratings/{d.rating()}/'),
+    Route('rating-update', 'put', lambda d, p: f'/api/ratings/{p}/',
+          lambda d, p: {'user': d.user.id, 'post': Rating.objects.get(pk=p).post_id, 'score': -1}, prepare=Dataset.new_rating),
+    Route('rating-partial-update', 'patch', lambda d, p: f'/api/ratings/{d.rating()}/', lambda d, p: {'score': d.rng.choice((-1, 1))}),
+    Route('rating-destroy', 'delete', lambda d, p: f'/api/ratings/{p}/', status=204, prepare=Dataset.new_rating),
+    Route('rating-detail', 'get', lambda d, p: f'/api/ratings/{d.rating()}/detail/'),
+    Route('rating-remove', 'delete', lambda d, p: f'/api/ratings/{p}/remove/', status=204, prepare=Dataset.new_rating),
+    Route('vote', 'post', lambda d, p: '/api/rating/update/', lambda d, p: {'post_id': d.post(), 'score': d.rng.choice((-1, 0, 1))}),
+    Route('vote-batch', 'post', lambda d, p: '/api/rating/batch/', _vote_batch),
+    # Пользователи
+    Route('user-retrieve', 'get', lambda d, p: f'/api/users/{d.user.id}/'),
+    Route('user-update', 'put', lambda d, p: f'/api/users/{d.user.id}/', lambda d, p: {'username': 'bench', 'bio': d.unique('bio')}),
+    Route('user-partial-update', 'patch', lambda d, p: f'/api/users/{d.user.id}/', lambda d, p: {'bio': d.unique('bio')}),
+    Route('user-register', 'post', lambda d, p: '/api/users/register/',
+          lambda d, p: {'username': d.unique('registered'), 'email': 'bench@example.com', 'password': 'password'}, status=201, client='anon', slow=True),
+    Route('user-login', 'post', lambda d, p: '/api/users/login/',
+          lambda d, p: {'username': d.seeded_username, 'password': 'password'}, client='anon', slow=True),
+    Route('user-logout', 'post', lambda d, p: '/api/users/logout/', client='fresh'),
+    Route('token-obtain', 'post', lambda d, p: '/api/users/token/',
+          lambda d, p: {'username': d.seeded_username, 'password': 'password'}, client='anon', slow=True),
+    Route('token-refresh', 'post', lambda d, p: '/api/users/token/refresh/', lambda d, p: {'refresh': p}, client='anon',
+          prepare=lambda d: str(RefreshToken.for_user(d.user))),
+    # Глобальный рейтинг и таблица лидеров
+    Route('global-rating-retrieve', 'get', lambda d, p: f'/api/users/global-rating/{d.rated_user()}/'),
+    Route('global-rating-create', 'post', lambda d, p: f'/api/users/global-rating/{d.rated_user()}/', status=201),
+    Route('global-rating-update', 'put', lambda d, p: f'/api/users/global-rating/{d.rated_user()}/', lambda d, p: {'rating': d.rng.randrange(100)}),
+    Route('global-rating-destroy', 'delete', lambda d, p: f'/api/users/global-rating/{p}/', status=204,
+          prepare=lambda d: GlobalRating.objects.create(user=CustomUser.objects.create(username=d.unique('rated'), password='!')).user_id),
+    Route('leaderboard-top', 'get', lambda d, p: '/api/users/leaderboard/?limit=50'),
+    Route('leaderboard-around', 'get', lambda d, p: f'/api/users/leaderboard/?around={d.rated_user()}&limit=5'),
+    # Служебные
+    Route('cache-stats', 'get', lambda d, p: '/api/cache/stats/', client='admin'),
+    Route('export-posts', 'get', lambda d, p: f'/api/export/posts.ndjson?{d.export_since["posts"]}', client='admin'),
+    Route('export-ratings', 'get', lambda d, p: f'/api/export/ratings.csv?{d.export_since["ratings"]}', client='admin'),
+    Route('schema-json', 'get', lambda d, p: '/api/swagger.json', slow=True),
+    Route('schema-swagger-ui', 'get', lambda d, p: '/api/swagger/'),
+    Route('schema-redoc', 'get', lambda d, p: '/api/redoc/'),
+]
+
+
+def url_patterns(resolver=None, prefix=''):
+    """
+    Пары (шаблон маршрута, метод) всех эндпоинтов forum.urls, без
+    вариантов с суффиксом формата.
+    """
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        # Как в ResolverMatch.route: '^' вложенного шаблона отбрасывается
+        route = prefix + str(pattern.pattern).removeprefix('^')
+        if isinstance(pattern, URLResolver):
+            if route.startswith('api/'):
+                yield from url_patterns(pattern, route)
+            continue
+        if not isinstance(pattern, URLPattern) or 'drf_format_suffix' in route or r'\.(?P<format>[a-z0-9]+)' in route:
+            continue
+        actions = getattr(pattern.callback, 'actions', None)
+        if actions:
+            methods = actions
+        else:
+            view_class = getattr(pattern.callback, 'view_class', None) or getattr(pattern.callback, 'cls', None)
+            methods = [method for method in METHODS if view_class is not None and hasattr(view_class, method)]
+        for method in methods:
+            if method in METHODS:
+                yield route, method
+
+
+def percentile(samples, value):
+    # Ближайший ранг: значение, не меньше которого value% выборки
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(value / 100 * len(ordered)) - 1, 0)]
+
+
+def make_clients(dataset):
+    user, admin = Client(), Client()
+    user.force_login(dataset.user)
+    admin.force_login(dataset.admin)
+    return {'user': user, 'admin': admin}
+
+
+def send(client, method, path, data):
+    kwargs = {'content_type': 'application/json'} if data is not None else {}
+    body = json.dumps(data) if data is not None else None
+    response = getattr(client, method)(path, body, **kwargs) if body is not None else getattr(client, method)(path)
+    if response.streaming:
+        # Поток выгрузки читается внутри замера
+        b''.join(response.streaming_content)
+    return response
+
+
+def client_for(route, dataset, clients):
+    if route.client == 'anon':
+        return Client()
+    if route.client == 'fresh':
+        client = Client()
+        client.force_login(dataset.user)
+        return client
+    return clients[route.client]
+
+
+def uninstrumented():
+    """
+    Настройки прогона на время: без INSTRUMENTATION, Server-Timing и метрик.
+    Клиент собирает цепочку middleware при первом запросе, поэтому клиенты
+    для этого прогона создаются и используются внутри override_settings.
+    """
+    return override_settings(
+        MIDDLEWARE=[name for name in settings.MIDDLEWARE if name not in INSTRUMENTATION],
+        SERVER_TIMING_ENABLED=False,
+        METRICS_ENABLED=False,
+        FORUM_SLOW_QUERY_MS=None,
+    )
+
+
+def measure(route, dataset, clients, requests, profile_requests, timing_clients):
+    queries, allocated = [], []
+    tracemalloc.start()
+    try:
+        for _ in range(profile_requests):
+            client = client_for(route, dataset, clients)
+            path, data = route.build(dataset)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            with CaptureQueriesContext(connection) as captured:
+                response = send(client, route.method, path, data)
+            allocated.append(tracemalloc.get_traced_memory()[1] - before)
+            queries.append(len(captured))
+            if response.status_code != route.status:
+                raise RuntimeError(f'{route.name}: {route.method.upper()} {path} returned {response.status_code}, expected {route.status}')
+    finally:
+        tracemalloc.stop()
+
+    samples = []
+    with uninstrumented():
+        for _ in range(requests):
+            client = client_for(route, dataset, timing_clients)
+            path, data = route.build(dataset)
+            started = time.perf_counter()
+            send(client, route.method, path, data)
+            samples.append((time.perf_counter() - started) * 1000)
+
+    return {
+        'method': route.method.upper(),
+        'route': resolve(path.split('?')[0]).route,
+        'requests': requests,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'mean_ms': round(sum(samples) / len(samples), 3),
+        'queries': percentile(queries, 50),
+        'allocated_bytes': percentile(allocated, 50),
+    }
+
+
+def uncovered(results):
+    covered = {(result['route'], result['method'].lower()) for result in results.values()}
+    return sorted(set(url_patterns()) - covered)
+
+
+def compare(results, baseline, metric, threshold, min_delta_ms):
+    """
+    Список регрессий относительно baseline: замедление metric больше чем
+    на threshold (и не меньше чем на min_delta_ms) или рост числа запросов.
+    """
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get('routes', {}).get(name)
+        if old is None:
+            continue
+        delta = result[metric] - old[metric]
+        if delta > old[metric] * threshold and delta >= min_delta_ms:
+            regressions.append(f'{name}: {metric} {old[metric]:.2f} -> {result[metric]:.2f} ms')
+        if result['queries'] > old['queries']:
+            regressions.append(f'{name}: queries {old["queries"]} -> {result["queries"]}')
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--forums', type=int, default=20)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--ratings', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=200, help="Замеряемых запросов на маршрут")
+    parser.add_argument('--profile-requests', type=int, default=10, help="Запросов профилирующего прогона")
+    parser.add_argument('--route', action='append', dest='routes', help="Только маршруты с подстрокой в имени")
+    parser.add_argument('--no-response-cache', action='store_true', help="Отключить forum.response_cache")
+    parser.add_argument('--output', help="Файл для результатов в JSON")
+    parser.add_argument('--baseline', help="JSON прошлого прогона для сравнения")
+    parser.add_argument('--metric', choices=['p50_ms', 'p95_ms', 'p99_ms'], default='p95_ms')
+    parser.add_argument('--threshold', type=float, default=0.2, help="Допустимое замедление, доля")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help="Меньшие замедления считаются шумом")
+    args = parser.parse_args()
+
+    if args.no_response_cache:
+        settings.FORUM_RESPONSE_CACHE_ENABLED = False
+    # Каждый маршрут гоняется сотни раз подряд от одного пользователя
+    settings.FORUM_THROTTLE_RATES = {}
+    routes = [route for route in ROUTES if not args.routes or any(part in route.name for part in args.routes)]
+
+    results = {}
+    with test_database():
+        started = time.perf_counter()
+        seed(args.users, args.forums, args.posts, args.ratings, random_seed=0)
+        print(f'seeded in {time.perf_counter() - started:.1f}s')
+        dataset = Dataset(random.Random(0))
+        clients, timing_clients = make_clients(dataset), make_clients(dataset)
+
+        print(f'{"route":>24} {"p50, ms":>9} {"p95, ms":>9} {"p99, ms":>9} {"queries":>8} {"alloc, KB":>10}')
+        for route in routes:
+            requests = min(args.requests, SLOW_REQUESTS) if route.slow else args.requests
+            result = results[route.name] = measure(route, dataset, clients, requests, args.profile_requests, timing_clients)
+            print(f'{route.name:>24} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} {result["p99_ms"]:>9.2f} '
+                  f'{result["queries"]:>8} {result["allocated_bytes"] / 1024:>10.1f}')
+        missing = uncovered(results) if not args.routes else []
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'dataset': {name: getattr(args, name) for name in ('users', 'forums', 'posts', 'ratings')},
+            'response_cache': not args.no_response_cache,
+        },
+        'routes': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    failed = False
+    for route, method in missing:
+        print(f'not covered: {method.upper()} {route}')
+        failed = True
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.metric, args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f'regression: {regression}')
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
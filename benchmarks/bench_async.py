@@ -0,0 +1,237 @@
+"""
+Пропускная способность читающих эндпоинтов под WSGI и ASGI.
+
+Запросы подаются прямо в обработчики Django, без HTTP-сервера, при
+нескольких уровнях параллельности. Режимы:
+
+    wsgi        WSGIHandler, параллельные запросы в пуле потоков;
+    asgi-sync   ASGIHandler с синхронными представлениями (mainapp.urls);
+    asgi-async  ASGIHandler с forum.async_views (mainapp.asgi_urls).
+
+Под ASGI все запросы уровня идут корутинами в одном цикле событий, как у
+одного процесса uvicorn. Набор данных создается forum.bulk.seed, запросы
+идут от имени пользователя с сессией.
+
+    python -m benchmarks.bench_async --concurrency 1 16 64 256 --output async.json
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import logging
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from benchmarks._django import test_database
+from benchmarks.bench_api import git_revision, percentile
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+from django.test.utils import override_settings
+
+from forum.bulk import seed
+from forum.models import CustomUser, Forum, GlobalRating, Post
+
+MODES = {
+    'wsgi': 'mainapp.urls',
+    'asgi-sync': 'mainapp.urls',
+    'asgi-async': 'mainapp.asgi_urls',
+}
+
+ROUTES = {
+    'post-list': lambda d: '/api/posts/',
+    'post-retrieve': lambda d: f'/api/posts/{d.rng.choice(d.post_ids)}/',
+    'forum-list': lambda d: '/api/forums/',
+    'forum-retrieve': lambda d: f'/api/forums/{d.rng.choice(d.forum_ids)}/',
+    'global-rating': lambda d: f'/api/users/global-rating/{d.rng.choice(d.rated_user_ids)}/',
+    'leaderboard-top': lambda d: '/api/users/leaderboard/?limit=50',
+}
+
+
+class Dataset:
+    def __init__(self, rng):
+        self.rng = rng
+        user = CustomUser.objects.create_user(username='bench', password='password')
+        client = Client()
+        client.force_login(user)
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        self.forum_ids = list(Forum.objects.values_list('id', flat=True))
+        self.post_ids = list(Post.objects.values_list('id', flat=True))
+        self.rated_user_ids = list(GlobalRating.objects.values_list('user_id', flat=True))
+
+    def paths(self, routes, count):
+        # Маршруты чередуются, идентификаторы случайные
+        return [ROUTES[name](self) for name in itertools.islice(itertools.cycle(routes), count)]
+
+
+def wsgi_environ(path, cookie):
+    path, _, query = path.partition('?')
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver',
+        'HTTP_ACCEPT': 'application/json',
+        'HTTP_COOKIE': cookie,
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(b''),
+        'wsgi.errors': sys.stderr,
+    }
+
+
+def asgi_scope(path, cookie):
+    path, _, query = path.partition('?')
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'accept', b'application/json'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+
+
+def run_wsgi(application, paths, cookie, concurrency):
+    def request(path):
+        status = []
+        started = time.perf_counter()
+        body = application(wsgi_environ(path, cookie), lambda code, headers: status.append(code))
+        b''.join(body)
+        body.close()
+        return status[0].startswith('200'), (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(request, paths))
+
+
+def run_asgi(application, paths, cookie, concurrency):
+    async def request(path):
+        messages = iter([{'type': 'http.request', 'body': b'', 'more_body': False}])
+        status = []
+
+        async def receive():
+            message = next(messages, None)
+            if message is None:
+                # Клиент не отключается: обработчик отменит ожидание сам
+                await asyncio.Future()
+            return message
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        started = time.perf_counter()
+        await application(asgi_scope(path, cookie), receive, send)
+        return status[0] == 200, (time.perf_counter() - started) * 1000
+
+    async def run():
+        queue = iter(paths)
+        results = []
+
+        async def worker():
+            for path in queue:
+                results.append(await request(path))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return results
+
+    return asyncio.run(run())
+
+
+def measure(mode, application, dataset, routes, concurrency, requests):
+    run = run_wsgi if mode == 'wsgi' else run_asgi
+    with override_settings(ROOT_URLCONF=MODES[mode]):
+        # Прогрев: кеши ответов, счетчиков и таблицы лидеров
+        run(application, dataset.paths(routes, len(routes) * 5), dataset.cookie, 1)
+        paths = dataset.paths(routes, requests)
+        started = time.perf_counter()
+        results = run(application, paths, dataset.cookie, concurrency)
+        elapsed = time.perf_counter() - started
+
+    samples = [duration for _, duration in results]
+    return {
+        'mode': mode,
+        'concurrency': concurrency,
+        'requests': len(results),
+        'errors': sum(1 for ok, _ in results if not ok),
+        'rps': round(len(results) / elapsed, 1),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--forums', type=int, default=20)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--ratings', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=2000, help="Запросов на режим и уровень параллельности")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64, 256])
+    parser.add_argument('--mode', action='append', dest='modes', choices=list(MODES), help="Только этот режим (можно несколько раз)")
+    parser.add_argument('--route', action='append', dest='routes', choices=list(ROUTES), help="Только этот маршрут (можно несколько раз)")
+    parser.add_argument('--no-response-cache', action='store_true', help="Отключить forum.response_cache")
+    parser.add_argument('--output', help="Файл для результатов в JSON")
+    args = parser.parse_args()
+
+    if args.no_response_cache:
+        settings.FORUM_RESPONSE_CACHE_ENABLED = False
+    routes = args.routes or list(ROUTES)
+    modes = args.modes or list(MODES)
+    # get_*_application заново настраивают логирование
+    applications = {'wsgi': get_wsgi_application(), 'asgi': get_asgi_application()}
+    # Под нагрузкой медленным становится почти каждый запрос
+    logging.getLogger('mainapp.server_timing').setLevel(logging.ERROR)
+
+    results = []
+    with test_database():
+        started = time.perf_counter()
+        seed(args.users, args.forums, args.posts, args.ratings, random_seed=0)
+        print(f'seeded in {time.perf_counter() - started:.1f}s')
+        dataset = Dataset(random.Random(0))
+
+        print(f'{"mode":>10} {"conc.":>6} {"req/s":>9} {"p50, ms":>9} {"p95, ms":>9} {"p99, ms":>9} {"errors":>7}')
+        for concurrency in args.concurrency:
+            for mode in modes:
+                result = measure(mode, applications[mode.split('-')[0]], dataset, routes, concurrency, args.requests)
+                results.append(result)
+                print(f'{mode:>10} {concurrency:>6} {result["rps"]:>9.1f} {result["p50_ms"]:>9.2f} '
+                      f'{result["p95_ms"]:>9.2f} {result["p99_ms"]:>9.2f} {result["errors"]:>7}')
+
+    if args.output:
+        report = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'dataset': {name: getattr(args, name) for name in ('users', 'forums', 'posts', 'ratings')},
+                'routes': routes,
+                'response_cache': not args.no_response_cache,
+            },
+            'results': results,
+        }
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    sys.exit(1 if any(result['errors'] for result in results) else 0)
+
+
+if __name__ == '__main__':
+    main()
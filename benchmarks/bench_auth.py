@@ -0,0 +1,123 @@
+"""
+Цена аутентификации запроса: сессия, HTTP Basic и JWT.
+
+Один и тот же легкий запрос (карточка форума из кеша ответов) идет с
+разными способами аутентификации. Для каждого считаются p50/p95 всего
+запроса, p50 этапа auth из заголовка Server-Timing и число запросов к
+таблицам сессий и пользователей. jwt-uncached — JWT с выключенным кешем
+пользователей (FORUM_AUTH_USER_CACHE_TTL = 0).
+
+    python -m benchmarks.bench_auth --requests 500 --output auth.json
+"""
+import argparse
+import base64
+import json
+import platform
+import re
+import time
+from datetime import datetime, timezone
+
+from benchmarks._django import test_database
+from benchmarks.bench_api import git_revision, percentile
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+from forum.authentication import user_cache
+from forum.models import CustomUser, Forum
+
+AUTH_TABLES = ('django_session', 'forum_customuser')
+
+
+def clients(user, password):
+    session = Client()
+    session.force_login(user)
+    basic = base64.b64encode(f'{user.username}:{password}'.encode()).decode()
+    bearer = f'Bearer {AccessToken.for_user(user)}'
+    return {
+        'session': (session, {}),
+        'basic': (Client(), {'HTTP_AUTHORIZATION': f'Basic {basic}'}),
+        'jwt': (Client(), {'HTTP_AUTHORIZATION': bearer}),
+        'jwt-uncached': (Client(), {'HTTP_AUTHORIZATION': bearer}),
+    }
+
+
+def auth_ms(response):
+    match = re.search(r'auth;dur=([\d.]+)', response.get('Server-Timing', ''))
+    return float(match.group(1)) if match else 0.0
+
+
+def measure(scheme, client, headers, path, requests):
+    ttl = settings.FORUM_AUTH_USER_CACHE_TTL
+    if scheme == 'jwt-uncached':
+        settings.FORUM_AUTH_USER_CACHE_TTL = 0
+        user_cache.clear()
+    try:
+        response = client.get(path, **headers)
+        if response.status_code != 200:
+            raise RuntimeError(f'{scheme}: GET {path} returned {response.status_code}')
+        # Запросы после прогрева: кеш ответов и кеш пользователей заполнены
+        with CaptureQueriesContext(connection) as captured:
+            client.get(path, **headers)
+        queries = sum(1 for query in captured if any(table in query['sql'] for table in AUTH_TABLES))
+
+        samples, auth = [], []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get(path, **headers)
+            samples.append((time.perf_counter() - started) * 1000)
+            auth.append(auth_ms(response))
+    finally:
+        settings.FORUM_AUTH_USER_CACHE_TTL = ttl
+
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'auth_p50_ms': round(percentile(auth, 50), 3),
+        'auth_queries': queries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=500, help="Замеряемых запросов на способ")
+    parser.add_argument('--basic-requests', type=int, default=20, help="Для Basic: PBKDF2 на каждый запрос")
+    parser.add_argument('--output', help="Файл для результатов в JSON")
+    args = parser.parse_args()
+
+    # Время этапа auth берется из заголовка Server-Timing
+    settings.SERVER_TIMING_ENABLED = True
+    results = {}
+    with test_database():
+        password = 'password'
+        user = CustomUser.objects.create_user(username='bench', password=password)
+        forum = Forum.objects.create(name='bench', description='')
+        path = f'/api/forums/{forum.id}/'
+
+        print(f'{"scheme":>14} {"p50, ms":>9} {"p95, ms":>9} {"auth p50, ms":>13} {"auth queries":>13}')
+        for scheme, (client, headers) in clients(user, password).items():
+            requests = args.basic_requests if scheme == 'basic' else args.requests
+            result = results[scheme] = measure(scheme, client, headers, path, requests)
+            print(f'{scheme:>14} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} '
+                  f'{result["auth_p50_ms"]:>13.3f} {result["auth_queries"]:>13}')
+
+    if args.output:
+        report = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+            },
+            'schemes': results,
+        }
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Стоимость страниц ленты постов в зависимости от глубины.
+
+Сравнивает курсорную пагинацию `/api/posts/` с OFFSET-выборкой той же
+страницы. Для курсора время страницы не зависит от глубины, для OFFSET
+растет линейно.
+
+    python -m benchmarks.bench_pagination --posts 200000
+"""
+import argparse
+
+from benchmarks._django import test_database, timed
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from forum.models import CustomUser, Forum, Post
+from forum.pagination import PostKeysetPagination
+
+
+def seed(total, batch_size=10000):
+    user = CustomUser.objects.create_user(username='bench', password='bench')
+    forum = Forum.objects.create(name='Bench', description='')
+    for offset in range(0, total, batch_size):
+        Post.objects.bulk_create([
+            Post(forum=forum, author=user, title=f'Post {i}', content='x' * 200)
+            for i in range(offset, min(offset + batch_size, total))
+        ], batch_size=batch_size)
+    # auto_now_add не дает задать время при вставке, раздвигаем его отдельно;
+    # соседние пары постов получают одинаковое время, чтобы проверить разрешение
+    # совпадений по id
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE forum_post SET created_at = datetime(%s, '-' || (id / 2) || ' seconds')",
+            [timezone.now().strftime('%Y-%m-%d %H:%M:%S')],
+        )
+    return user
+
+
+def cursor_at(depth):
+    post = Post.objects.order_by('-created_at', '-id')[depth - 1:depth].get()
+    return PostKeysetPagination().encode_cursor([post.created_at.isoformat(), post.id])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with test_database():
+        user = seed(args.posts)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        base = f'/api/posts/?page_size={args.page_size}'
+
+        print(f'{"depth":>10} {"cursor, ms":>12} {"offset, ms":>12} {"queries":>8}')
+        for depth in (1, args.posts // 100, args.posts // 10, args.posts // 2, args.posts - args.page_size):
+            depth = max(depth, 1)
+            url = base if depth == 1 else f'{base}&cursor={cursor_at(depth)}'
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            assert response.status_code == 200
+            assert not any('COUNT(' in q['sql'].upper() for q in queries.captured_queries)
+            query_count = len(queries)
+
+            cursor_ms = timed(lambda: client.get(url), args.repeat)
+            offset_qs = Post.objects.order_by('-created_at', '-id')
+            offset_ms = timed(lambda: list(offset_qs[depth:depth + args.page_size]), args.repeat)
+            print(f'{depth:>10} {cursor_ms:>12.2f} {offset_ms:>12.2f} {query_count:>8}')
+
+
+if __name__ == '__main__':
+    main()
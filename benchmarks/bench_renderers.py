@@ -0,0 +1,81 @@
+"""
+Рендеринг списков: JSONRenderer DRF, orjson и MessagePack.
+
+Страницы `/api/posts/` и `/api/ratings/` по --page-size строк (по умолчанию
+10 000) запрашиваются один раз, затем данные ответа рендерятся каждым
+рендерером --repeat раз. Для каждого — размер тела (и после gzip) и медиана
+времени кодирования; MessagePack декодируется обратно и сравнивается с JSON.
+
+    python -m benchmarks.bench_renderers --page-size 10000
+"""
+import argparse
+import gzip
+import json
+import time
+
+from benchmarks._django import test_database
+
+import msgpack
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from forum.bulk import seed
+from forum.models import CustomUser
+from forum.pagination import KeysetPagination
+from forum.renderers import FastJSONRenderer, MessagePackRenderer
+
+PATHS = {
+    'posts': '/api/posts/?page_size={}',
+    'ratings': '/api/ratings/?page_size={}',
+}
+RENDERERS = {
+    'drf-json': JSONRenderer(),
+    'orjson': FastJSONRenderer(),
+    'msgpack': MessagePackRenderer(),
+}
+
+
+def encode_ms(renderer, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        renderer.render(data)
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)[repeat // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--page-size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    settings.FORUM_RESPONSE_CACHE_ENABLED = False
+    KeysetPagination.max_page_size = args.page_size
+
+    with test_database():
+        seed(1000, 20, args.page_size, args.page_size, random_seed=0)
+        user = CustomUser.objects.create_user(username='bench', password='bench')
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        print(f'{"page":>8} {"renderer":>9} {"bytes":>10} {"gzip":>9} {"encode, ms":>11} {"x":>6}')
+        for name, path in PATHS.items():
+            data = client.get(path.format(args.page_size), HTTP_ACCEPT='application/json').data
+            baseline = None
+            for renderer_name, renderer in RENDERERS.items():
+                content = renderer.render(data)
+                if renderer_name == 'msgpack':
+                    if msgpack.unpackb(content) != json.loads(RENDERERS['drf-json'].render(data)):
+                        raise RuntimeError(f'{name}: msgpack payload differs from JSON')
+                elif content != RENDERERS['drf-json'].render(data):
+                    raise RuntimeError(f'{name}: {renderer_name} differs from DRF JSON')
+                ms = encode_ms(renderer, data, args.repeat)
+                baseline = baseline or ms
+                print(f'{name:>8} {renderer_name:>9} {len(content):>10} {len(gzip.compress(content)):>9} '
+                      f'{ms:>11.1f} {baseline / ms:>6.2f}')
+
+
+if __name__ == '__main__':
+    main()
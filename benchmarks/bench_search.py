@@ -0,0 +1,75 @@
+"""
+Полнотекстовый поиск FTS5 против LIKE '%...%' по постам.
+
+    python -m benchmarks.bench_search --posts 1000000
+"""
+import argparse
+import random
+import time
+
+from benchmarks._django import test_database, timed
+
+from django.db.models import Q
+
+from forum.models import CustomUser, Forum, Post
+from forum.search import search_posts
+
+WORDS = [f'word{i}' for i in range(20000)]
+# needle встречается в одном посте из десяти тысяч: LIKE приходится
+# просматривать почти всю таблицу, частые слова LIKE находит сразу
+QUERIES = ['needle', 'needle word5', 'word123', 'word77 word78']
+
+
+def sentence(length):
+    return ' '.join(random.choices(WORDS, k=length))
+
+
+def content():
+    text = sentence(80)
+    if random.random() < 0.0001:
+        text += ' needle'
+    return text
+
+
+def seed(total, batch_size=20000):
+    random.seed(0)
+    user = CustomUser.objects.create_user(username='bench', password='bench')
+    forums = [Forum.objects.create(name=f'Forum {i}', description='') for i in range(10)]
+    started = time.perf_counter()
+    for offset in range(0, total, batch_size):
+        Post.objects.bulk_create([
+            Post(forum=random.choice(forums), author=user, title=sentence(6), content=content())
+            for _ in range(min(batch_size, total - offset))
+        ])
+    print(f'seeded {total} posts (with FTS triggers) in {time.perf_counter() - started:.1f}s')
+    return forums
+
+
+def like_search(text, forum_id=None, limit=20):
+    queryset = Post.objects.all()
+    for token in text.split():
+        queryset = queryset.filter(Q(title__icontains=token) | Q(content__icontains=token))
+    if forum_id is not None:
+        queryset = queryset.filter(forum_id=forum_id)
+    return list(queryset.values_list('id', flat=True)[:limit])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with test_database():
+        forums = seed(args.posts)
+        forum_id = forums[0].id
+        print(f'{"query":>20} {"forum":>6} {"fts5, ms":>10} {"like, ms":>10}')
+        for text in QUERIES:
+            for forum in (None, forum_id):
+                fts_ms = timed(lambda: search_posts(text, forum_id=forum), args.repeat)
+                like_ms = timed(lambda: like_search(text, forum_id=forum), args.repeat)
+                print(f'{text:>20} {str(forum or "-"):>6} {fts_ms:>10.2f} {like_ms:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Сериализация больших страниц: ModelSerializer и план полей.
+
+Страницы `/api/posts/` и `/api/ratings/` по --page-size строк (по умолчанию
+10 000) запрашиваются с FORUM_FAST_SERIALIZATION выключенным и включенным,
+без кеша ответов. Для каждого пути — медиана времени запроса и этапа
+serialize из Server-Timing; ответы обоих путей сравниваются побайтно.
+
+    python -m benchmarks.bench_serialization --page-size 10000
+"""
+import argparse
+import re
+
+from benchmarks._django import test_database
+
+from django.conf import settings
+from rest_framework.test import APIClient
+
+from forum.bulk import seed
+from forum.models import CustomUser
+from forum.pagination import KeysetPagination
+
+PATHS = {
+    'posts': '/api/posts/?page_size={}',
+    'posts-sparse': '/api/posts/?page_size={}&fields=id,title,created_at',
+    'ratings': '/api/ratings/?page_size={}',
+}
+
+
+def serialize_ms(response):
+    match = re.search(r'serialize;dur=([\d.]+)', response.get('Server-Timing', ''))
+    return float(match.group(1)) if match else 0.0
+
+
+def measure(client, path, fast, repeat):
+    settings.FORUM_FAST_SERIALIZATION = fast
+    content = client.get(path).content
+    totals, serialize = [], []
+    for _ in range(repeat):
+        response = client.get(path)
+        totals.append(float(re.search(r'total;dur=([\d.]+)', response['Server-Timing']).group(1)))
+        serialize.append(serialize_ms(response))
+    return content, sorted(totals)[repeat // 2], sorted(serialize)[repeat // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--page-size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    settings.FORUM_RESPONSE_CACHE_ENABLED = False
+    settings.SERVER_TIMING_ENABLED = True
+    KeysetPagination.max_page_size = args.page_size
+
+    with test_database():
+        seed(1000, 20, args.page_size, args.page_size, random_seed=0)
+        user = CustomUser.objects.create_user(username='bench', password='bench')
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        print(f'{"page":>14} {"path":>6} {"total, ms":>10} {"serialize, ms":>14}')
+        for name, path in PATHS.items():
+            path = path.format(args.page_size)
+            results = {fast: measure(client, path, fast, args.repeat) for fast in (False, True)}
+            if results[False][0] != results[True][0]:
+                raise RuntimeError(f'{name}: responses differ')
+            for fast, (_, total, serialize) in results.items():
+                print(f'{name:>14} {"fast" if fast else "drf":>6} {total:>10.1f} {serialize:>14.1f}')
+            print(f'{name:>14} {"x":>6} {results[False][1] / results[True][1]:>10.2f} '
+                  f'{results[False][2] / max(results[True][2], 0.001):>14.2f}')
+
+
+if __name__ == '__main__':
+    main()
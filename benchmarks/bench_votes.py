@@ -0,0 +1,83 @@
+"""
+Голосование: прежний ORM-путь против upsert-пути forum.votes.cast_vote.
+
+Прежний путь повторяет исходный RatingUpdateView: Post.objects.get,
+Rating.objects.get_or_create и save() с пересчетом в сигналах.
+
+    python -m benchmarks.bench_votes --votes 5000
+"""
+import argparse
+import random
+import time
+
+from benchmarks._django import test_database
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from forum.models import CustomUser, Forum, Post, Rating
+from forum.votes import cast_vote
+
+
+def legacy_vote(user, post_id, score):
+    post = Post.objects.get(id=post_id)
+    rating, created = Rating.objects.get_or_create(user=user, post=post)
+    rating.score = score
+    rating.save()
+
+
+def upsert_vote(user, post_id, score):
+    cast_vote(user.id, post_id, score)
+
+
+def seed(prefix, users, posts):
+    CustomUser.objects.bulk_create([CustomUser(username=f'{prefix}{i}', password='!') for i in range(users)])
+    authors = list(CustomUser.objects.filter(username__startswith=prefix))
+    forum = Forum.objects.create(name=prefix, description='')
+    Post.objects.bulk_create([
+        Post(forum=forum, author=random.choice(authors), title=f'Post {i}', content='')
+        for i in range(posts)
+    ])
+    return authors, list(forum.posts.values_list('id', flat=True))
+
+
+def run(vote, users, post_ids, votes):
+    plan = [(random.choice(users), random.choice(post_ids), random.choice((-1, 0, 1))) for _ in range(votes)]
+    # Прогрев: шарды и строки оценок для части пар уже существуют
+    for user, post_id, score in plan[:votes // 10]:
+        vote(user, post_id, score)
+
+    sample = plan[votes // 10:votes // 10 + 200]
+    with CaptureQueriesContext(connection) as queries:
+        for user, post_id, score in sample:
+            vote(user, post_id, score)
+    query_count = len(queries) / len(sample)
+
+    started = time.perf_counter()
+    for user, post_id, score in plan:
+        vote(user, post_id, score)
+    elapsed = time.perf_counter() - started
+    return query_count, votes / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--posts', type=int, default=500)
+    parser.add_argument('--votes', type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f'{"path":>8} {"queries/vote":>13} {"votes/sec":>10}')
+    with test_database():
+        for name, vote in (('legacy', legacy_vote), ('upsert', upsert_vote)):
+            random.seed(0)
+            users, post_ids = seed(name, args.users, args.posts)
+            query_count, rate = run(vote, users, post_ids, args.votes)
+            # Агрегаты должны совпадать с суммой оценок при любом пути
+            for post in Post.objects.filter(id__in=post_ids[:50]):
+                assert post.score == sum(post.ratings.values_list('score', flat=True))
+            print(f'{name:>8} {query_count:>13.2f} {rate:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
+
 from .models import CustomUser, Forum, Post, Rating, GlobalRating
+from .search import matching_post_ids_sql
 
 # Регистрируем модели
 @admin.register(CustomUser)
@@ -19,6 +22,13 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('title', 'content')
     list_filter = ('created_at', 'updated_at', 'forum')
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск идет через FTS-индекс вместо LIKE '%...%' по всей таблице
+        subquery = matching_post_ids_sql(search_term)
+        if subquery is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=RawSQL(*subquery)), False
+
 @admin.register(Rating)
 class RatingAdmin(admin.ModelAdmin):
     list_display = ('user', 'post', 'score')
@@ -4,3 +4,35 @@ from django.apps import AppConfig
 class ForumConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'forum'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from mainapp.metrics import LATENCY_BUCKETS, register_collector, register_derived, register_gauge, register_metric
+        from .hashing import hashing_pool
+        from .response_cache import response_cache
+
+        register_collector(
+            lambda: {
+                ('forum_response_cache_lookups_total', (('result', name),)): value
+                for name, value in response_cache.stats.snapshot().items()
+                if name != 'hit_ratio'
+            },
+            [('forum_response_cache_lookups_total', 'Response cache lookups by result.')],
+        )
+        register_derived('forum_response_cache_hit_ratio', 'Share of response cache lookups served from a cache.', cache_hit_ratio)
+
+        register_gauge('forum_password_hash_queue_depth', 'Password hashing jobs queued or running.', lambda: hashing_pool.depth)
+        register_metric('forum_password_hash_duration_seconds', 'histogram',
+                        'Password hashing latency, including the wait for a pool worker.', LATENCY_BUCKETS)
+        register_metric('forum_password_hash_rejected_total', 'counter', 'Password hashing jobs rejected because the pool queue was full.')
+
+
+def cache_hit_ratio(counters):
+    lookups = {
+        dict(labels)['result']: value
+        for (name, labels), value in counters.items()
+        if name == 'forum_response_cache_lookups_total'
+    }
+    total = sum(lookups.values())
+    hits = total - lookups.get('miss', 0)
+    return hits / total if total else 0.0
@@ -0,0 +1,342 @@
+"""
+Асинхронные версии читающих эндпоинтов для развертывания под ASGI.
+
+Списки и карточки постов и форумов, глобальный рейтинг и таблица лидеров
+обслуживаются корутинами: асинхронный ORM (aget, async for), асинхронный
+API кеша и те же сериализаторы, что у синхронных представлений, — после
+загрузки строк они не обращаются к базе. Ответ рендерится внутри
+представления, поэтому Django не переходит в поток ни для представления,
+ни для рендеринга.
+
+Вход и регистрация тоже асинхронные: проверка и хеширование пароля ждут
+пул процессов forum.hashing, не занимая поток.
+
+Каждое представление оборачивает синхронное представление DRF того же
+маршрута: ему передаются методы, не перечисленные в async_methods (по
+умолчанию все, кроме GET и HEAD), а также запросы браузерного API
+(text/html). Маршруты подключает mainapp/asgi_urls.py.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth import alogin, get_user_model
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import (
+    AuthenticationFailed, NotAcceptable, NotAuthenticated, NotFound, PermissionDenied, Throttled,
+)
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
+from rest_framework.request import ForcedAuthentication, Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from mainapp.server_timing import span
+
+from .conditional import collection_validators, conditional_response, object_validators
+from .counters import aread_global_rating
+from .fast_serialization import plan_for
+from .fieldsets import SparseQuerysetMixin
+from .hashing import aauthenticate_user, acreate_user
+from .leaderboard import leaderboard
+from .models import Forum, GlobalRating, Post
+from .pagination import IdKeysetPagination, PostKeysetPagination
+from .response_cache import cache_response
+from .serializers import ForumSerializer, GlobalRatingSerializer, PostListSerializer, PostSerializer
+from .views import LeaderboardView as SyncLeaderboardView
+
+User = get_user_model()
+
+
+class AsyncReadView:
+    """
+    Основа асинхронного представления: аутентификация, права, согласование
+    формата и обработка исключений как у APIView, но без перехода в поток.
+
+    Сессия проверяется через request.auser(), JWT — через aauthenticate()
+    (forum.authentication); остальные аутентификаторы (Basic и т.п.)
+    вызываются в потоке и только при заголовке Authorization.
+    Классы прав не должны обращаться к базе.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    permission_classes = [IsAuthenticated]
+    async_methods = ('GET', 'HEAD')
+
+    def __init__(self, sync_view):
+        self.sync_view = sync_view
+
+    @classmethod
+    def as_view(cls, sync_view):
+        async def view(request, *args, **kwargs):
+            return await cls(sync_view).dispatch(request, *args, **kwargs)
+        view.view_class = cls
+        view.sync_view = sync_view
+        # Небезопасные методы уходят в представление DRF, оно само проверяет CSRF
+        return csrf_exempt(view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in self.async_methods:
+            return await self.delegate(request, *args, **kwargs)
+        self.args = args
+        self.kwargs = kwargs
+        self.request = Request(
+            request,
+            parsers=[parser() for parser in self.parser_classes],
+            authenticators=[authenticator() for authenticator in self.authentication_classes],
+            parser_context={'view': self, 'args': args, 'kwargs': kwargs},
+        )
+
+        renderers = [renderer() for renderer in self.renderer_classes]
+        try:
+            self.request.accepted_renderer, self.request.accepted_media_type = (
+                api_settings.DEFAULT_CONTENT_NEGOTIATION_CLASS().select_renderer(self.request, renderers)
+            )
+        except NotAcceptable as exc:
+            self.request.accepted_renderer, self.request.accepted_media_type = renderers[0], renderers[0].media_type
+            return self.finalize(self.handle_exception(exc))
+        if self.request.accepted_renderer.format == 'api':
+            return await self.delegate(request, *args, **kwargs)
+
+        try:
+            with span('auth'):
+                await self.authenticate()
+                self.check_permissions()
+                await self.check_throttles()
+            handler = self.get if request.method == 'HEAD' else getattr(self, request.method.lower())
+            response = await handler(self.request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        return self.finalize(response)
+
+    async def delegate(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    async def authenticate(self):
+        request = self.request
+        for authenticator in request.authenticators:
+            if isinstance(authenticator, SessionAuthentication):
+                # Как SessionAuthentication: CSRF проверяется у вошедших
+                # пользователей и только для небезопасных методов
+                user = await request._request.auser()
+                result = (user, None) if user.is_active else None
+                if result is not None and request.method not in SAFE_METHODS:
+                    authenticator.enforce_csrf(request)
+            elif isinstance(authenticator, ForcedAuthentication):
+                result = authenticator.authenticate(request)
+            elif hasattr(authenticator, 'aauthenticate'):
+                result = await authenticator.aauthenticate(request)
+            elif 'HTTP_AUTHORIZATION' in request.META:
+                result = await sync_to_async(authenticator.authenticate)(request)
+            else:
+                continue
+            if result is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = result
+                return
+        request._not_authenticated()
+
+    def check_permissions(self):
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(self.request, self):
+                if self.request.authenticators and not self.request.successful_authenticator:
+                    raise NotAuthenticated()
+                raise PermissionDenied(getattr(permission, 'message', None), code=getattr(permission, 'code', None))
+
+    async def check_throttles(self):
+        waits = []
+        for throttle in [throttle() for throttle in self.throttle_classes]:
+            if hasattr(throttle, 'aallow_request'):
+                allowed = await throttle.aallow_request(self.request, self)
+            else:
+                allowed = await sync_to_async(throttle.allow_request)(self.request, self)
+            if not allowed:
+                waits.append(throttle.wait())
+        if waits:
+            waits = [wait for wait in waits if wait is not None]
+            raise Throttled(max(waits, default=None))
+
+    def get_renderer_context(self):
+        return {'view': self, 'args': self.args, 'kwargs': self.kwargs, 'request': self.request}
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            authenticators = self.request.authenticators
+            header = authenticators[0].authenticate_header(self.request) if authenticators else None
+            if header:
+                exc.auth_header = header
+            else:
+                exc.status_code = status.HTTP_403_FORBIDDEN
+        response = api_settings.EXCEPTION_HANDLER(exc, self.get_renderer_context())
+        if response is None:
+            raise exc
+        response.exception = True
+        return response
+
+    def finalize(self, response):
+        """
+        Рендерит Response DRF в обычный HttpResponse: у него нет render(),
+        и Django не вызывает рендеринг через поток.
+        """
+        if not isinstance(response, Response):
+            return response
+        response.accepted_renderer = self.request.accepted_renderer
+        response.accepted_media_type = self.request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        with span('render'):
+            content = response.rendered_content
+        rendered = HttpResponse(content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        if len(self.renderer_classes) > 1:
+            patch_vary_headers(rendered, ['Accept'])
+        return rendered
+
+
+class AsyncModelView(SparseQuerysetMixin, AsyncReadView):
+    """
+    Список и карточка модели, как ListModelMixin и RetrieveModelMixin
+    наборов представлений forum.views (включая фильтр ?pk=, ?fields= и
+    ?include=).
+    """
+    queryset = None
+    serializer_class = None
+    pagination_class = None
+
+    def get_queryset(self):
+        pk = self.request.query_params.get('pk')
+        if pk:
+            return self.get_sparse_queryset(self.queryset.filter(pk=pk))
+        return self.get_sparse_queryset(self.queryset.all())
+
+    def get_serializer_class(self):
+        return self.serializer_class
+
+    def get_serializer(self, *args, **kwargs):
+        context = {'request': self.request, 'format': self.kwargs.get('format'), 'view': self}
+        return self.get_serializer_class()(*args, context=context, **kwargs)
+
+    async def list(self):
+        paginator = self.pagination_class()
+        # Строки values_list() по плану полей (forum.fast_serialization), если он есть
+        plan = plan_for(self.serializer_class, self.request)
+        queryset = self.get_queryset()
+        if plan is not None:
+            queryset = plan.values(queryset, paginator.get_ordering(self.request))
+        page = await paginator.apaginate_queryset(queryset, self.request, view=self)
+        data = plan.render_many(page) if plan is not None else self.get_serializer(page, many=True).data
+        return await paginator.aget_paginated_response(data)
+
+    async def retrieve(self, pk):
+        plan = plan_for(self.serializer_class, self.request)
+        queryset = self.get_queryset() if plan is None else plan.values(self.get_queryset())
+        try:
+            instance = await aget_object_or_404(queryset, pk=pk)
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        return Response(plan.render_many([instance])[0] if plan is not None else self.get_serializer(instance).data)
+
+
+class PostListView(AsyncModelView):
+    queryset = Post.objects.all()
+    serializer_class = PostListSerializer
+    pagination_class = PostKeysetPagination
+
+    @conditional_response(collection_validators('forum.Post'))
+    @cache_response('forum.Post')
+    async def get(self, request, *args, **kwargs):
+        return await self.list()
+
+
+class PostDetailView(AsyncModelView):
+    queryset = Post.objects.all()
+    serializer_class = PostSerializer
+
+    @conditional_response(object_validators(Post, ('score', 'upvotes', 'downvotes')))
+    @cache_response('forum.Post')
+    async def get(self, request, pk, *args, **kwargs):
+        return await self.retrieve(pk)
+
+
+class ForumListView(AsyncModelView):
+    queryset = Forum.objects.all()
+    serializer_class = ForumSerializer
+    pagination_class = IdKeysetPagination
+
+    @conditional_response(collection_validators('forum.Forum'))
+    @cache_response('forum.Forum')
+    async def get(self, request, *args, **kwargs):
+        return await self.list()
+
+
+class ForumDetailView(AsyncModelView):
+    queryset = Forum.objects.all()
+    serializer_class = ForumSerializer
+
+    @conditional_response(object_validators(Forum))
+    @cache_response('forum.Forum')
+    async def get(self, request, pk, *args, **kwargs):
+        return await self.retrieve(pk)
+
+
+class GlobalRatingView(AsyncReadView):
+    @cache_response('forum.GlobalRating')
+    async def get(self, request, pk, *args, **kwargs):
+        rating = await aread_global_rating(pk)
+        if rating is None:
+            raise NotFound(detail="Global rating not found for this user.")
+
+        serializer = GlobalRatingSerializer(GlobalRating(user_id=pk, rating=rating))
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class LeaderboardView(AsyncReadView):
+    async def get(self, request, *args, **kwargs):
+        try:
+            limit, around = SyncLeaderboardView.parse_params(request)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = {}
+        if around is None:
+            entries = await leaderboard.atop(limit)
+        else:
+            rank, entries = await leaderboard.aaround(around, limit)
+            if rank is None:
+                raise NotFound(detail="Global rating not found for this user.")
+            data["rank"] = rank
+
+        usernames = User.objects.filter(pk__in=[user_id for _, user_id, _ in entries]).values_list('pk', 'username')
+        data["results"] = SyncLeaderboardView.results(entries, {pk: username async for pk, username in usernames})
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class LoginView(AsyncReadView):
+    permission_classes = [AllowAny]
+    async_methods = ('POST',)
+
+    async def post(self, request, *args, **kwargs):
+        user = await aauthenticate_user(request.data.get("username"), request.data.get("password"))
+        if user is None:
+            return Response({"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
+        await alogin(request._request, user)
+        return Response({"message": "Login successful"}, status=status.HTTP_200_OK)
+
+
+class RegisterView(AsyncReadView):
+    permission_classes = [AllowAny]
+    throttle_scope = 'register'
+    async_methods = ('POST',)
+
+    async def post(self, request, *args, **kwargs):
+        data = request.data
+        username = data.get("username")
+        if await User.objects.filter(username=username).aexists():
+            return Response({"error": "Username already exists"}, status=status.HTTP_400_BAD_REQUEST)
+
+        await acreate_user(username, data.get("email"), data.get("password"), bio=data.get("bio", ""))
+        return Response({"message": "User created successfully"}, status=status.HTTP_201_CREATED)
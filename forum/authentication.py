@@ -0,0 +1,115 @@
+"""
+Аутентификация по JWT (rest_framework_simplejwt) без запросов к базе.
+
+Токен проверяется по подписи, а пользователь берется из кеша процесса на
+FORUM_AUTH_USER_CACHE_TTL секунд. Сохранение и удаление пользователя
+сбрасывают его запись (forum/signals.py); в других процессах изменения
+(например, блокировка) видны не позже TTL. Каждый запрос получает свою
+копию объекта пользователя, кешированный экземпляр не меняется.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class UserCache:
+    """
+    Пользователи по идентификатору со сроком жизни; при переполнении
+    вытесняется самая старая запись.
+    """
+    def __init__(self, ttl=None, size=None):
+        self._ttl = ttl
+        self._size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @property
+    def ttl(self):
+        return self._ttl if self._ttl is not None else getattr(settings, 'FORUM_AUTH_USER_CACHE_TTL', 60)
+
+    @property
+    def size(self):
+        return self._size or getattr(settings, 'FORUM_AUTH_USER_CACHE_SIZE', 10000)
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, user_id, user):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        # Повторно после коммита: параллельный запрос мог успеть закешировать
+        # строку, прочитанную до фиксации транзакции
+        self._discard(user_id)
+        transaction.on_commit(lambda: self._discard(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication, читающая пользователя из user_cache.
+    """
+    def get_user(self, validated_token):
+        user = self.cached_user(validated_token)
+        if user is None:
+            # Отсутствие, блокировку и отзыв токена проверяет simplejwt
+            user = super().get_user(validated_token)
+            user_cache.set(validated_token[api_settings.USER_ID_CLAIM], user)
+            user = copy.copy(user)
+        return user
+
+    def cached_user(self, validated_token):
+        user = user_cache.get(validated_token.get(api_settings.USER_ID_CLAIM))
+        if user is None:
+            return None
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            # Токен мог быть выпущен до смены пароля: решает свежая строка
+            return None
+        return copy.copy(user)
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() для асинхронных представлений: при попадании в кеш
+        запрос не уходит в поток.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user = self.cached_user(validated_token)
+        if user is None:
+            user = await sync_to_async(self.get_user)(validated_token)
+        return user, validated_token
@@ -0,0 +1,334 @@
+"""
+Массовая загрузка данных: генератор синтетического набора (seed_forum)
+и импорт выгрузок NDJSON (import_forum).
+
+Строки вставляются bulk_create пачками, каждая пачка — в своей транзакции.
+Сигналы при этом не срабатывают, поэтому агрегаты постов и глобальные
+рейтинги после загрузки пересчитываются целиком: агрегаты — одним UPDATE,
+глобальные рейтинги — одним INSERT ... SELECT ... GROUP BY с upsert.
+"""
+import gzip
+import json
+import random
+import secrets
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .leaderboard import invalidate as invalidate_leaderboard
+from .models import CustomUser, Forum, GlobalRating, GlobalRatingShard, Post, Rating
+from .response_cache import bump_versions
+
+
+def batch_size():
+    return getattr(settings, 'FORUM_BULK_BATCH_SIZE', 5000)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def explicit_timestamps(model):
+    """
+    Отключает auto_now/auto_now_add модели, чтобы bulk_create записал
+    переданные created_at/updated_at, а не текущее время.
+    """
+    fields = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def insert(model, objects, size=None, **options):
+    """
+    Вставляет objects пачками по size строк. Возвращает число строк.
+    """
+    total = 0
+    for batch in batches(objects, size or batch_size()):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, batch_size=size or batch_size(), **options)
+        total += len(batch)
+    return total
+
+
+def recompute_post_scores():
+    """
+    Пересчитывает score/upvotes/downvotes постов по оценкам одним UPDATE.
+    Меняются только посты, чьи агрегаты разошлись с оценками; у них
+    сдвигается updated_at, как при голосе. Возвращает число таких постов.
+    """
+    def aggregate(expression):
+        ratings = (
+            Rating.objects.filter(post=OuterRef('pk'))
+            .order_by()
+            .values('post')
+            .annotate(value=expression)
+            .values('value')
+        )
+        return Coalesce(Subquery(ratings, output_field=IntegerField()), Value(0))
+
+    counters = {
+        'score': aggregate(Sum('score')),
+        'upvotes': aggregate(Count('pk', filter=Q(score__gt=0))),
+        'downvotes': aggregate(Count('pk', filter=Q(score__lt=0))),
+    }
+    return Post.objects.exclude(**counters).update(updated_at=timezone.now(), **counters)
+
+
+def backfill_global_ratings():
+    """
+    Записывает глобальный рейтинг каждого автора как сумму оценок его постов
+    одним агрегирующим запросом и обнуляет шарды. Рейтинги пользователей,
+    у постов которых оценок больше нет, сбрасываются в 0. Возвращает число
+    авторов с оценками.
+    """
+    qn = connection.ops.quote_name
+    table = qn(GlobalRating._meta.db_table)
+    # WHERE 1 = 1 нужен SQLite, чтобы не спутать ON CONFLICT с условием JOIN
+    sql = (
+        f"INSERT INTO {table} ({qn('user_id')}, {qn('rating')}) "
+        f"SELECT p.{qn('author_id')}, SUM(r.{qn('score')}) "
+        f"FROM {qn(Rating._meta.db_table)} r JOIN {qn(Post._meta.db_table)} p ON p.{qn('id')} = r.{qn('post_id')} "
+        f"WHERE 1 = 1 GROUP BY p.{qn('author_id')} "
+        f"ON CONFLICT ({qn('user_id')}) DO UPDATE SET {qn('rating')} = EXCLUDED.{qn('rating')}"
+    )
+    rated_authors = Post.objects.filter(ratings__isnull=False).values('author_id')
+    with transaction.atomic():
+        GlobalRatingShard.objects.all().delete()
+        GlobalRating.objects.exclude(rating=0).exclude(user_id__in=rated_authors).update(rating=0)
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.rowcount
+
+
+def finish():
+    """
+    Сбрасывает кеши, которые обычно поддерживают сигналы моделей.
+    Закешированные значения read_global_rating истекают по
+    FORUM_GLOBAL_RATING_CACHE_TTL.
+    """
+    bump_versions(*(model._meta.label for model in (CustomUser, Forum, Post, Rating, GlobalRating)))
+    invalidate_leaderboard()
+
+
+def seed(users, forums, posts, ratings, password='password', days=365, random_seed=None, log=None):
+    """
+    Генерирует синтетический набор данных. Возвращает число созданных строк
+    по моделям.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(random_seed)
+    size = batch_size()
+    # PBKDF2 — сотни миллисекунд на хеш: один хеш на всех пользователей
+    hashed = make_password(password)
+    run = secrets.token_hex(3)
+    now = timezone.now()
+
+    insert(CustomUser, (CustomUser(username=f'seed-{run}-{i}', password=hashed) for i in range(users)), size)
+    user_ids = list(CustomUser.objects.filter(username__startswith=f'seed-{run}-').values_list('id', flat=True))
+    log(f"users: {len(user_ids)}")
+
+    insert(Forum, (Forum(name=f'Forum {run}-{i}', description=f'Seeded forum {i}') for i in range(forums)), size)
+    forum_ids = list(Forum.objects.filter(name__startswith=f'Forum {run}-').values_list('id', flat=True))
+    log(f"forums: {len(forum_ids)}")
+
+    if posts and not (forum_ids and user_ids):
+        raise ValueError("posts need at least one user and one forum")
+    first_post_id = (Post.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+    period = timedelta(days=days).total_seconds()
+
+    def make_posts():
+        for i in range(posts):
+            created_at = now - timedelta(seconds=rng.uniform(0, period))
+            post = Post(
+                forum_id=rng.choice(forum_ids),
+                author_id=rng.choice(user_ids),
+                title=f'Post {i}',
+                content=f'Seeded post {i} by {run}',
+                created_at=created_at,
+                updated_at=created_at,
+            )
+            # bulk_create не вызывает save(), отрывок заполняется здесь
+            post.refresh_excerpt()
+            yield post
+
+    with explicit_timestamps(Post):
+        insert(Post, make_posts(), size)
+    post_ids = list(Post.objects.filter(id__gte=first_post_id).values_list('id', flat=True))
+    log(f"posts: {len(post_ids)}")
+
+    def make_ratings():
+        # Пары (пользователь, пост) различны: каждый пользователь оценивает
+        # выборку без повторений из постов
+        per_user, extra = divmod(ratings, len(user_ids)) if user_ids else (0, 0)
+        for index, user_id in enumerate(user_ids):
+            count = min(per_user + (index < extra), len(post_ids))
+            for post_id in rng.sample(post_ids, count):
+                yield Rating(user_id=user_id, post_id=post_id, score=rng.choice((-1, 1, 1)))
+
+    created_ratings = insert(Rating, make_ratings(), size)
+    log(f"ratings: {created_ratings}")
+
+    recompute_post_scores()
+    authors = backfill_global_ratings()
+    finish()
+    log(f"global ratings: {authors}")
+    return {
+        'users': len(user_ids),
+        'forums': len(forum_ids),
+        'posts': len(post_ids),
+        'ratings': created_ratings,
+        'global_ratings': authors,
+    }
+
+
+def read_ndjson(path):
+    """
+    Построчно читает выгрузку NDJSON, в том числе сжатую gzip.
+    """
+    with open(path, 'rb') as raw:
+        compressed = raw.read(2) == b'\x1f\x8b'
+    opener = gzip.open if compressed else open
+    with opener(path, 'rt', encoding='utf-8') as lines:
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _ensure_exist(model, ids, make):
+    """
+    Создает недостающие строки model для ids: выгрузки не содержат
+    пользователей и форумов, на которые ссылаются посты и оценки.
+    """
+    ids = set(ids)
+    existing = set(model.objects.filter(id__in=ids).values_list('id', flat=True))
+    missing = [make(pk) for pk in sorted(ids - existing)]
+    if missing:
+        model.objects.bulk_create(missing)
+
+
+def _placeholder_user(hashed):
+    return lambda pk: CustomUser(id=pk, username=f'imported-{pk}', password=hashed)
+
+
+def _import_posts(rows, size, log):
+    hashed = make_password(None)
+    total = 0
+    fields = ['forum_id', 'author_id', 'title', 'content', 'created_at', 'updated_at', 'score', 'upvotes', 'downvotes']
+    with explicit_timestamps(Post):
+        for batch in batches(rows, size):
+            with transaction.atomic():
+                _ensure_exist(Forum, (row['forum_id'] for row in batch), lambda pk: Forum(id=pk, name=f'Forum {pk}', description=''))
+                _ensure_exist(CustomUser, (row['author_id'] for row in batch), _placeholder_user(hashed))
+                posts = []
+                for row in batch:
+                    values = {field: row[field] for field in fields if field in row}
+                    for name in ('created_at', 'updated_at'):
+                        if isinstance(values.get(name), str):
+                            values[name] = parse_datetime(values[name])
+                    post = Post(id=row['id'], **values)
+                    if 'content' in values:
+                        post.refresh_excerpt()
+                    posts.append(post)
+                update_fields = [field.removesuffix('_id') for field in fields if field in batch[0]]
+                if 'content' in update_fields:
+                    update_fields += ['excerpt', 'content_length']
+                Post.objects.bulk_create(
+                    posts, update_conflicts=True, unique_fields=['id'], update_fields=update_fields,
+                )
+            total += len(batch)
+            log(f"posts: {total}")
+    return total
+
+
+def _import_ratings(rows, size, log):
+    hashed = make_password(None)
+    total = 0
+    skipped = 0
+    with explicit_timestamps(Rating):
+        for batch in batches(rows, size):
+            now = timezone.now()
+            with transaction.atomic():
+                # Оценки удаленных или не загруженных постов пропускаются:
+                # иначе внешний ключ упал бы только при коммите пачки
+                posts = set(Post.objects.filter(id__in={row['post_id'] for row in batch}).values_list('id', flat=True))
+                kept = [row for row in batch if row['post_id'] in posts]
+                skipped += len(batch) - len(kept)
+                batch = kept
+                if not batch:
+                    continue
+                _ensure_exist(CustomUser, (row['user_id'] for row in batch), _placeholder_user(hashed))
+                # Выгрузки без updated_at (старые) получают время импорта
+                Rating.objects.bulk_create(
+                    [
+                        Rating(
+                            id=row['id'], user_id=row['user_id'], post_id=row['post_id'], score=row['score'],
+                            updated_at=parse_datetime(row['updated_at']) if row.get('updated_at') else now,
+                        )
+                        for row in batch
+                    ],
+                    update_conflicts=True, unique_fields=['id'], update_fields=['score', 'updated_at'],
+                )
+            total += len(batch)
+            log(f"ratings: {total}")
+    if skipped:
+        log(f"ratings: skipped {skipped} with missing posts")
+    recompute_post_scores()
+    backfill_global_ratings()
+    return total
+
+
+def _import_global_ratings(rows, size, log):
+    hashed = make_password(None)
+    total = 0
+    for batch in batches(rows, size):
+        with transaction.atomic():
+            _ensure_exist(CustomUser, (row['user_id'] for row in batch), _placeholder_user(hashed))
+            # Выгружен итоговый рейтинг: накопленное в шардах уже учтено
+            GlobalRatingShard.objects.filter(user_id__in=[row['user_id'] for row in batch]).delete()
+            GlobalRating.objects.bulk_create(
+                [GlobalRating(user_id=row['user_id'], rating=row['rating']) for row in batch],
+                update_conflicts=True, unique_fields=['user'], update_fields=['rating'],
+            )
+        total += len(batch)
+        log(f"global ratings: {total}")
+    return total
+
+
+IMPORTERS = {
+    'posts': _import_posts,
+    'ratings': _import_ratings,
+    'global-ratings': _import_global_ratings,
+}
+
+
+def import_ndjson(name, path, log=None):
+    """
+    Загружает выгрузку name (см. forum/exports.py) из файла path.
+
+    Строки с существующим id обновляются, поэтому инкрементальные выгрузки
+    можно применять поверх полной. Импорт оценок пересчитывает агрегаты
+    постов и глобальные рейтинги. Возвращает число строк.
+    """
+    total = IMPORTERS[name](read_ndjson(path), batch_size(), log or (lambda message: None))
+    finish()
+    return total
@@ -0,0 +1,123 @@
+"""
+Условные GET-запросы (ETag / Last-Modified) для постов и форумов.
+
+Валидаторы вычисляются до загрузки и сериализации строк: для одной записи —
+выборкой нескольких столбцов по первичному ключу, для списка — по версии
+модели из forum.response_cache, без обращения к базе. Версии моделей
+включенных объектов (?include=, forum.fieldsets) тоже входят в ETag.
+Запрос с совпавшим If-None-Match или неустаревшим If-Modified-Since
+получает 304.
+
+У функции валидаторов есть асинхронный вариант в атрибуте asynchronous: его
+использует декоратор метода-корутины (forum.async_views).
+"""
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .response_cache import aget_versions, get_versions, view_dependencies
+
+
+def _etag(*parts):
+    return quote_etag(hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest())
+
+
+def collection_validators(label):
+    """
+    Валидаторы списка: ETag от URL, Accept и версии модели label.
+    """
+    def etag(request, versions):
+        return _etag(label, request.build_absolute_uri(), request.META.get('HTTP_ACCEPT', ''), *versions), None
+
+    def validators(view, request, *args, **kwargs):
+        return etag(request, get_versions([label, *view_dependencies(view, request)]))
+
+    async def avalidators(view, request, *args, **kwargs):
+        return etag(request, await aget_versions([label, *view_dependencies(view, request)]))
+
+    validators.asynchronous = avalidators
+    return validators
+
+
+def object_validators(model, fields=()):
+    """
+    Валидаторы одной записи: ETag от updated_at и полей fields, Last-Modified —
+    updated_at. Голоса сдвигают updated_at поста (forum/votes.py), так что
+    Last-Modified учитывает и счетчики; fields (счетчики оценок) входят в ETag
+    на случай массовых UPDATE в обход updated_at.
+    """
+    def row(pk):
+        return model.objects.filter(pk=pk).values_list('updated_at', *fields)
+
+    def etag(request, pk, row, versions):
+        if row is None:
+            return None, None
+        updated_at = row[0]
+        etag = _etag(model._meta.label, pk, request.META.get('HTTP_ACCEPT', ''), *row, *versions)
+        return etag, timegm(updated_at.utctimetuple())
+
+    def validators(view, request, *args, **kwargs):
+        labels = view_dependencies(view, request)
+        versions = get_versions(labels) if labels else []
+        return etag(request, kwargs.get('pk'), row(kwargs.get('pk')).first(), versions)
+
+    async def avalidators(view, request, *args, **kwargs):
+        labels = view_dependencies(view, request)
+        versions = await aget_versions(labels) if labels else []
+        return etag(request, kwargs.get('pk'), await row(kwargs.get('pk')).afirst(), versions)
+
+    validators.asynchronous = avalidators
+    return validators
+
+
+def _not_modified(request, etag, last_modified):
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        patch_vary_headers(not_modified, ['Accept'])
+    return not_modified
+
+
+def _add_validators(response, etag, last_modified):
+    if response.status_code == 200:
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def conditional_response(validators):
+    """
+    Декоратор метода представления DRF: отвечает 304 по заголовкам
+    If-None-Match/If-Modified-Since и проставляет ETag и Last-Modified
+    успешным ответам.
+    """
+    def decorator(method):
+        if iscoroutinefunction(method):
+            @wraps(method)
+            async def awrapper(view, request, *args, **kwargs):
+                etag, last_modified = await validators.asynchronous(view, request, *args, **kwargs)
+                if etag is None:
+                    return await method(view, request, *args, **kwargs)
+                not_modified = _not_modified(request, etag, last_modified)
+                if not_modified is not None:
+                    return not_modified
+                return _add_validators(await method(view, request, *args, **kwargs), etag, last_modified)
+            return awrapper
+
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            etag, last_modified = validators(view, request, *args, **kwargs)
+            if etag is None:
+                return method(view, request, *args, **kwargs)
+            not_modified = _not_modified(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+            return _add_validators(method(view, request, *args, **kwargs), etag, last_modified)
+        return wrapper
+    return decorator
@@ -0,0 +1,125 @@
+"""
+Шардированный счетчик глобального рейтинга пользователя.
+
+Каждое начисление — один атомарный UPDATE случайного шарда без чтения строки.
+Чтение суммирует GlobalRating.rating и шарды и кешируется; компактизация
+переносит накопленное в шардах обратно в GlobalRating.rating.
+"""
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from .leaderboard import invalidate as invalidate_leaderboard, publish_delta as publish_leaderboard_delta
+from .models import GlobalRating, GlobalRatingShard
+from .response_cache import bump_versions
+
+
+def shard_count():
+    return getattr(settings, 'FORUM_GLOBAL_RATING_SHARDS', 8)
+
+
+def _cache_key(user_id):
+    return f"forum:global-rating:{user_id}"
+
+
+def increment_global_rating(user_id, delta):
+    """
+    Прибавляет delta к глобальному рейтингу пользователя.
+    """
+    if not delta:
+        return
+    shard = random.randrange(shard_count())
+    updated = GlobalRatingShard.objects.filter(user_id=user_id, shard=shard).update(rating=F('rating') + delta)
+    if not updated:
+        # Первое начисление в этот шард: создаем строку, а при гонке с другим
+        # писателем, успевшим ее создать, повторяем атомарный UPDATE
+        GlobalRating.objects.get_or_create(user_id=user_id)
+        try:
+            with transaction.atomic():
+                GlobalRatingShard.objects.create(user_id=user_id, shard=shard, rating=delta)
+        except IntegrityError:
+            GlobalRatingShard.objects.filter(user_id=user_id, shard=shard).update(rating=F('rating') + delta)
+    _invalidate(user_id)
+    # Разница попадает в журнал таблицы лидеров, общий для процессов
+    transaction.on_commit(lambda: publish_leaderboard_delta(user_id, delta))
+
+
+def _invalidate(user_id):
+    # Повторное удаление после коммита убирает значение, которое параллельный
+    # читатель мог закешировать до фиксации транзакции
+    key = _cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+    bump_versions(GlobalRating._meta.label)
+
+
+def read_global_rating(user_id):
+    """
+    Текущий глобальный рейтинг пользователя или None, если записи нет.
+    """
+    key = _cache_key(user_id)
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    base = GlobalRating.objects.filter(user_id=user_id).values_list('rating', flat=True).first()
+    if base is None:
+        return None
+    sharded = GlobalRatingShard.objects.filter(user_id=user_id).aggregate(total=Sum('rating'))['total'] or 0
+    value = base + sharded
+    cache.set(key, value, getattr(settings, 'FORUM_GLOBAL_RATING_CACHE_TTL', 60))
+    return value
+
+
+async def aread_global_rating(user_id):
+    key = _cache_key(user_id)
+    value = await cache.aget(key)
+    if value is not None:
+        return value
+
+    base = await GlobalRating.objects.filter(user_id=user_id).values_list('rating', flat=True).afirst()
+    if base is None:
+        return None
+    sharded = (await GlobalRatingShard.objects.filter(user_id=user_id).aaggregate(total=Sum('rating')))['total'] or 0
+    value = base + sharded
+    await cache.aset(key, value, getattr(settings, 'FORUM_GLOBAL_RATING_CACHE_TTL', 60))
+    return value
+
+
+def reset_global_rating(user_id, value):
+    """
+    Устанавливает рейтинг в value, сбрасывая накопленное в шардах.
+    """
+    with transaction.atomic():
+        GlobalRatingShard.objects.filter(user_id=user_id).delete()
+        GlobalRating.objects.filter(user_id=user_id).update(rating=value)
+        _invalidate(user_id)
+        transaction.on_commit(invalidate_leaderboard)
+
+
+def compact_global_ratings(user_ids=None):
+    """
+    Переносит значения шардов в GlobalRating.rating.
+
+    Из каждого шарда вычитается ровно прочитанное значение, поэтому
+    начисления, пришедшие во время компактизации, не теряются.
+    Возвращает число обработанных пользователей.
+    """
+    shards = GlobalRatingShard.objects.exclude(rating=0)
+    if user_ids is not None:
+        shards = shards.filter(user_id__in=user_ids)
+
+    totals = {}
+    with transaction.atomic():
+        for pk, user_id, rating in list(shards.values_list('pk', 'user_id', 'rating')):
+            GlobalRatingShard.objects.filter(pk=pk).update(rating=F('rating') - rating)
+            totals[user_id] = totals.get(user_id, 0) + rating
+        for user_id, total in totals.items():
+            GlobalRating.objects.filter(user_id=user_id).update(rating=F('rating') + total)
+
+        for user_id in totals:
+            _invalidate(user_id)
+    return len(totals)
@@ -0,0 +1,192 @@
+"""
+Потоковая выгрузка постов, оценок и глобальных рейтингов в NDJSON или CSV.
+
+Строки читаются QuerySet.iterator(chunk_size=...) в виде кортежей
+values_list, сериализуются по одной и отдаются блоками байт, поэтому память
+не зависит от размера таблицы. Используется эндпоинтом /api/export/ и
+командой export_forum.
+
+Инкрементальная выгрузка идет по ключу выгрузки: для постов и оценок
+(updated_at, id), для глобальных рейтингов — id. Значения ключа из последней
+строки предыдущей выгрузки передаются в since (и since_id). updated_at поста
+сдвигается и голосами (forum/votes.py), так что посты с новым счетом и
+измененные оценки попадают в следующую выгрузку. Глобальные рейтинги
+меняются с каждым голосом и не имеют своего времени изменения: since для них
+отбирает только новых пользователей, а актуальные значения дает полная
+выгрузка.
+"""
+import csv
+import json
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+from .models import GlobalRating, GlobalRatingShard, Post, Rating
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+# Байт в одном блоке потока: меньше блоков — меньше накладных расходов
+# на запись в сокет и сжатие
+BLOCK_SIZE = 64 * 1024
+
+
+class InvalidExport(ValueError):
+    pass
+
+
+def _chunk_size():
+    return getattr(settings, 'FORUM_EXPORT_CHUNK_SIZE', 2000)
+
+
+def _shard_total():
+    # Итоговый рейтинг — база плюс еще не свернутые шарды (см. forum/counters.py)
+    shards = (
+        GlobalRatingShard.objects.filter(user_id=OuterRef('user_id'))
+        .values('user_id')
+        .annotate(total=Sum('rating'))
+        .values('total')
+    )
+    return F('rating') + Coalesce(Subquery(shards, output_field=IntegerField()), Value(0))
+
+
+class Export:
+    """
+    Описание выгрузки одной модели: столбцы и ключ инкрементальности.
+    """
+    def __init__(self, model, columns, key='id', expressions=None):
+        self.model = model
+        self.columns = columns
+        self.key = key
+        self.expressions = expressions or {}
+
+    def queryset(self, since=None, since_id=None):
+        queryset = self.model.objects.all()
+        if since is not None:
+            if self.key == 'id':
+                queryset = queryset.filter(id__gt=since)
+            else:
+                position = Q(**{f'{self.key}__gt': since})
+                if since_id is not None:
+                    position |= Q(**{self.key: since, 'id__gt': since_id})
+                queryset = queryset.filter(position)
+        ordering = ['id'] if self.key == 'id' else [self.key, 'id']
+        values = [self.expressions[column]() if column in self.expressions else column for column in self.columns]
+        return queryset.order_by(*ordering).values_list(*values)
+
+    def parse_since(self, since, since_id=None):
+        """
+        Разбирает параметры since/since_id из запроса или командной строки.
+        """
+        if since in (None, ''):
+            return None, None
+        if self.key == 'id':
+            try:
+                return int(since), None
+            except (TypeError, ValueError):
+                raise InvalidExport("since must be an integer id")
+        value = parse_datetime(since) if isinstance(since, str) else since
+        if not isinstance(value, datetime):
+            raise InvalidExport("since must be an ISO 8601 datetime")
+        if is_naive(value):
+            value = make_aware(value)
+        if since_id in (None, ''):
+            return value, None
+        try:
+            return value, int(since_id)
+        except (TypeError, ValueError):
+            raise InvalidExport("since_id must be an integer")
+
+
+EXPORTS = {
+    'posts': Export(
+        Post,
+        ['id', 'forum_id', 'author_id', 'title', 'content', 'created_at', 'updated_at', 'score', 'upvotes', 'downvotes'],
+        key='updated_at',
+    ),
+    'ratings': Export(Rating, ['id', 'user_id', 'post_id', 'score', 'updated_at'], key='updated_at'),
+    'global-ratings': Export(GlobalRating, ['id', 'user_id', 'rating'], expressions={'rating': _shard_total}),
+}
+
+
+def get_export(name):
+    try:
+        return EXPORTS[name]
+    except KeyError:
+        raise InvalidExport(f"unknown export {name!r}, expected one of: {', '.join(EXPORTS)}")
+
+
+def _text(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class _Line:
+    """
+    Псевдофайл для csv.writer: writerow возвращает записанную строку.
+    """
+    def write(self, value):
+        return value
+
+
+def _ndjson_lines(columns, rows):
+    # Время пишется с микросекундами: оно же служит значением since
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode({column: _text(value) for column, value in zip(columns, row)}) + '\n'
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_text(value) for value in row])
+
+
+def _blocks(lines):
+    block = []
+    size = 0
+    for line in lines:
+        data = line.encode()
+        block.append(data)
+        size += len(data)
+        if size >= BLOCK_SIZE:
+            yield b''.join(block)
+            block = []
+            size = 0
+    if block:
+        yield b''.join(block)
+
+
+def _gzip(blocks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(name, fmt='ndjson', since=None, since_id=None, gzip=False):
+    """
+    Генератор блоков байт выгрузки name в формате fmt.
+
+    Ошибки в параметрах (InvalidExport) выбрасываются сразу при вызове,
+    а не при первом чтении из генератора.
+    """
+    export = get_export(name)
+    if fmt not in FORMATS:
+        raise InvalidExport(f"unknown format {fmt!r}, expected one of: {', '.join(FORMATS)}")
+    since, since_id = export.parse_since(since, since_id)
+    rows = export.queryset(since, since_id).iterator(chunk_size=_chunk_size())
+    lines = (_ndjson_lines if fmt == 'ndjson' else _csv_lines)(export.columns, rows)
+    blocks = _blocks(lines)
+    return _gzip(blocks) if gzip else blocks
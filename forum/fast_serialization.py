@@ -0,0 +1,172 @@
+"""
+Быстрая сериализация списков и карточек только для чтения.
+
+ModelSerializer создает объект модели на каждую строку и вызывает
+to_representation каждого поля через общий механизм сериализатора. Для
+сериализаторов из простых полей (числа, строки, даты, первичные ключи
+связей) план полей компилируется один раз на набор полей: какие столбцы
+выбрать через values_list() и какие поля нужно преобразовывать. Строка
+превращается в тот же словарь, что отдал бы сериализатор; после рендеринга
+ответ совпадает побайтно (это проверяют тесты).
+
+Сериализаторы с другими полями, запросы с ?include= и
+FORUM_FAST_SERIALIZATION = False идут обычным путем.
+"""
+import datetime
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.http import Http404
+from django.utils import timezone
+from rest_framework import ISO_8601
+from rest_framework import fields as drf_fields
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from mainapp.server_timing import span
+
+from .fieldsets import requested
+
+# Поля, у которых to_representation значения из базы возвращает его же
+AS_IS = (drf_fields.IntegerField, drf_fields.CharField, drf_fields.BooleanField)
+CONVERTED = (drf_fields.DateTimeField, drf_fields.DateField)
+ZERO = datetime.timedelta(0)
+
+
+def _utc_converter(field):
+    """
+    Эквивалент field.to_representation при текущей зоне UTC или None.
+
+    DateTimeField переводит дату в текущую зону (astimezone — большая часть
+    его времени) и форматирует ISO 8601; для дат в UTC при зоне UTC
+    результат тот же, что у isoformat() без перевода.
+    """
+    if not isinstance(field, drf_fields.DateTimeField):
+        return None
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if not settings.USE_TZ or hasattr(field, 'timezone') or output_format is None or output_format.lower() != ISO_8601:
+        return None
+
+    def convert(value):
+        if isinstance(value, str) or value.utcoffset() != ZERO:
+            return field.to_representation(value)
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+class FieldPlan:
+    """
+    Столбцы values_list() и преобразование строки в словарь ответа.
+    """
+    def __init__(self, names, columns, converters):
+        self.names = names
+        self.columns = columns
+        # (поле, индекс, to_representation, вариант для зоны UTC)
+        self.converters = converters
+
+    def values(self, queryset, ordering=()):
+        """
+        queryset строк плана; ordering — ключ курсора, его столбцы
+        добавляются в конец строки для пагинатора.
+        """
+        extra = [name.lstrip('-') for name in ordering if name.lstrip('-') not in self.columns]
+        return queryset.values_list(*self.columns, *extra, named=True)
+
+    def render_many(self, rows):
+        names = self.names
+        # Текущая зона читается один раз на ответ, а не на каждое значение
+        tz = timezone.get_current_timezone()
+        utc = tz is datetime.timezone.utc or getattr(tz, 'key', None) == 'UTC'
+        converters = [(name, index, (utc and fast) or exact) for name, index, exact, fast in self.converters]
+        with span('serialize'):
+            result = []
+            for row in rows:
+                data = dict(zip(names, row))
+                for name, index, convert in converters:
+                    value = row[index]
+                    data[name] = None if value is None else convert(value)
+                result.append(data)
+            return result
+
+
+def _column(model, field):
+    if isinstance(field, PrimaryKeyRelatedField):
+        if field.pk_field is not None:
+            return None
+    elif not isinstance(field, AS_IS + CONVERTED):
+        return None
+    if '.' in field.source:
+        return None
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return None
+    return model_field.attname if model_field.concrete else None
+
+
+@lru_cache(maxsize=None)
+def compile_plan(serializer_class, names=None):
+    """
+    План для serializer_class и полей names (None — все) или None, если
+    сериализатор нельзя обойти.
+    """
+    model = serializer_class.Meta.model
+    declared = serializer_class().fields
+    names = [name for name in declared if names is None or name in names]
+    columns, converters = [], []
+    for index, name in enumerate(names):
+        field = declared[name]
+        column = _column(model, field)
+        if column is None or field.write_only:
+            return None
+        columns.append(column)
+        if isinstance(field, CONVERTED):
+            converters.append((name, index, field.to_representation, _utc_converter(field)))
+    return FieldPlan(names, columns, converters)
+
+
+def plan_for(serializer_class, request):
+    if not getattr(settings, 'FORUM_FAST_SERIALIZATION', True):
+        return None
+    names, includes = requested(serializer_class, request)
+    if includes:
+        return None
+    return compile_plan(serializer_class, tuple(names) if names is not None else None)
+
+
+class FastSerializationMixin:
+    """
+    Примесь к ModelViewSet: list() и retrieve() по плану полей, если он есть.
+    """
+    def get_field_plan(self):
+        return plan_for(self.get_serializer_class(), self.request)
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_field_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        ordering = self.paginator.get_ordering(request) if hasattr(self.paginator, 'get_ordering') else ()
+        queryset = plan.values(self.filter_queryset(self.get_queryset()), ordering)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(plan.render_many(queryset))
+        return self.get_paginated_response(plan.render_many(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        plan = self.get_field_plan()
+        if plan is None:
+            return super().retrieve(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup = {self.lookup_field: self.kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        try:
+            row = plan.values(queryset).filter(**lookup).first()
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        if row is None:
+            # Текст как у get_object_or_404 обычного пути
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        self.check_object_permissions(request, row)
+        return Response(plan.render_many([row])[0])
@@ -0,0 +1,144 @@
+"""
+Разреженные наборы полей (?fields=) и вложение связанных объектов (?include=).
+
+?fields=id,title,created_at оставляет в ответе только перечисленные поля
+сериализатора, ?include=author,forum заменяет идентификаторы внешних
+ключей вложенными объектами. Запрос строится по тем же параметрам: only()
+загружает только нужные столбцы (и без ?fields= — только столбцы полей
+сериализатора), а включения читаются тем же запросом через
+select_related, поэтому список с авторами — один запрос, а не 1+N.
+
+Разрешенные включения сериализатор перечисляет в Meta.includes (поле ->
+сериализатор вложенного объекта). Параметры действуют только на чтение;
+неизвестные поля и включения, а также пустой ?fields= — 400.
+"""
+from functools import lru_cache
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import ListSerializer
+
+FIELDS_PARAM = 'fields'
+INCLUDE_PARAM = 'include'
+
+
+@lru_cache(maxsize=None)
+def _sources(serializer_class):
+    # Поле сериализатора -> атрибут модели
+    return {name: field.source for name, field in serializer_class().fields.items()}
+
+
+def _names(request, param):
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+
+
+def _includes(serializer_class):
+    return getattr(serializer_class.Meta, 'includes', {})
+
+
+def requested(serializer_class, request):
+    """
+    (поля, включения) запроса для serializer_class; поля None — все.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None, []
+    fields = _names(request, FIELDS_PARAM)
+    includes = _names(request, INCLUDE_PARAM) or []
+
+    if fields == []:
+        raise ValidationError({FIELDS_PARAM: "Expected a comma-separated list of fields"})
+    unknown = [name for name in fields or () if name not in _sources(serializer_class)]
+    if unknown:
+        raise ValidationError({FIELDS_PARAM: f"Unknown fields: {', '.join(unknown)}"})
+    unknown = [name for name in includes if name not in _includes(serializer_class)]
+    if unknown:
+        allowed = ', '.join(_includes(serializer_class)) or 'none'
+        raise ValidationError({INCLUDE_PARAM: f"Unknown includes: {', '.join(unknown)}; allowed: {allowed}"})
+
+    if fields is not None:
+        # Включенный объект попадает в ответ, даже если его нет в fields
+        fields += [name for name in includes if name not in fields]
+    return fields, includes
+
+
+def dependencies(serializer_class, request):
+    """
+    Метки моделей включенных объектов: от них тоже зависит ответ.
+    """
+    _, includes = requested(serializer_class, request)
+    return [_includes(serializer_class)[name].Meta.model._meta.label for name in includes]
+
+
+def _columns(model, serializer_class, names):
+    columns = {model._meta.pk.name}
+    for name in names:
+        source = _sources(serializer_class)[name]
+        field = next((field for field in model._meta.concrete_fields if field.name == source), None)
+        if field is not None:
+            columns.add(field.name)
+    return columns
+
+
+def sparse_queryset(queryset, serializer_class, request, required=()):
+    """
+    queryset с only() по запрошенным полям и select_related по включениям.
+
+    Без ?fields= загружаются столбцы всех полей сериализатора: столбцы, которых
+    в нем нет (текст поста в PostListSerializer), не читаются из базы.
+
+    required — столбцы, которые нужны независимо от ответа (например, ключ
+    курсора пагинации): без них каждое обращение к ним было бы запросом.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return queryset
+    fields, includes = requested(serializer_class, request)
+    model = queryset.model
+    columns = _columns(model, serializer_class, fields if fields is not None else _sources(serializer_class))
+    columns.update(required)
+    if not includes and columns.issuperset(field.name for field in model._meta.concrete_fields):
+        return queryset
+    for name in includes:
+        nested = _includes(serializer_class)[name]
+        related = model._meta.get_field(name).related_model
+        columns.update(f'{name}__{column}' for column in _columns(related, nested, _sources(nested)))
+    return queryset.select_related(*includes).only(*columns)
+
+
+class SparseFieldsetMixin:
+    """
+    Примесь к ModelSerializer: поля и включения из параметров запроса.
+
+    Действует только на сериализатор верхнего уровня (или элемент списка):
+    вложенные объекты всегда выводятся целиком.
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent.parent if isinstance(self.parent, ListSerializer) else self.parent
+        if parent is not None:
+            return fields
+        names, includes = requested(type(self), self.context.get('request'))
+        if names is not None:
+            fields = {name: field for name, field in fields.items() if name in names}
+        for name in includes:
+            fields[name] = _includes(type(self))[name](read_only=True)
+        return fields
+
+
+class SparseQuerysetMixin:
+    """
+    Примесь к представлению: get_sparse_queryset() и зависимости ?include=
+    для кеша ответов и ETag.
+    """
+    def get_sparse_queryset(self, queryset, paginator=None):
+        if paginator is None and self.pagination_class is not None:
+            paginator = self.pagination_class()
+        required = ()
+        if hasattr(paginator, 'get_ordering'):
+            required = [name.lstrip('-') for name in paginator.get_ordering(self.request)]
+        return sparse_queryset(queryset, self.get_serializer_class(), self.request, required)
+
+    def get_cache_dependencies(self, request):
+        return dependencies(self.get_serializer_class(), request)
@@ -0,0 +1,218 @@
+"""
+Хеширование паролей в пуле процессов.
+
+PBKDF2 — сотни миллисекунд процессора на пароль; при массовом входе он
+занимал бы рабочие потоки и процессы веб-сервера. Вход и регистрация
+отдают хеширование пулу из FORUM_HASHING_WORKERS процессов: под ASGI
+ожидают результат, не занимая цикл событий, под WSGI — блокируясь. Заданий
+в очереди и в работе не больше FORUM_HASHING_QUEUE_LIMIT; сверх этого
+сразу PasswordHashingBusy (503 с Retry-After). FORUM_HASHING_WORKERS = 0
+хеширует в текущем процессе.
+
+Процессы пула запускаются при первом хешировании методом spawn (fork
+процесса с потоками небезопасен) и используют только настройки Django.
+Вход без пула (authenticate()) остается для нестандартных
+AUTHENTICATION_BACKENDS.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import aauthenticate, authenticate, get_user_model
+from django.contrib.auth.hashers import make_password, verify_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from mainapp.metrics import store
+
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many password checks in progress, try again later."
+    default_code = 'password_hashing_busy'
+    # Обработчик исключений DRF выставит Retry-After
+    wait = 1
+
+
+def _setup_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+
+def _verify(password, encoded):
+    if encoded is None:
+        # Неизвестный пользователь: хеш все равно считается, как в
+        # ModelBackend, чтобы время ответа не выдавало существование имени
+        make_password(password)
+        return False, None
+    valid, must_update = verify_password(password, encoded)
+    return valid, make_password(password) if valid and must_update else None
+
+
+class HashingPool:
+    def __init__(self, workers=None, limit=None):
+        self._workers = workers
+        self._limit = limit
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = 0
+
+    @property
+    def workers(self):
+        return self._workers if self._workers is not None else getattr(settings, 'FORUM_HASHING_WORKERS', 2)
+
+    @property
+    def limit(self):
+        return self._limit or getattr(settings, 'FORUM_HASHING_QUEUE_LIMIT', 16)
+
+    @property
+    def depth(self):
+        """
+        Заданий в очереди и в работе.
+        """
+        return self._pending
+
+    def submit(self, func, *args):
+        with self._lock:
+            if self._pending >= self.limit:
+                _count_rejection()
+                raise PasswordHashingBusy
+            try:
+                future = self._get_executor().submit(func, *args)
+            except BrokenProcessPool:
+                # Процесс пула упал (например, по OOM): пул пересоздается
+                self._executor = None
+                future = self._get_executor().submit(func, *args)
+            self._pending += 1
+        future.add_done_callback(self._done)
+        return future
+
+    def run(self, operation, func, *args):
+        started = time.perf_counter()
+        try:
+            if not self.workers:
+                return func(*args)
+            return self.submit(func, *args).result()
+        finally:
+            _observe(operation, time.perf_counter() - started)
+
+    async def arun(self, operation, func, *args):
+        started = time.perf_counter()
+        try:
+            if not self.workers:
+                return await sync_to_async(func, thread_sensitive=False)(*args)
+            return await asyncio.wrap_future(self.submit(func, *args))
+        finally:
+            _observe(operation, time.perf_counter() - started)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_setup_worker,
+                initargs=(settings.SETTINGS_MODULE,),
+            )
+        return self._executor
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+
+hashing_pool = HashingPool()
+
+
+def _observe(operation, elapsed):
+    if getattr(settings, 'METRICS_ENABLED', False):
+        store.observe('forum_password_hash_duration_seconds', {'operation': operation}, elapsed)
+
+
+def _count_rejection():
+    if getattr(settings, 'METRICS_ENABLED', False):
+        store.inc('forum_password_hash_rejected_total', {})
+
+
+def _model_backend_only():
+    return list(settings.AUTHENTICATION_BACKENDS) == [MODEL_BACKEND]
+
+
+def _accept(user, valid):
+    # Как ModelBackend: неактивные пользователи не входят
+    if user is None or not valid or not getattr(user, 'is_active', True):
+        return None
+    user.backend = MODEL_BACKEND
+    return user
+
+
+def authenticate_user(username, password):
+    """
+    authenticate(username=..., password=...) с проверкой пароля в пуле.
+    """
+    if not _model_backend_only():
+        return authenticate(username=username, password=password)
+    if username is None or password is None:
+        return None
+    User = get_user_model()
+    user = User._default_manager.filter(**{User.USERNAME_FIELD: username}).first()
+    valid, rehashed = hashing_pool.run('verify', _verify, password, user.password if user else None)
+    if rehashed:
+        user.password = rehashed
+        user.save(update_fields=['password'])
+    return _accept(user, valid)
+
+
+async def aauthenticate_user(username, password):
+    if not _model_backend_only():
+        return await aauthenticate(username=username, password=password)
+    if username is None or password is None:
+        return None
+    User = get_user_model()
+    user = await User._default_manager.filter(**{User.USERNAME_FIELD: username}).afirst()
+    valid, rehashed = await hashing_pool.arun('verify', _verify, password, user.password if user else None)
+    if rehashed:
+        user.password = rehashed
+        await user.asave(update_fields=['password'])
+    return _accept(user, valid)
+
+
+def _new_user(username, email, encoded, extra_fields):
+    User = get_user_model()
+    return User(
+        username=User.normalize_username(username),
+        email=User._default_manager.normalize_email(email),
+        password=encoded,
+        **extra_fields,
+    )
+
+
+def create_user(username, email, password, **extra_fields):
+    """
+    User.objects.create_user() с хешированием пароля в пуле.
+    """
+    if not username:
+        raise ValueError("The given username must be set")
+    user = _new_user(username, email, hashing_pool.run('make', make_password, password), extra_fields)
+    user.save()
+    return user
+
+
+async def acreate_user(username, email, password, **extra_fields):
+    if not username:
+        raise ValueError("The given username must be set")
+    user = _new_user(username, email, await hashing_pool.arun('make', make_password, password), extra_fields)
+    await user.asave()
+    return user
@@ -0,0 +1,218 @@
+"""
+Таблица лидеров по глобальному рейтингу.
+
+Каждый процесс держит отсортированный список ключей (-рейтинг, user_id),
+поэтому топ-K и ранг пользователя находятся бинарным поиском без запросов
+к базе. Список строится одним запросом ORDER BY rating DESC по индексу
+GlobalRating плюс сумма еще не свернутых шардов.
+
+Состояние списков всех процессов сверяется через кеш default (он общий для
+процессов, mainapp.shared_cache):
+
+- начисления (forum.counters) после коммита пишутся в общий журнал:
+  SEQUENCE_KEY — номер последнего начисления, DELTA_KEY — само начисление.
+  Перед чтением процесс одним get_many сверяет номер со своим и применяет
+  недостающие начисления, в том числе начисления других процессов;
+- изменения, которые нельзя выразить разницей (сброс, удаление, правка
+  в админке), увеличивают VERSION_KEY, и процессы перестраивают список.
+
+Если начисления не успели записаться или уже истекли, список перестраивается
+по базе не позже чем через FORUM_LEADERBOARD_MAX_AGE секунд.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .models import GlobalRating, GlobalRatingShard
+
+VERSION_KEY = "forum:leaderboard:version"
+SEQUENCE_KEY = "forum:leaderboard:sequence"
+DELTA_KEY = "forum:leaderboard:delta:{}"
+# Отставание больше этого числа начислений дешевле догнать перестройкой
+CATCH_UP_LIMIT = 500
+
+
+def _max_age():
+    return getattr(settings, 'FORUM_LEADERBOARD_MAX_AGE', 30)
+
+
+def _bump(key):
+    """
+    Увеличивает счетчик key в кеше и возвращает новое значение; (1, True),
+    если счетчика не было.
+    """
+    if cache.add(key, 1, None):
+        return 1, True
+    try:
+        return cache.incr(key), False
+    except ValueError:
+        cache.set(key, 1, None)
+        return 1, True
+
+
+def invalidate():
+    """
+    Помечает таблицы лидеров всех процессов устаревшими.
+    """
+    _bump(VERSION_KEY)
+
+
+def publish_delta(user_id, delta):
+    """
+    Записывает начисление в общий журнал: списки всех процессов применят его
+    при следующем чтении. Вызывается после коммита начисления.
+    """
+    sequence, restarted = _bump(SEQUENCE_KEY)
+    if restarted:
+        # Номер создается при построении списка; его нет, если списков еще не
+        # строили или ключ вытеснен — тогда номера начинаются заново, и
+        # списки, отсчитывавшие прежние, перестраиваются
+        invalidate()
+    # Старше max_age начисления не нужны: такой список перестраивается
+    cache.set(DELTA_KEY.format(sequence), (user_id, delta), 2 * _max_age())
+
+
+class Leaderboard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._ratings = {}
+        self._version = None
+        self._sequence = 0
+        self._built_at = None
+
+    def _is_recent(self):
+        if self._built_at is None:
+            return False
+        return time.monotonic() - self._built_at <= _max_age()
+
+    @staticmethod
+    def _state(values):
+        return values.get(VERSION_KEY), values.get(SEQUENCE_KEY, 0)
+
+    def _is_fresh(self, state):
+        return self._is_recent() and state == (self._version, self._sequence)
+
+    async def _ais_fresh(self):
+        return self._is_fresh(self._state(await cache.aget_many([VERSION_KEY, SEQUENCE_KEY])))
+
+    def ensure_fresh(self):
+        state = self._state(cache.get_many([VERSION_KEY, SEQUENCE_KEY]))
+        if self._is_fresh(state):
+            return
+        version, sequence = state
+        with self._lock:
+            if not (self._is_recent() and version == self._version and self._catch_up(sequence)):
+                self._rebuild()
+
+    def _catch_up(self, sequence):
+        """
+        Применяет начисления журнала с номерами до sequence. False, если
+        отставание слишком велико и список нужно перестроить.
+        """
+        if sequence <= self._sequence:
+            return True
+        if sequence - self._sequence > CATCH_UP_LIMIT:
+            return False
+        numbers = range(self._sequence + 1, sequence + 1)
+        deltas = cache.get_many([DELTA_KEY.format(number) for number in numbers])
+        for number in numbers:
+            delta = deltas.get(DELTA_KEY.format(number))
+            if delta is None:
+                # Номер уже выдан, а начисление еще не записано (или истекло):
+                # следующее чтение продолжит с него
+                break
+            self._apply(*delta)
+            self._sequence = number
+        return True
+
+    def _rebuild(self):
+        # Версия и номер журнала всегда есть в кеше после построения: их
+        # исчезновение (очистка или вытеснение) тоже считается инвалидацией.
+        # Номер читается до базы: начисление между ними применится повторно,
+        # и разницу исправит перестройка через max_age
+        version = cache.get_or_set(VERSION_KEY, 1, None)
+        sequence = cache.get_or_set(SEQUENCE_KEY, 0, None)
+        ratings = dict(GlobalRating.objects.order_by('-rating', 'user_id').values_list('user_id', 'rating'))
+        pending = (
+            GlobalRatingShard.objects.exclude(rating=0)
+            .values('user_id')
+            .annotate(total=Sum('rating'))
+            .values_list('user_id', 'total')
+        )
+        for user_id, total in pending:
+            if user_id in ratings:
+                ratings[user_id] += total
+        self._ratings = ratings
+        self._keys = sorted((-rating, user_id) for user_id, rating in ratings.items())
+        self._version = version
+        self._sequence = sequence
+        self._built_at = time.monotonic()
+
+    def _apply(self, user_id, delta):
+        # Сдвиг рейтинга пользователя за O(log N) поиска
+        rating = self._ratings.get(user_id)
+        if rating is not None:
+            index = bisect_left(self._keys, (-rating, user_id))
+            del self._keys[index]
+        else:
+            rating = 0
+        rating += delta
+        self._ratings[user_id] = rating
+        insort(self._keys, (-rating, user_id))
+
+    def top(self, limit):
+        self.ensure_fresh()
+        with self._lock:
+            return self._top(limit)
+
+    def around(self, user_id, radius):
+        """
+        Окрестность пользователя: radius мест выше и ниже. None, если
+        у пользователя нет глобального рейтинга.
+        """
+        self.ensure_fresh()
+        with self._lock:
+            return self._around(user_id, radius)
+
+    async def atop(self, limit):
+        return await self._aread(self.top, self._top, limit)
+
+    async def aaround(self, user_id, radius):
+        return await self._aread(self.around, self._around, user_id, radius)
+
+    async def _aread(self, method, read, *args):
+        # Свежий и свободный список читается прямо в цикле событий; перестройка
+        # (запросы к базе под блокировкой) идет в потоке, чтобы не ждать
+        # блокировку в цикле
+        if await self._ais_fresh() and self._lock.acquire(blocking=False):
+            try:
+                return read(*args)
+            finally:
+                self._lock.release()
+        return await sync_to_async(method)(*args)
+
+    def _top(self, limit):
+        return self._entries(0, limit)
+
+    def _around(self, user_id, radius):
+        rating = self._ratings.get(user_id)
+        if rating is None:
+            return None, []
+        index = bisect_left(self._keys, (-rating, user_id))
+        start = max(index - radius, 0)
+        return index + 1, self._entries(start, index + radius + 1)
+
+    def _entries(self, start, stop):
+        return [
+            (position + 1, user_id, -negative)
+            for position, (negative, user_id) in enumerate(self._keys[start:stop], start)
+        ]
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from forum.counters import compact_global_ratings
+
+
+class Command(BaseCommand):
+    help = "Переносит накопленные шарды глобального рейтинга в GlobalRating.rating"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help="ID пользователя (можно несколько раз)")
+
+    def handle(self, *args, **options):
+        compacted = compact_global_ratings(options['users'])
+        self.stdout.write(self.style.SUCCESS(f"Compacted global ratings for {compacted} user(s)"))
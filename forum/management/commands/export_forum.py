@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from forum.exports import EXPORTS, FORMATS, InvalidExport, stream_export
+
+
+class Command(BaseCommand):
+    help = "Выгружает посты, оценки или глобальные рейтинги в NDJSON или CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=list(EXPORTS), help="Что выгружать")
+        parser.add_argument('--format', choices=list(FORMATS), default='ndjson', dest='fmt')
+        parser.add_argument('--since', help="Для постов и оценок — updated_at (ISO 8601), для глобальных рейтингов — id")
+        parser.add_argument('--since-id', help="Для постов и оценок: id последней строки с updated_at, равным --since")
+        parser.add_argument('--gzip', action='store_true', help="Сжимать вывод gzip")
+        parser.add_argument('--output', '-o', default='-', help="Файл для записи, '-' — stdout")
+
+    def handle(self, *args, **options):
+        try:
+            blocks = stream_export(
+                options['name'],
+                options['fmt'],
+                since=options['since'],
+                since_id=options['since_id'],
+                gzip=options['gzip'],
+            )
+        except InvalidExport as exc:
+            raise CommandError(exc)
+
+        if options['output'] == '-':
+            self._write(blocks, sys.stdout.buffer)
+        else:
+            with open(options['output'], 'wb') as output:
+                self._write(blocks, output)
+
+    def _write(self, blocks, output):
+        for block in blocks:
+            output.write(block)
+        output.flush()
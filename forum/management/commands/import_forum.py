@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from forum.bulk import IMPORTERS, import_ndjson
+
+
+class Command(BaseCommand):
+    help = "Загружает выгрузку NDJSON (export_forum) постов, оценок или глобальных рейтингов"
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=list(IMPORTERS), help="Что загружать")
+        parser.add_argument('path', help="Файл NDJSON, можно сжатый gzip")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = import_ndjson(options['name'], options['path'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Imported {total} {options['name']} in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,55 @@
+import os
+import pstats
+
+from django.core.management.base import BaseCommand
+
+from mainapp.profiling import directory, fold_stacks, profile_files
+
+
+class Command(BaseCommand):
+    help = "Сводит профили запросов (ProfilingMiddleware) в топ горячих функций по маршрутам"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="Каталог профилей, по умолчанию PROFILING_DIR")
+        parser.add_argument('--top', type=int, default=15, help="Сколько функций показывать")
+        parser.add_argument('--route', action='append', dest='routes', help="Только этот url_name (можно несколько раз)")
+        parser.add_argument('--sort', choices=['tottime', 'cumtime'], default='tottime',
+                            help="Собственное время функции или вместе с вызванными")
+
+    def handle(self, *args, **options):
+        routes = profile_files(options['dir'] or directory())
+        if options['routes']:
+            routes = {route: paths for route, paths in routes.items() if route in options['routes']}
+        if not routes:
+            self.stdout.write("No profiles found")
+            return
+
+        for route, paths in sorted(routes.items()):
+            durations = [self._duration(path) for path in paths]
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{route}: {len(paths)} profile(s), mean {sum(durations) / len(durations):.1f} ms, max {max(durations):.0f} ms"
+            ))
+            profiles = [path for path in paths if path.endswith('.prof')]
+            samples = [path for path in paths if path.endswith('.folded')]
+            if profiles:
+                self._report_profiles(profiles, options['top'], options['sort'])
+            if samples:
+                self._report_samples(samples, options['top'], options['sort'])
+
+    def _duration(self, path):
+        return float(os.path.basename(path).split('__')[1].removesuffix('ms'))
+
+    def _report_profiles(self, paths, top, sort):
+        stats = pstats.Stats(*paths).stats
+        index = 2 if sort == 'tottime' else 3
+        rows = sorted(stats.items(), key=lambda item: item[1][index], reverse=True)[:top]
+        self.stdout.write(f"  {'tottime, ms':>12} {'cumtime, ms':>12} {'calls':>9}  function")
+        for (filename, line, function), (_, calls, tottime, cumtime, _) in rows:
+            self.stdout.write(f"  {tottime * 1000:>12.2f} {cumtime * 1000:>12.2f} {calls:>9}  {filename}:{line}({function})")
+
+    def _report_samples(self, paths, top, sort):
+        total, own, inclusive = fold_stacks(paths)
+        counter = own if sort == 'tottime' else inclusive
+        self.stdout.write(f"  {'self, %':>8} {'total, %':>9}  function ({total} samples)")
+        for frame, _ in counter.most_common(top):
+            self.stdout.write(f"  {own[frame] * 100 / total:>8.1f} {inclusive[frame] * 100 / total:>9.1f}  {frame}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from forum.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Перестраивает полнотекстовый индекс постов (forum_post_fts)"
+
+    def handle(self, *args, **options):
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from forum.bulk import seed
+
+
+class Command(BaseCommand):
+    help = "Создает синтетический набор пользователей, форумов, постов и оценок"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--forums', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--ratings', type=int, default=50000)
+        parser.add_argument('--password', default='password', help="Пароль всех созданных пользователей")
+        parser.add_argument('--days', type=int, default=365, help="За сколько дней распределить даты постов")
+        parser.add_argument('--seed', type=int, help="Зерно генератора случайных чисел")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            created = seed(
+                options['users'],
+                options['forums'],
+                options['posts'],
+                options['ratings'],
+                password=options['password'],
+                days=options['days'],
+                random_seed=options['seed'],
+                log=self.stdout.write,
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+        summary = ", ".join(f"{count} {name}" for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary} in {time.perf_counter() - started:.1f}s"))
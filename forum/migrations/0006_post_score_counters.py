@@ -0,0 +1,57 @@
+# Generated by Django 5.1 on 2026-10-17 12:57
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_post_scores(apps, schema_editor):
+    Post = apps.get_model('forum', 'Post')
+    Rating = apps.get_model('forum', 'Rating')
+
+    def aggregate(expression):
+        ratings = (
+            Rating.objects.filter(post=OuterRef('pk'))
+            .order_by()
+            .values('post')
+            .annotate(value=expression)
+            .values('value')
+        )
+        return Coalesce(Subquery(ratings, output_field=IntegerField()), Value(0))
+
+    # Один UPDATE на всю таблицу вместо пересчета по каждому посту
+    Post.objects.update(
+        score=aggregate(Sum('score')),
+        upvotes=aggregate(Count('pk', filter=Q(score__gt=0))),
+        downvotes=aggregate(Count('pk', filter=Q(score__lt=0))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0005_post_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='downvotes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='upvotes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-score', '-id'], name='post_score_id_idx'),
+        ),
+        migrations.RunPython(backfill_post_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-17 13:01
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0007_globalratingshard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rating',
+            name='previous_score',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='rating',
+            name='score',
+            field=models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(-1), django.core.validators.MaxValueValidator(1)]),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-17 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0008_rating_previous_score'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='globalrating',
+            index=models.Index(fields=['-rating', 'user'], name='globalrating_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+# Полнотекстовый индекс постов (SQLite FTS5, внешний контент forum_post).
+# Триггер на UPDATE срабатывает только при изменении title/content, чтобы
+# частые обновления счетчиков поста не трогали индекс.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE forum_post_fts USING fts5(
+        title, content,
+        content='forum_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER forum_post_fts_insert AFTER INSERT ON forum_post BEGIN
+        INSERT INTO forum_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER forum_post_fts_delete AFTER DELETE ON forum_post BEGIN
+        INSERT INTO forum_post_fts(forum_post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER forum_post_fts_update AFTER UPDATE OF title, content ON forum_post BEGIN
+        INSERT INTO forum_post_fts(forum_post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO forum_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    "INSERT INTO forum_post_fts(forum_post_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS forum_post_fts_update",
+    "DROP TRIGGER IF EXISTS forum_post_fts_delete",
+    "DROP TRIGGER IF EXISTS forum_post_fts_insert",
+    "DROP TABLE IF EXISTS forum_post_fts",
+]
+
+
+def run_on_sqlite(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0009_globalrating_rank_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_SQL), run_on_sqlite(DROP_SQL)),
+    ]
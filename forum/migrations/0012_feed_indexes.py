@@ -0,0 +1,21 @@
+# Generated by Django 5.1 on 2026-10-17 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0011_forum_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['forum', '-created_at', '-id'], name='post_forum_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['post', 'user'], name='rating_post_user_idx'),
+        ),
+    ]
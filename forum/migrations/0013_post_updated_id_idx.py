@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-17 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0012_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['updated_at', 'id'], name='post_updated_id_idx'),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.1 on 2026-10-17 14:50
+
+from django.db import migrations, models
+
+# SQLite добавляет столбцы NOT NULL пересозданием forum_post, и триггеры
+# полнотекстового индекса (миграция 0010) удаляются вместе со старой
+# таблицей. Они создаются заново, а индекс перестраивается.
+CREATE_TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER forum_post_fts_insert AFTER INSERT ON forum_post BEGIN
+        INSERT INTO forum_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER forum_post_fts_delete AFTER DELETE ON forum_post BEGIN
+        INSERT INTO forum_post_fts(forum_post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER forum_post_fts_update AFTER UPDATE OF title, content ON forum_post BEGIN
+        INSERT INTO forum_post_fts(forum_post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO forum_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    "INSERT INTO forum_post_fts(forum_post_fts) VALUES ('rebuild')",
+]
+
+DROP_TRIGGERS_SQL = [
+    "DROP TRIGGER IF EXISTS forum_post_fts_update",
+    "DROP TRIGGER IF EXISTS forum_post_fts_delete",
+    "DROP TRIGGER IF EXISTS forum_post_fts_insert",
+]
+
+BATCH_SIZE = 2000
+# Длина отрывка на момент миграции: настройка и forum.models.make_excerpt
+# могут измениться позже, а миграция должна давать тот же результат
+EXCERPT_LENGTH = 200
+
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    # Копия forum.models.make_excerpt на момент миграции
+    text = ' '.join(content.split())
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1]
+    space = cut.rfind(' ')
+    if space > length // 2:
+        cut = cut[:space]
+    return cut.rstrip() + '…'
+
+
+def run_on_sqlite(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return operation
+
+
+def backfill_excerpts(apps, schema_editor):
+    Post = apps.get_model('forum', 'Post')
+    batch = []
+    for post in Post.objects.only('id', 'content').iterator(chunk_size=BATCH_SIZE):
+        post.excerpt = make_excerpt(post.content)
+        post.content_length = len(post.content)
+        batch.append(post)
+        if len(batch) == BATCH_SIZE:
+            Post.objects.bulk_update(batch, ['excerpt', 'content_length'])
+            batch = []
+    Post.objects.bulk_update(batch, ['excerpt', 'content_length'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0013_post_updated_id_idx'),
+    ]
+
+    # При откате удаление столбцов тоже пересоздает таблицу: первая
+    # операция в обратном направлении восстанавливает триггеры после него
+    operations = [
+        migrations.RunPython(run_on_sqlite(DROP_TRIGGERS_SQL), run_on_sqlite(CREATE_TRIGGERS_SQL)),
+        migrations.AddField(
+            model_name='post',
+            name='content_length',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_excerpts, migrations.RunPython.noop),
+        migrations.RunPython(run_on_sqlite(CREATE_TRIGGERS_SQL), run_on_sqlite(DROP_TRIGGERS_SQL)),
+    ]
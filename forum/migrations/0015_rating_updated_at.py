@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-17 16:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0014_post_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rating',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['updated_at', 'id'], name='rating_updated_id_idx'),
+        ),
+    ]
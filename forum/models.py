@@ -1,6 +1,7 @@
 from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 
 
 class CustomUser(AbstractUser):
@@ -14,35 +15,134 @@ class CustomUser(AbstractUser):
 class Forum(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
 
+def make_excerpt(content, length=None):
+    """
+    Начало текста поста не длиннее length символов (FORUM_POST_EXCERPT_LENGTH):
+    пробелы и переводы строк схлопываются, обрезка идет по границе слова.
+    """
+    if length is None:
+        length = getattr(settings, 'FORUM_POST_EXCERPT_LENGTH', 200)
+    text = ' '.join(content.split())
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1]
+    space = cut.rfind(' ')
+    if space > length // 2:
+        cut = cut[:space]
+    return cut.rstrip() + '…'
+
+
 class Post(models.Model):
     forum = models.ForeignKey(Forum, on_delete=models.CASCADE, related_name="posts")
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="posts")
     title = models.CharField(max_length=255)
     content = models.TextField()
+    # Отрывок и длина текста для списков, чтобы не загружать в них content
+    excerpt = models.TextField(blank=True, default='', editable=False)
+    content_length = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Агрегаты оценок поста, поддерживаются сигналами Rating (forum/signals.py)
+    score = models.IntegerField(default=0)
+    upvotes = models.PositiveIntegerField(default=0)
+    downvotes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Ключ курсорной пагинации ленты постов
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+            # Ключ сортировки ленты по оценке
+            models.Index(fields=['-score', '-id'], name='post_score_id_idx'),
+            # Лента постов одного форума
+            models.Index(fields=['forum', '-created_at', '-id'], name='post_forum_created_idx'),
+            # Инкрементальная выгрузка постов (forum/exports.py)
+            models.Index(fields=['updated_at', 'id'], name='post_updated_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def refresh_excerpt(self):
+        self.excerpt = make_excerpt(self.content)
+        self.content_length = len(self.content)
+
+    def save(self, *args, **kwargs):
+        # Текст, отложенный через defer(), не меняется, и отрывок не пересчитывается
+        update_fields = kwargs.get('update_fields')
+        if 'content' in self.__dict__ and (update_fields is None or 'content' in update_fields):
+            self.refresh_excerpt()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'excerpt', 'content_length'}
+        super().save(*args, **kwargs)
+
 
 class Rating(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="ratings")
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="ratings")
-    score = models.IntegerField(default=0)  # Например, -1, 0, 1
+    score = models.IntegerField(default=0, validators=[MinValueValidator(-1), MaxValueValidator(1)])  # -1, 0, 1
+    # Оценка до последнего изменения: ее возвращает upsert голоса (forum/votes.py)
+    previous_score = models.IntegerField(default=0, editable=False)
+    # Время последней смены оценки: ключ инкрементальной выгрузки (forum/exports.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('user', 'post')
+        indexes = [
+            # Выборки оценок поста: уникальный индекс начинается с user
+            models.Index(fields=['post', 'user'], name='rating_post_user_idx'),
+            models.Index(fields=['updated_at', 'id'], name='rating_updated_id_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_persisted_state()
+        return instance
+
+    def _remember_persisted_state(self):
+        # Значения, записанные в базе: по ним сигналы считают разницу для агрегатов
+        self._persisted_score = self.__dict__.get('score')
+        self._persisted_post_id = self.__dict__.get('post_id')
+
+    def save(self, *args, **kwargs):
+        # Сигналы обновляют агрегаты поста в той же транзакции, что и сама оценка
+        self.previous_score = getattr(self, '_persisted_score', None) or 0
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._remember_persisted_state()
 
 
 class GlobalRating(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="global_rating")
     rating = models.IntegerField(default=0)  # Глобальный рейтинг пользователя
 
+    class Meta:
+        indexes = [
+            # Построение таблицы лидеров: ORDER BY rating DESC
+            models.Index(fields=['-rating', 'user'], name='globalrating_rank_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username}'s Global Rating"
+
+
+class GlobalRatingShard(models.Model):
+    """
+    Часть глобального рейтинга пользователя (см. forum/counters.py).
+
+    Оценки начисляются в случайный шард, чтобы параллельные голоса за одного
+    автора не конкурировали за одну строку. Итоговый рейтинг равен
+    GlobalRating.rating плюс сумма шардов.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="global_rating_shards")
+    shard = models.PositiveSmallIntegerField()
+    rating = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'shard')
@@ -0,0 +1,271 @@
+import base64
+import json
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .search import search_posts
+
+
+def estimate_count(model):
+    """
+    Приблизительное число строк в таблице модели.
+
+    Значение кешируется на FORUM_COUNT_ESTIMATE_TTL секунд, поэтому полный
+    подсчет выполняется не чаще одного раза за этот интервал. На PostgreSQL
+    берется оценка планировщика из pg_class, без обхода таблицы.
+    """
+    key = f"forum:count-estimate:{model._meta.db_table}"
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    connection = connections[model.objects.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [model._meta.db_table])
+            row = cursor.fetchone()
+        value = max(row[0], 0) if row else 0
+    else:
+        value = model.objects.count()
+
+    cache.set(key, value, getattr(settings, 'FORUM_COUNT_ESTIMATE_TTL', 300))
+    return value
+
+
+async def aestimate_count(model):
+    value = await cache.aget(f"forum:count-estimate:{model._meta.db_table}")
+    if value is not None:
+        return value
+    # Промах редок (раз в FORUM_COUNT_ESTIMATE_TTL): считаем синхронно в потоке
+    return await sync_to_async(estimate_count)(model)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация по уникальному набору полей `ordering`.
+
+    Следующая страница выбирается условием `(f1, f2, ...) > (v1, v2, ...)`
+    по значениям последней строки, поэтому глубокие страницы стоят столько же,
+    сколько первая, и COUNT(*) не выполняется. Курсор непрозрачен для клиента:
+    это base64 от значений ключа последней строки.
+
+    `orderings` перечисляет допустимые значения параметра `ordering`; каждой
+    сортировке должен соответствовать индекс по ее ключу.
+    """
+    ordering = ('id',)
+    orderings = {}
+    ordering_query_param = 'ordering'
+    page_size = getattr(settings, 'FORUM_PAGE_SIZE', 20)
+    max_page_size = getattr(settings, 'FORUM_MAX_PAGE_SIZE', 100)
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    total_query_param = 'with_total'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._set_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self._set_page([row async for row in self._page_queryset(queryset, request)])
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        self.ordering = self.get_ordering(request)
+        self.with_total = request.query_params.get(self.total_query_param) in ('1', 'true')
+
+        position = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        payload = self._payload(data)
+        if self.with_total:
+            payload['approximate_count'] = estimate_count(self.model)
+        return Response(payload)
+
+    async def aget_paginated_response(self, data):
+        payload = self._payload(data)
+        if self.with_total:
+            payload['approximate_count'] = await aestimate_count(self.model)
+        return Response(payload)
+
+    def _payload(self, data):
+        return OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ])
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+                'approximate_count': {'type': 'integer'},
+            },
+        }
+
+    def get_ordering(self, request):
+        value = request.query_params.get(self.ordering_query_param)
+        if value is None:
+            return self.ordering
+        if value not in self.orderings:
+            raise ValidationError({self.ordering_query_param: f"Unsupported ordering, use one of: {', '.join(self.orderings)}"})
+        return self.orderings[value]
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if value is None:
+            return self.page_size
+        try:
+            page_size = int(value)
+        except ValueError:
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        values = self.get_cursor_values(self.page[-1])
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values))
+
+    def get_position_filter(self, position):
+        """
+        Строит условие "строго после позиции" для лексикографического порядка:
+        f1 > v1 OR (f1 = v1 AND f2 > v2) OR ...
+
+        Дополнительное нестрогое условие по первому полю превращает выборку
+        в диапазонный просмотр индекса, а не в полный обход с фильтром.
+        """
+        fields = self._fields()
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(fields, position):
+            lookup = f"{name}__lt" if descending else f"{name}__gt"
+            condition |= Q(**equal, **{lookup: value})
+            equal[name] = value
+        if len(fields) > 1:
+            name, descending = fields[0]
+            lookup = f"{name}__lte" if descending else f"{name}__gte"
+            condition &= Q(**{lookup: position[0]})
+        return condition
+
+    def encode_cursor(self, values):
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            values = json.loads(raw)
+            if not isinstance(values, list):
+                raise ValueError
+            return self.parse_cursor_values(values)
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_cursor_values(self, row):
+        """
+        Значения ключа сортировки строки, которые попадут в курсор.
+        """
+        return [self._field_value(row, name) for name, _ in self._fields()]
+
+    def parse_cursor_values(self, values):
+        """
+        Обратное к get_cursor_values; ошибка означает недействительный курсор.
+        """
+        fields = self._fields()
+        if len(values) != len(fields):
+            raise ValueError
+        return [
+            self.model._meta.get_field(name).to_python(value)
+            for (name, _), value in zip(fields, values)
+        ]
+
+    def get_html_context(self):
+        return {'next_url': self.get_next_link()}
+
+    def _fields(self):
+        return [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def _field_value(self, obj, name):
+        value = getattr(obj, self.model._meta.get_field(name).attname)
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+
+class PostKeysetPagination(KeysetPagination):
+    """
+    Лента постов: по умолчанию от новых к старым, `id` разрешает совпадения.
+    """
+    ordering = ('-created_at', '-id')
+    orderings = {
+        '-created_at': ('-created_at', '-id'),
+        'created_at': ('created_at', 'id'),
+        '-score': ('-score', '-id'),
+        'score': ('score', 'id'),
+    }
+
+
+class ForumPostsPagination(KeysetPagination):
+    """
+    Лента постов одного форума, только от новых к старым: эту сортировку
+    обслуживает индекс (forum, -created_at, -id).
+    """
+    ordering = ('-created_at', '-id')
+    orderings = {'-created_at': ('-created_at', '-id')}
+
+
+class IdKeysetPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class SearchPagination(KeysetPagination):
+    """
+    Страницы полнотекстового поиска: курсор — (ранг BM25, id) последнего
+    результата, строки — кортежи (post_id, rank, snippet) из search_posts.
+    """
+    def paginate_search(self, request, text, forum_id=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.with_total = False
+
+        after = self.decode_cursor(request)
+        rows = search_posts(text, forum_id=forum_id, after=after, limit=self.page_size)
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_cursor_values(self, row):
+        post_id, rank, _ = row
+        return [rank, post_id]
+
+    def parse_cursor_values(self, values):
+        rank, post_id = values
+        return float(rank), int(post_id)
@@ -0,0 +1,68 @@
+"""
+Компактные форматы ответов и тел запросов.
+
+JSONRenderer DRF проходит по данным через json.dumps с Python-кодировщиком
+и заметен во времени ответа больших списков. FastJSONRenderer кодирует
+тот же JSON через orjson: без отступов вывод совпадает с DRF побайтно
+(даты, Decimal и ленивые строки превращаются в значения тем же кодировщиком
+DRF, U+2028/U+2029 экранируются так же). С отступом (?format=json с
+indent, Browsable API) и для значений, которые orjson не кодирует (целые
+больше 64 бит), используется обычный рендерер DRF.
+
+MessagePackRenderer и MessagePackParser добавляют application/msgpack:
+формат выбирается по заголовку Accept (или ?format=msgpack), тело запроса
+в нем принимается по Content-Type. Значения те же, что в JSON: даты —
+строками ISO 8601.
+"""
+import msgpack
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+# Даты через кодировщик DRF (суффикс Z, как у JSONRenderer), ключи-числа как в json
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+# json.dumps не экранирует эти символы, JSONRenderer DRF — да
+LINE_SEPARATORS = (('\u2028'.encode(), b'\\u2028'), ('\u2029'.encode(), b'\\u2029'))
+
+_encode_default = encoders.JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if not self.compact or self.ensure_ascii or self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_encode_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        for char, escaped in LINE_SEPARATORS:
+            if char in ret:
+                ret = ret.replace(char, escaped)
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_encode_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
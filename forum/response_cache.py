@@ -0,0 +1,349 @@
+"""
+Кеш ответов читающих эндпоинтов.
+
+Ключ ответа — URL запроса (маршрут и параметры) плюс текущие версии моделей,
+от которых зависит ответ. Версии хранятся в кеше Django и увеличиваются
+сигналами post_save/post_delete и явными вызовами bump_versions на путях,
+которые обходят сигналы (upsert голосов, F()-обновления счетчиков). Старые
+записи после этого просто не находятся и истекают по TTL.
+
+Два уровня: локальный LRU процесса и общий кеш Django. Промах вычисляется
+одним потоком процесса (single-flight); между процессами повторный расчет
+сдерживает короткая блокировка в общем кеше. Версии, общий уровень и
+блокировки работают между процессами, только если кеш default общий для
+них (по умолчанию — mainapp.shared_cache.SQLiteCache; LocMemCache не
+подходит). Асинхронные представления
+(forum.async_views) объединяют промахи между корутинами цикла событий.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+VERSION_KEY = "forum:version:{}"
+RESPONSE_KEY = "forum:response:{}"
+LOCK_KEY = "forum:response-lock:{}"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _new_version():
+    # Версия, созданная заново после вытеснения, не совпадает с прежними
+    return time.time_ns()
+
+
+def get_versions(labels):
+    keys = [VERSION_KEY.format(label) for label in labels]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(labels):
+    keys = [VERSION_KEY.format(label) for label in labels]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, _new_version(), None)
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(labels):
+    for label in labels:
+        key = VERSION_KEY.format(label)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def bump_versions(*labels):
+    """
+    Инвалидирует закешированные ответы, зависящие от моделей labels.
+
+    Версия увеличивается сразу и еще раз после коммита: второй шаг убирает
+    ответ, который параллельный запрос мог закешировать до фиксации.
+    """
+    _bump(labels)
+    transaction.on_commit(lambda: _bump(labels))
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {'local_hit': 0, 'shared_hit': 0, 'miss': 0, 'coalesced': 0}
+
+    def incr(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self.counts)
+        lookups = sum(counts.values())
+        hits = counts['local_hit'] + counts['shared_hit'] + counts['coalesced']
+        counts['hit_ratio'] = hits / lookups if lookups else 0.0
+        return counts
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+class ResponseCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+        self._flights = {}
+        self._async_flights = {}
+        self.stats = Stats()
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key, value, ttl):
+        with self._lock:
+            self._local[key] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > _setting('FORUM_RESPONSE_CACHE_LOCAL_SIZE', 1000):
+                self._local.popitem(last=False)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def get_or_compute(self, key, compute, ttl):
+        """
+        Возвращает (значение, источник), где источник — local, shared,
+        coalesced или miss. compute() возвращает None, если значение
+        кешировать нельзя (например, ответ с ошибкой).
+        """
+        value = self._local_get(key)
+        if value is not None:
+            self.stats.incr('local_hit')
+            return value, 'local'
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait(_setting('FORUM_RESPONSE_CACHE_LOCK_TIMEOUT', 5))
+            if flight.value is not None:
+                self.stats.incr('coalesced')
+                return flight.value, 'coalesced'
+            return self._compute(key, compute, ttl), 'miss'
+
+        try:
+            value, source = self._fetch_shared_or_compute(key, compute, ttl)
+            flight.value = value
+            return value, source
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _fetch_shared_or_compute(self, key, compute, ttl):
+        shared_key = RESPONSE_KEY.format(key)
+        value = cache.get(shared_key)
+        if value is not None:
+            self.stats.incr('shared_hit')
+            self._local_set(key, value, ttl)
+            return value, 'shared'
+
+        # Другой процесс уже считает этот ответ: ждем его результат недолго
+        lock_key = LOCK_KEY.format(key)
+        lock_timeout = _setting('FORUM_RESPONSE_CACHE_LOCK_TIMEOUT', 5)
+        if not cache.add(lock_key, 1, lock_timeout):
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.01)
+                value = cache.get(shared_key)
+                if value is not None:
+                    self.stats.incr('coalesced')
+                    self._local_set(key, value, ttl)
+                    return value, 'coalesced'
+        try:
+            return self._compute(key, compute, ttl), 'miss'
+        finally:
+            cache.delete(lock_key)
+
+    def _compute(self, key, compute, ttl):
+        self.stats.incr('miss')
+        value = compute()
+        if value is not None:
+            cache.set(RESPONSE_KEY.format(key), value, ttl)
+            self._local_set(key, value, ttl)
+        return value
+
+    async def aget_or_compute(self, key, compute, ttl):
+        """
+        get_or_compute для корутины compute: промах вычисляет одна корутина,
+        остальные ждут ее результат, не занимая потоков.
+        """
+        value = self._local_get(key)
+        if value is not None:
+            self.stats.incr('local_hit')
+            return value, 'local'
+
+        flight = self._async_flights.get(key)
+        if flight is not None:
+            try:
+                value = await asyncio.wait_for(asyncio.shield(flight), _setting('FORUM_RESPONSE_CACHE_LOCK_TIMEOUT', 5))
+            except asyncio.TimeoutError:
+                value = None
+            if value is not None:
+                self.stats.incr('coalesced')
+                return value, 'coalesced'
+            return await self._acompute(key, compute, ttl), 'miss'
+
+        flight = self._async_flights[key] = asyncio.get_running_loop().create_future()
+        value = None
+        try:
+            value, source = await self._afetch_shared_or_compute(key, compute, ttl)
+            return value, source
+        finally:
+            self._async_flights.pop(key, None)
+            flight.set_result(value)
+
+    async def _afetch_shared_or_compute(self, key, compute, ttl):
+        shared_key = RESPONSE_KEY.format(key)
+        value = await cache.aget(shared_key)
+        if value is not None:
+            self.stats.incr('shared_hit')
+            self._local_set(key, value, ttl)
+            return value, 'shared'
+
+        lock_key = LOCK_KEY.format(key)
+        lock_timeout = _setting('FORUM_RESPONSE_CACHE_LOCK_TIMEOUT', 5)
+        if not await cache.aadd(lock_key, 1, lock_timeout):
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+                value = await cache.aget(shared_key)
+                if value is not None:
+                    self.stats.incr('coalesced')
+                    self._local_set(key, value, ttl)
+                    return value, 'coalesced'
+        try:
+            return await self._acompute(key, compute, ttl), 'miss'
+        finally:
+            await cache.adelete(lock_key)
+
+    async def _acompute(self, key, compute, ttl):
+        self.stats.incr('miss')
+        value = await compute()
+        if value is not None:
+            await cache.aset(RESPONSE_KEY.format(key), value, ttl)
+            self._local_set(key, value, ttl)
+        return value
+
+
+response_cache = ResponseCache()
+
+
+def view_dependencies(view, request):
+    """
+    Метки моделей, от которых ответ зависит сверх объявленных в декораторе:
+    их возвращает метод представления get_cache_dependencies(request)
+    (например, для ?include=, forum.fieldsets).
+    """
+    hook = getattr(view, 'get_cache_dependencies', None)
+    return tuple(hook(request)) if hook is not None else ()
+
+
+def _response_key(request, versions):
+    raw = '|'.join([request.build_absolute_uri(), *map(str, versions)])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _cached_response(data, source):
+    response = Response(data)
+    response['X-Cache'] = source.upper()
+    return response
+
+
+def cache_response(*labels, ttl=None):
+    """
+    Декоратор метода представления DRF: кеширует успешные (200) ответы
+    по URL запроса и версиям моделей labels ('forum.Post' и т.п.).
+    Права доступа проверяются до вызова метода, как обычно. Метод может
+    быть корутиной (forum.async_views).
+    """
+    def decorator(method):
+        if iscoroutinefunction(method):
+            return _acache_response(method, labels, ttl)
+
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if not _setting('FORUM_RESPONSE_CACHE_ENABLED', True):
+                return method(view, request, *args, **kwargs)
+
+            key = _response_key(request, get_versions((*labels, *view_dependencies(view, request))))
+
+            def compute():
+                response = method(view, request, *args, **kwargs)
+                if response.status_code != 200:
+                    compute.response = response
+                    return None
+                return response.data
+
+            compute.response = None
+            timeout = ttl if ttl is not None else _setting('FORUM_RESPONSE_CACHE_TTL', 60)
+            data, source = response_cache.get_or_compute(key, compute, timeout)
+            if data is None:
+                return compute.response or method(view, request, *args, **kwargs)
+            return _cached_response(data, source)
+        return wrapper
+    return decorator
+
+
+def _acache_response(method, labels, ttl):
+    @wraps(method)
+    async def wrapper(view, request, *args, **kwargs):
+        if not _setting('FORUM_RESPONSE_CACHE_ENABLED', True):
+            return await method(view, request, *args, **kwargs)
+
+        key = _response_key(request, await aget_versions((*labels, *view_dependencies(view, request))))
+
+        async def compute():
+            response = await method(view, request, *args, **kwargs)
+            if response.status_code != 200:
+                compute.response = response
+                return None
+            return response.data
+
+        compute.response = None
+        timeout = ttl if ttl is not None else _setting('FORUM_RESPONSE_CACHE_TTL', 60)
+        data, source = await response_cache.aget_or_compute(key, compute, timeout)
+        if data is None:
+            return compute.response or await method(view, request, *args, **kwargs)
+        return _cached_response(data, source)
+    return wrapper
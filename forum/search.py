@@ -0,0 +1,111 @@
+"""
+Полнотекстовый поиск по постам через SQLite FTS5.
+
+Индекс forum_post_fts создается миграцией 0010 и поддерживается триггерами
+на forum_post. Результаты ранжируются по BM25 (заголовок весит больше текста)
+и листаются курсором по (ранг, id).
+"""
+import re
+from html import escape
+
+from django.conf import settings
+from django.db import connection
+
+FTS_TABLE = 'forum_post_fts'
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+# snippet() вставляет эти символы из области частного использования, а не
+# теги: текст поста экранируется, и только потом они заменяются на <mark>
+_START_SENTINEL = '\ue000'
+_END_SENTINEL = '\ue001'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_query(text):
+    """
+    Превращает пользовательский ввод в безопасный запрос FTS5: каждое слово
+    берется в кавычки (операторы FTS5 не интерпретируются), слова
+    объединяются через AND.
+    """
+    tokens = _TOKEN_RE.findall(text)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"' for token in tokens)
+
+
+def _weights():
+    title, content = getattr(settings, 'FORUM_SEARCH_WEIGHTS', (10.0, 1.0))
+    return float(title), float(content)
+
+
+def search_posts(text, forum_id=None, after=None, limit=20):
+    """
+    Ищет посты по title/content.
+
+    after — позиция (ранг, id) последнего результата предыдущей страницы.
+    Возвращает список (post_id, rank, snippet) длиной до limit + 1; лишняя
+    строка означает, что есть следующая страница.
+    """
+    match = build_match_query(text)
+    if match is None:
+        return []
+
+    title_weight, content_weight = _weights()
+    params = [_START_SENTINEL, _END_SENTINEL, title_weight, content_weight, match]
+    forum_filter = ''
+    if forum_id is not None:
+        forum_filter = 'AND p.forum_id = %s'
+        params.append(forum_id)
+
+    position_filter = ''
+    if after is not None:
+        position_filter = 'WHERE rank > %s OR (rank = %s AND id > %s)'
+        params += [after[0], after[0], after[1]]
+    params.append(limit + 1)
+
+    # bm25() возвращает отрицательные значения: чем меньше, тем релевантнее
+    sql = f"""
+        SELECT id, rank, snippet FROM (
+            SELECT p.id AS id,
+                   snippet({FTS_TABLE}, -1, %s, %s, '…', 16) AS snippet,
+                   bm25({FTS_TABLE}, %s, %s) AS rank
+            FROM {FTS_TABLE}
+            JOIN forum_post p ON p.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH %s {forum_filter}
+        )
+        {position_filter}
+        ORDER BY rank, id
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(post_id, rank, highlight(snippet)) for post_id, rank, snippet in cursor.fetchall()]
+
+
+def highlight(snippet):
+    """
+    Фрагмент из snippet() как безопасный HTML: текст поста экранируется,
+    совпадения обрамляются <mark>.
+    """
+    return escape(snippet).replace(_START_SENTINEL, HIGHLIGHT_START).replace(_END_SENTINEL, HIGHLIGHT_END)
+
+
+def matching_post_ids_sql(text):
+    """
+    Подзапрос (sql, params) с id постов, подходящих под запрос, или None.
+    Используется поиском в админке.
+    """
+    match = build_match_query(text)
+    if match is None:
+        return None
+    return f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+
+
+def rebuild_index():
+    """
+    Полностью перестраивает индекс из forum_post и оптимизирует его.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
@@ -1,31 +1,52 @@
 from rest_framework import serializers
 from .models import Forum, Post, Rating, GlobalRating
 from django.contrib.auth import get_user_model
+from mainapp.server_timing import TimedSerializerMixin
+from .fieldsets import SparseFieldsetMixin
 
 User = get_user_model()
 
 
-class ForumSerializer(serializers.ModelSerializer):
+class AuthorSerializer(serializers.ModelSerializer):
+    """
+    Публичные данные пользователя для ?include=: без email.
+    """
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'bio', 'avatar']
+
+class ForumSerializer(SparseFieldsetMixin, TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Forum
         fields = '__all__'
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(SparseFieldsetMixin, TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Post
         fields = '__all__'
+        read_only_fields = ('score', 'upvotes', 'downvotes')
+        includes = {'author': AuthorSerializer, 'forum': ForumSerializer}
 
-class RatingSerializer(serializers.ModelSerializer):
+class PostListSerializer(PostSerializer):
+    """
+    Пост в списках: отрывок excerpt и длина content_length вместо текста.
+    """
+    class Meta(PostSerializer.Meta):
+        fields = None
+        exclude = ['content']
+
+class RatingSerializer(SparseFieldsetMixin, TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Rating
-        fields = '__all__'
+        exclude = ['previous_score']
+        includes = {'user': AuthorSerializer, 'post': PostListSerializer}
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'bio', 'avatar']
         
-class GlobalRatingSerializer(serializers.ModelSerializer):
+class GlobalRatingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = GlobalRating
         fields = ['user', 'rating']
@@ -1,23 +1,101 @@
+from django.db.models import F
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Rating, GlobalRating
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .authentication import user_cache
+from .counters import increment_global_rating
+from .leaderboard import invalidate as invalidate_leaderboard
+from .models import CustomUser, Forum, GlobalRating, Post, Rating
+from .response_cache import bump_versions
+from .votes import score_deltas
+
+
+def adjust_post_score(post_id, old_score, new_score):
+    """
+    Переносит изменение оценки с old_score на new_score в агрегаты поста.
+    Обновление выполняется на стороне базы (F-выражения), без чтения строки;
+    updated_at сдвигается, как при правке поста.
+    """
+    if new_score == old_score:
+        return
+    score, upvotes, downvotes = score_deltas(old_score, new_score)
+    Post.objects.filter(pk=post_id).update(
+        updated_at=timezone.now(),
+        score=F('score') + score,
+        upvotes=F('upvotes') + upvotes,
+        downvotes=F('downvotes') + downvotes,
+    )
+    bump_versions(Post._meta.label)
+
+
+def adjust_author_rating(post_id, delta):
+    """
+    Глобальный рейтинг складывается из оценок постов пользователя,
+    поэтому изменение начисляется автору поста, а не голосующему.
+    """
+    if not delta:
+        return
+    author_id = Post.objects.filter(pk=post_id).values_list('author_id', flat=True).first()
+    if author_id is not None:
+        increment_global_rating(author_id, delta)
+
 
 @receiver(post_save, sender=Rating)
-def update_global_rating_on_save(sender, instance, created, **kwargs):
-    user = instance.user
-    global_rating, created = GlobalRating.objects.get_or_create(user=user)
-    
-    if created:
-        global_rating.rating = instance.score
+def update_ratings_on_save(sender, instance, created, **kwargs):
+    old_score = 0 if created else (getattr(instance, '_persisted_score', None) or 0)
+    old_post_id = None if created else getattr(instance, '_persisted_post_id', instance.post_id)
+
+    if old_post_id is not None and old_post_id != instance.post_id:
+        # Оценку перенесли на другой пост: снимаем ее со старого целиком
+        adjust_post_score(old_post_id, old_score, 0)
+        adjust_post_score(instance.post_id, 0, instance.score)
+        adjust_author_rating(old_post_id, -old_score)
+        adjust_author_rating(instance.post_id, instance.score)
     else:
-        global_rating.rating += instance.score
-    
-    global_rating.save()
+        adjust_post_score(instance.post_id, old_score, instance.score)
+        adjust_author_rating(instance.post_id, instance.score - old_score)
+
+
+@receiver(post_delete, sender=Rating)
+def update_ratings_on_delete(sender, instance, **kwargs):
+    score = getattr(instance, '_persisted_score', None)
+    if score is None:
+        score = instance.score
+    post_id = getattr(instance, '_persisted_post_id', None) or instance.post_id
 
+    adjust_post_score(post_id, score, 0)
+    adjust_author_rating(post_id, -score)
+
+
+@receiver(post_save, sender=GlobalRating)
+@receiver(post_delete, sender=GlobalRating)
+def invalidate_leaderboard_on_change(sender, **kwargs):
+    invalidate_leaderboard()
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(getattr(instance, jwt_settings.USER_ID_FIELD))
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def bump_user_version(sender, update_fields=None, **kwargs):
+    # Вход и перехеширование пароля не меняют публичных данных автора (?include=)
+    if update_fields is not None and set(update_fields) <= {'last_login', 'password'}:
+        return
+    bump_versions(sender._meta.label)
+
+
+@receiver(post_save, sender=Forum)
+@receiver(post_delete, sender=Forum)
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Rating)
 @receiver(post_delete, sender=Rating)
-def update_global_rating_on_delete(sender, instance, **kwargs):
-    user = instance.user
-    global_rating = GlobalRating.objects.get(user=user)
-    
-    global_rating.rating -= instance.score
-    global_rating.save()
+@receiver(post_save, sender=GlobalRating)
+@receiver(post_delete, sender=GlobalRating)
+def bump_response_cache_version(sender, **kwargs):
+    bump_versions(sender._meta.label)
@@ -0,0 +1,262 @@
+"""
+Журнал медленных SQL-запросов.
+
+SlowQueryMiddleware (включается FORUM_SLOW_QUERY_MS) ставит на время запроса
+обработчик mainapp.query_hooks и сохраняет каждый SQL-запрос дольше
+FORUM_SLOW_QUERY_MS миллисекунд: форму запроса (sql_shape), типы
+параметров, место вызова в коде форума (представление, сигнал, админка),
+путь HTTP-запроса и план EXPLAIN QUERY PLAN. Запросы одной формы
+схлопываются в одну запись со счетчиком; записей не больше
+FORUM_SLOW_QUERY_LOG_SIZE, при переполнении вытесняется давно не
+встречавшаяся форма.
+
+Журнал хранится в памяти процесса. Его показывает админка
+(/admin/slow-queries/), а ?format=json отдает его в JSON.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError
+from django.http import HttpResponseRedirect, JsonResponse
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods
+
+from mainapp.query_hooks import query_hook
+from mainapp.server_timing import sql_shape
+
+# Путь текущего HTTP-запроса и флаг «выполняется EXPLAIN» (чтобы не
+# журналировать сам EXPLAIN)
+_request_path = ContextVar('slow_query_request_path', default=None)
+_explaining = ContextVar('slow_query_explaining', default=False)
+
+_EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+
+def threshold_ms():
+    return getattr(settings, 'FORUM_SLOW_QUERY_MS', None)
+
+
+def params_shape(params, many=False):
+    """
+    Типы параметров без значений: ['int', 'str'], {'name': 'str'};
+    для executemany — число строк и типы первой.
+    """
+    if many:
+        # Итератор строк к этому моменту уже прочитан драйвером
+        rows = params if isinstance(params, (list, tuple)) else []
+        return {'rows': len(rows), 'row': params_shape(rows[0]) if rows else None}
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+
+def calling_frame():
+    """
+    Ближайшее к запросу место в коде форума; если форум в стеке не
+    встречается (например, фильтры списка в админке), — первый кадр вне
+    django.db и потоков sync_to_async.
+    """
+    frame = sys._getframe(1)
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        label = f'{module}:{frame.f_lineno} in {frame.f_code.co_name}'
+        if module == __name__:
+            pass
+        elif module == 'forum' or module.startswith('forum.'):
+            return label
+        elif fallback is None and not module.startswith(('django.db', 'contextlib', 'asgiref', 'concurrent', 'threading')):
+            fallback = label
+        frame = frame.f_back
+    return fallback
+
+
+def explain(db, sql, params):
+    """
+    План запроса строками; дочерние узлы плана SQLite сдвинуты отступом.
+    """
+    if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return []
+    token = _explaining.set(True)
+    try:
+        with db.cursor() as cursor:
+            cursor.execute(f'{db.ops.explain_query_prefix()} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return []
+    finally:
+        _explaining.reset(token)
+    if rows and len(rows[0]) == 4:
+        # SQLite: (id, parent, notused, detail)
+        depth = {0: -1}
+        lines = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node] + detail)
+        return lines
+    return [str(row[-1]) for row in rows]
+
+
+def is_full_scan(plan):
+    # SQLite: «SCAN forum_post» без индекса; PostgreSQL: «Seq Scan»
+    return any(
+        (line.lstrip().startswith('SCAN ') and ' USING ' not in line) or 'Seq Scan' in line
+        for line in plan
+    )
+
+
+class SlowQueryLog:
+    def __init__(self, size=None):
+        self._size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @property
+    def size(self):
+        return self._size or getattr(settings, 'FORUM_SLOW_QUERY_LOG_SIZE', 200)
+
+    def record(self, db, sql, params, many, elapsed):
+        shape = sql_shape(sql)
+        now = timezone.now().isoformat()
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            entry = self._entries.get(shape)
+            if entry is not None:
+                self._entries.move_to_end(shape)
+                entry['count'] += 1
+                entry['total_ms'] += elapsed_ms
+                entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+                entry['last_seen'] = now
+                entry['path'] = _request_path.get()
+                return
+        # План считается один раз на форму, вне блокировки
+        plan = [] if many else explain(db, sql, params)
+        entry = {
+            'shape': shape,
+            'sql': sql,
+            'params': params_shape(params, many),
+            'origin': calling_frame(),
+            'path': _request_path.get(),
+            'plan': plan,
+            'full_scan': is_full_scan(plan),
+            'count': 1,
+            'total_ms': elapsed_ms,
+            'max_ms': elapsed_ms,
+            'first_seen': now,
+            'last_seen': now,
+        }
+        with self._lock:
+            if shape in self._entries:
+                # Ту же форму успел записать другой поток
+                entry = self._entries[shape]
+                entry['count'] += 1
+                entry['total_ms'] += elapsed_ms
+                entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+                return
+            self._entries[shape] = entry
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def entries(self):
+        """
+        Копии записей, самые затратные (по суммарному времени) первыми.
+        """
+        with self._lock:
+            entries = [dict(entry) for entry in self._entries.values()]
+        for entry in entries:
+            entry['total_ms'] = round(entry['total_ms'], 3)
+            entry['max_ms'] = round(entry['max_ms'], 3)
+            entry['mean_ms'] = round(entry['total_ms'] / entry['count'], 3)
+        return sorted(entries, key=lambda entry: entry['total_ms'], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def _wrapper(limit_ms):
+    def execute(execute, sql, params, many, context):
+        if _explaining.get():
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed = time.perf_counter() - started
+        if elapsed * 1000 >= limit_ms:
+            slow_query_log.record(context['connection'], sql, params, many, elapsed)
+        return result
+    return execute
+
+
+@contextmanager
+def capture(limit_ms=None, path=None):
+    """
+    Журналирует медленные запросы блока (например, в management-команде).
+    """
+    if limit_ms is None:
+        limit_ms = threshold_ms() or 0
+    token = _request_path.set(path)
+    try:
+        with query_hook(_wrapper(limit_ms)):
+            yield slow_query_log
+    finally:
+        _request_path.reset(token)
+
+
+class SlowQueryMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if threshold_ms() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with capture(path=request.get_full_path()):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with capture(path=request.get_full_path()):
+            return await self.get_response(request)
+
+
+@require_http_methods(['GET', 'POST'])
+def slow_queries_view(request):
+    """
+    Страница журнала в админке; ?format=json — выгрузка, POST — очистка.
+    """
+    if request.method == 'POST':
+        slow_query_log.clear()
+        return HttpResponseRedirect(request.path)
+    entries = slow_query_log.entries()
+    if request.GET.get('format') == 'json':
+        response = JsonResponse({'threshold_ms': threshold_ms(), 'entries': entries})
+        response['Content-Disposition'] = 'attachment; filename="slow-queries.json"'
+        return response
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Slow queries',
+        'entries': entries,
+        'threshold_ms': threshold_ms(),
+        'size': slow_query_log.size,
+    }
+    return TemplateResponse(request, 'admin/slow_queries.html', context)
@@ -3,13 +3,71 @@ from django.test import TestCase
 # Create your tests here.
 import pytest
 from rest_framework.test import APIClient
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.urls import resolve
+from datetime import timedelta
 from django.contrib.auth import get_user_model
-from .models import Forum, Post, Rating, GlobalRating
+from .models import Forum, Post, Rating, GlobalRating, GlobalRatingShard, make_excerpt
+from .pagination import IdKeysetPagination, PostKeysetPagination
+from .response_cache import ResponseCache, bump_versions, response_cache
 from rest_framework import status
+from django.core.cache import cache, caches
+from django.db import OperationalError, connection
+import threading
+import csv
+import gzip
+import io
+import json
+import msgpack
+import tracemalloc
+import logging
+import pstats
+import os
+from mainapp.metrics import store as metrics_store
+from mainapp.server_timing import ServerTimingMiddleware, sql_shape
+from django.http import HttpResponse
+from django.core.management import CommandError, call_command
+from .exports import stream_export
+from .bulk import seed
+from .search import search_posts
+from .slow_queries import capture, slow_query_log
+from .authentication import user_cache
+from .hashing import hashing_pool
+from .leaderboard import invalidate as invalidate_leaderboard, publish_delta as publish_leaderboard_delta
+from .throttling import TokenBucketThrottle
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.tokens import AccessToken
+from .serializers import ForumSerializer, PostSerializer, RatingSerializer
+from .renderers import FastJSONRenderer
+from rest_framework.renderers import JSONRenderer
+from decimal import Decimal
+import time
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings
+from django.conf import settings as django_settings
+from django.utils import timezone
+from django.db.models import F, Sum
+from .counters import compact_global_ratings, increment_global_rating, read_global_rating
 
 
 User = get_user_model()
 
+@pytest.fixture(autouse=True, scope="session")
+def isolated_caches(tmp_path_factory):
+    # Файлы общих кешей — свои у прогона тестов, а не общие с сервером
+    directory = tmp_path_factory.mktemp("caches")
+    isolated = {alias: {**config, "LOCATION": str(directory / alias)} for alias, config in django_settings.CACHES.items()}
+    with override_settings(CACHES=isolated):
+        yield
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    for backend in caches.all():
+        backend.clear()
+    response_cache.clear_local()
+    user_cache.clear()
+
 @pytest.fixture
 def another_authenticated_client(db):
     user = User.objects.create_user(username="another_user", password="password")
@@ -59,7 +117,7 @@ def test_forum_list(authenticated_client, forum):
     client, _ = authenticated_client
     response = client.get("/api/forums/")
     assert response.status_code == 200
-    assert response.data[0]["name"] == forum.name
+    assert response.data["results"][0]["name"] == forum.name
 
 @pytest.mark.django_db
 def test_forum_detail(authenticated_client, forum):
@@ -84,6 +142,49 @@ def test_forum_update(authenticated_client, forum):
     assert response.status_code == 200
     assert response.data["name"] == "Updated Forum"
 
+@pytest.mark.django_db
+def test_forum_posts_feed(authenticated_client, forum):
+    client, user = authenticated_client
+    other = Forum.objects.create(name="Other", description="")
+    posts = [Post.objects.create(forum=forum, author=user, title=f"Post {i}", content="") for i in range(3)]
+    Post.objects.create(forum=other, author=user, title="Elsewhere", content="")
+
+    response = client.get(f"/api/forums/{forum.id}/posts/?page_size=2")
+    assert response.status_code == 200
+    ids = [item["id"] for item in response.data["results"]]
+    ids += [item["id"] for item in client.get(response.data["next"]).data["results"]]
+    assert ids == [p.id for p in reversed(posts)]
+
+    assert client.get("/api/forums/999/posts/").status_code == 404
+    assert client.get(f"/api/forums/{forum.id}/posts/?ordering=-score").status_code == 400
+
+
+@pytest.mark.django_db
+def test_forum_feed_query_plans(forum, post):
+    """Лента форума и оценки поста читаются диапазоном по составным индексам."""
+    position = PostKeysetPagination().get_position_filter([post.created_at, post.id])
+    feed = Post.objects.filter(forum=forum).filter(position).order_by("-created_at", "-id")[:20]
+    # SEARCH forum_post USING INDEX post_forum_created_idx (forum_id=? AND created_at<?)
+    plan = feed.explain()
+    assert "USING INDEX post_forum_created_idx (forum_id=? AND created_at<?)" in plan, plan
+    assert "TEMP B-TREE" not in plan, plan
+    # Ключи страницы читаются только из индекса
+    plan = feed.values_list("id", flat=True).explain()
+    assert "USING COVERING INDEX post_forum_created_idx" in plan, plan
+
+    # SEARCH forum_rating USING COVERING INDEX rating_post_user_idx (post_id=?)
+    plan = Rating.objects.filter(post=post).values_list("user_id", flat=True).explain()
+    assert "USING COVERING INDEX rating_post_user_idx (post_id=?)" in plan, plan
+
+
+@pytest.mark.django_db
+def test_detail_actions(authenticated_client, rating):
+    client, _ = authenticated_client
+    assert client.get(f"/api/forums/{rating.post.forum_id}/detail/").data["name"] == "Test Forum"
+    assert client.get(f"/api/posts/{rating.post_id}/detail/").data["title"] == "Test Post"
+    assert client.get(f"/api/ratings/{rating.id}/detail/").data["score"] == 1
+    assert client.get("/api/posts/999/detail/").status_code == 404
+
 @pytest.mark.django_db
 def test_forum_delete(authenticated_client, forum):
     client, _ = authenticated_client
@@ -98,7 +199,7 @@ def test_post_list(authenticated_client, post):
     client, _ = authenticated_client
     response = client.get("/api/posts/")
     assert response.status_code == 200
-    assert response.data[0]["title"] == post.title
+    assert response.data["results"][0]["title"] == post.title
 
 @pytest.mark.django_db
 def test_post_detail(authenticated_client, post):
@@ -136,6 +237,594 @@ def test_post_delete(authenticated_client, post):
     assert Post.objects.count() == 0
 
 
+@pytest.mark.django_db
+def test_post_list_keyset_pagination(authenticated_client, forum):
+    client, user = authenticated_client
+    Post.objects.bulk_create([
+        Post(forum=forum, author=user, title=f"Post {i}", content="Content")
+        for i in range(5)
+    ])
+    seen = []
+    url = "/api/posts/?page_size=2"
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert len(response.data["results"]) <= 2
+        seen += [item["id"] for item in response.data["results"]]
+        url = response.data["next"]
+    expected = list(Post.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+    assert seen == expected
+
+
+@pytest.mark.django_db
+def test_list_page_size_is_capped(authenticated_client, monkeypatch):
+    client, _ = authenticated_client
+    monkeypatch.setattr(IdKeysetPagination, "max_page_size", 3)
+    Forum.objects.bulk_create([Forum(name=f"Forum {i}", description="") for i in range(5)])
+    response = client.get("/api/forums/?page_size=1000")
+    assert response.status_code == 200
+    assert len(response.data["results"]) == 3
+    assert response.data["next"] is not None
+    assert "approximate_count" not in response.data
+
+
+@pytest.mark.django_db
+def test_list_approximate_count(authenticated_client, rating):
+    client, _ = authenticated_client
+    response = client.get("/api/ratings/?with_total=1")
+    assert response.status_code == 200
+    assert response.data["approximate_count"] == 1
+
+
+@pytest.mark.django_db
+def test_list_invalid_cursor(authenticated_client, forum):
+    client, _ = authenticated_client
+    response = client.get("/api/forums/?cursor=not-a-cursor")
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_post_search(authenticated_client, forum, create_user):
+    client, user = authenticated_client
+    other = Forum.objects.create(name="Other", description="")
+    in_title = Post.objects.create(forum=forum, author=user, title="Django tips", content="Short text")
+    in_body = Post.objects.create(forum=forum, author=user, title="Misc", content="Some words about django and more")
+    Post.objects.create(forum=other, author=user, title="Django elsewhere", content="")
+    Post.objects.create(forum=forum, author=user, title="Unrelated", content="Nothing here")
+
+    response = client.get(f"/api/posts/search/?q=django&forum={forum.id}&page_size=1")
+    assert response.status_code == 200
+    assert [item["id"] for item in response.data["results"]] == [in_title.id]
+    response = client.get(response.data["next"])
+    assert [item["id"] for item in response.data["results"]] == [in_body.id]
+    assert "<mark>django</mark>" in response.data["results"][0]["snippet"]
+    assert response.data["next"] is None
+
+    # Индекс следует за изменениями поста
+    in_body.content = "Rewritten"
+    in_body.save()
+    response = client.get("/api/posts/search/?q=django")
+    assert in_body.id not in [item["id"] for item in response.data["results"]]
+
+    # Текст поста во фрагменте экранирован, теги — только <mark>
+    Post.objects.create(forum=forum, author=user, title="Payload", content='<script>alert("xss")</script> & more')
+    response = client.get("/api/posts/search/?q=script")
+    assert response.data["results"][0]["snippet"] == (
+        "&lt;<mark>script</mark>&gt;alert(&quot;xss&quot;)&lt;/<mark>script</mark>&gt; &amp; more"
+    )
+
+    # Операторы FTS5 в запросе не интерпретируются
+    response = client.get('/api/posts/search/?q="AND OR (')
+    assert response.status_code == 200
+    assert response.data["results"] == []
+    assert client.get("/api/posts/search/?q=NEAR(django").status_code == 200
+    assert client.get("/api/posts/search/?q=").status_code == 400
+
+
+@pytest.mark.django_db
+def test_admin_post_search_uses_index(client, post):
+    admin = User.objects.create_superuser(username="admin", password="password")
+    client.force_login(admin)
+    response = client.get("/admin/forum/post/", {"q": "content"})
+    assert response.status_code == 200
+    assert post.title in response.content.decode()
+    response = client.get("/admin/forum/post/", {"q": "missing"})
+    assert post.title not in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_response_cache_hits_and_invalidation(authenticated_client, post, django_assert_num_queries):
+    client, user = authenticated_client
+    assert client.get(f"/api/posts/{post.id}/")["X-Cache"] == "MISS"
+    # Повторный запрос: сессия, пользователь и валидаторы ETag, без выборки поста
+    with django_assert_num_queries(3):
+        response = client.get(f"/api/posts/{post.id}/")
+    assert response["X-Cache"] == "LOCAL"
+    assert response.data["title"] == post.title
+
+    response_cache.clear_local()
+    assert client.get(f"/api/posts/{post.id}/")["X-Cache"] == "SHARED"
+
+    # Голос меняет счет поста: закешированный ответ больше не используется
+    client.post("/api/rating/update/", {"post_id": post.id, "score": 1})
+    response = client.get(f"/api/posts/{post.id}/")
+    assert response["X-Cache"] == "MISS"
+    assert response.data["score"] == 1
+
+    client.patch(f"/api/posts/{post.id}/", {"title": "Renamed"})
+    assert client.get(f"/api/posts/{post.id}/").data["title"] == "Renamed"
+    assert client.get("/api/posts/999/").status_code == 404
+
+
+@pytest.mark.django_db
+def test_response_cache_is_shared_between_processes(authenticated_client, post):
+    client, user = authenticated_client
+    path = f"/api/posts/{post.id}/"
+
+    # Ответ, посчитанный другим процессом, берется из общего кеша
+    pid = os.fork()
+    if pid == 0:
+        try:
+            client.get(path)
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert client.get(path)["X-Cache"] == "SHARED"
+
+    # Изменение, которое сохранил другой процесс: здесь его сигналы не
+    # срабатывали, версию увеличивает тот процесс
+    Post.objects.filter(pk=post.pk).update(title="Changed elsewhere")
+    assert client.get(path).data["title"] == "Test Post"
+    pid = os.fork()
+    if pid == 0:
+        try:
+            bump_versions("forum.Post")
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    response = client.get(path)
+    assert response["X-Cache"] == "MISS"
+    assert response.data["title"] == "Changed elsewhere"
+
+
+def test_response_cache_single_flight():
+    """Одновременные промахи по одному ключу вычисляются один раз."""
+    local_cache = ResponseCache()
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.wait(1)
+        return {"value": 1}
+
+    results = []
+    workers = [
+        threading.Thread(target=lambda: results.append(local_cache.get_or_compute("key", compute, 60)))
+        for _ in range(5)
+    ]
+    for worker in workers:
+        worker.start()
+    started.set()
+    for worker in workers:
+        worker.join()
+
+    assert len(calls) == 1
+    assert [value for value, _ in results] == [{"value": 1}] * 5
+    stats = local_cache.stats.snapshot()
+    assert stats["miss"] == 1
+    assert stats["coalesced"] + stats["local_hit"] == 4
+
+
+@pytest.mark.django_db
+def test_cache_stats_requires_staff(authenticated_client, client):
+    api_client, _ = authenticated_client
+    assert api_client.get("/api/cache/stats/").status_code == 403
+    admin = User.objects.create_superuser(username="admin", password="password")
+    client.force_login(admin)
+    response = client.get("/api/cache/stats/")
+    assert response.status_code == 200
+    assert "hit_ratio" in response.json()
+
+
+@pytest.mark.django_db
+def test_server_timing_header(authenticated_client, post, caplog, settings):
+    settings.SERVER_TIMING_ENABLED = True
+    client, _ = authenticated_client
+    caplog.set_level(logging.INFO, logger="mainapp.server_timing")
+    response = client.get("/api/posts/")
+    metrics = {part.split(";")[0]: part for part in response["Server-Timing"].split(", ")}
+    assert set(metrics) == {"total", "db", "auth", "view", "serialize", "render"}
+    assert 'desc="' in metrics["db"]
+
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record["path"] == "/api/posts/"
+    assert record["status"] == 200
+    assert record["queries"] >= 1
+    assert record["total_ms"] >= record["view_ms"] >= record["serialize_ms"]
+
+
+@pytest.mark.django_db
+def test_server_timing_flags_repeated_queries(forum, caplog, settings, rf):
+    settings.SERVER_TIMING_ENABLED = True
+    settings.SERVER_TIMING_N_PLUS_ONE_THRESHOLD = 5
+    caplog.set_level(logging.INFO, logger="mainapp.server_timing")
+    posts = Post.objects.bulk_create([
+        Post(forum=forum, author=User.objects.create_user(username=f"author{i}"), title=f"Post {i}", content="")
+        for i in range(8)
+    ])
+
+    def view(request):
+        # Классический N+1: автор каждого поста отдельным запросом
+        names = [post.author.username for post in Post.objects.all()]
+        return HttpResponse(", ".join(names))
+
+    response = ServerTimingMiddleware(view)(rf.get("/posts/"))
+    assert 'db;dur=' in response["Server-Timing"]
+    assert 'desc="9 queries"' in response["Server-Timing"]
+    assert "n-plus-one" in response["Server-Timing"]
+    record = caplog.records[-1]
+    assert record.levelno == logging.WARNING
+    (repeated,) = json.loads(record.getMessage())["n_plus_one"]
+    assert repeated["count"] == 8
+    assert repeated["sql"].startswith('SELECT "forum_customuser"."id"')
+
+    response = ServerTimingMiddleware(lambda request: HttpResponse(Post.objects.count()))(rf.get("/posts/"))
+    assert "n-plus-one" not in response["Server-Timing"]
+
+
+def test_sql_shape():
+    assert sql_shape('SELECT * FROM t WHERE id IN (%s, %s,%s) LIMIT 21') == "SELECT * FROM t WHERE id IN (...) LIMIT ?"
+    assert sql_shape("SELECT  1\n FROM t WHERE a = %s") == sql_shape("SELECT 2 FROM t WHERE a = %s")
+
+
+@pytest.mark.django_db
+def test_server_timing_is_disabled_by_default(authenticated_client, post):
+    client, _ = authenticated_client
+    assert "Server-Timing" not in APIClient().get("/api/posts/")
+    assert "Server-Timing" not in client.get("/api/posts/")
+
+
+@pytest.fixture
+def metrics_dir(settings, tmp_path):
+    settings.METRICS_DIR = str(tmp_path)
+    settings.METRICS_TOKEN = "metrics-token"
+    metrics_store.reset()
+    yield tmp_path
+    metrics_store.reset()
+
+
+def scrape(client):
+    response = client.get("/metrics", HTTP_AUTHORIZATION="Bearer metrics-token")
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in response.content.decode().splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint(authenticated_client, post, metrics_dir):
+    client, _ = authenticated_client
+    client.get("/api/posts/")
+    client.get("/api/posts/")
+    client.get("/api/posts/999/")
+
+    samples = scrape(client)
+    assert samples['forum_http_requests_total{method="GET",route="post-list",status="200"}'] == 2
+    assert samples['forum_http_requests_total{method="GET",route="post-detail",status="404"}'] == 1
+    assert samples['forum_http_request_duration_seconds_count{route="post-list"}'] == 2
+    assert samples['forum_http_request_duration_seconds_bucket{route="post-list",le="+Inf"}'] == 2
+    assert samples['forum_db_queries_per_request_bucket{route="post-list",le="0"}'] == 0
+    assert samples['forum_db_duration_seconds_count{route="post-detail"}'] == 1
+    # Сам запрос /metrics еще выполняется
+    assert samples["forum_http_requests_in_flight"] == 1
+    assert samples['forum_response_cache_lookups_total{result="local_hit"}'] >= 1
+    assert 0 < samples["forum_response_cache_hit_ratio"] <= 1
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint_is_not_public(client, create_user, metrics_dir, settings):
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code == 403
+    client.force_login(create_user(username="user", password="password"))
+    assert client.get("/metrics").status_code == 403
+
+    client.force_login(User.objects.create_superuser(username="admin", password="password"))
+    assert client.get("/metrics").status_code == 200
+    # Без токена в настройках Bearer не принимается
+    settings.METRICS_TOKEN = None
+    client.logout()
+    assert client.get("/metrics", HTTP_AUTHORIZATION="Bearer None").status_code == 403
+
+
+@pytest.mark.django_db
+def test_metrics_are_aggregated_across_processes(client, metrics_dir):
+    labels = {"route": "post-list", "method": "GET", "status": "200"}
+    metrics_store.inc("forum_http_requests_total", labels, 2)
+
+    pid = os.fork()
+    if pid == 0:
+        # Дочерний процесс начинает с нуля и пишет свой файл
+        try:
+            metrics_store.inc("forum_http_requests_total", labels, 3)
+            metrics_store.observe("forum_http_request_duration_seconds", {"route": "post-list"}, 0.02)
+            metrics_store.track_in_flight(1)
+            metrics_store.flush()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+    samples = scrape(client)
+    assert samples['forum_http_requests_total{method="GET",route="post-list",status="200"}'] == 5
+    assert samples['forum_http_request_duration_seconds_bucket{route="post-list",le="0.025"}'] == 1
+    assert samples['forum_http_request_duration_seconds_bucket{route="post-list",le="0.01"}'] == 0
+    # Незавершенный запрос завершившегося процесса не учитывается
+    assert samples["forum_http_requests_in_flight"] == 1
+    assert len(list(metrics_dir.glob("*.json"))) == 2
+
+
+@pytest.fixture
+def profiling(settings, tmp_path):
+    settings.PROFILING_ENABLED = True
+    settings.PROFILING_DIR = str(tmp_path)
+    settings.PROFILING_SAMPLE_RATE = 0
+    # Иначе повторные запросы отдаются из кеша без сериализации
+    settings.FORUM_RESPONSE_CACHE_ENABLED = False
+    return settings
+
+
+@pytest.mark.django_db
+def test_profiling_sampled_requests(authenticated_client, post, profiling, tmp_path):
+    client, _ = authenticated_client
+    client.get("/api/posts/")
+    assert not list(tmp_path.iterdir())
+
+    profiling.PROFILING_SAMPLE_RATE = 1
+    client.get("/api/posts/")
+    (profile,) = tmp_path.glob("post-list__*ms__*.prof")
+    functions = {function for _, _, function in pstats.Stats(str(profile)).stats}
+    assert "render_many" in functions
+
+    profiling.PROFILING_MODE = "sample"
+    profiling.PROFILING_SAMPLE_INTERVAL = 0.0001
+    for _ in range(5):
+        client.get("/api/posts/")
+    stacks = [line for path in tmp_path.glob("post-list__*.folded") for line in path.read_text().splitlines()]
+    assert stacks
+    assert all(line.rpartition(" ")[2].isdigit() for line in stacks)
+
+    output = io.StringIO()
+    call_command("profile_report", "--top", "5", stdout=output)
+    report = output.getvalue()
+    assert "post-list: 6 profile(s)" in report
+    assert "tottime, ms" in report and "self, %" in report
+
+
+@pytest.mark.django_db
+def test_profiling_header_is_staff_only(authenticated_client, client, post, profiling, tmp_path):
+    api_client, _ = authenticated_client
+    api_client.get("/api/posts/", HTTP_X_PROFILE="1")
+    assert not list(tmp_path.iterdir())
+
+    client.force_login(User.objects.create_superuser(username="admin", password="password"))
+    client.get(f"/api/posts/{post.id}/", HTTP_X_PROFILE="1")
+    assert len(list(tmp_path.glob("post-detail__*.prof"))) == 1
+
+
+@pytest.mark.django_db
+def test_profiling_header_accepts_staff_jwt(create_user, post, profiling, tmp_path):
+    user = create_user(username="user", password="password")
+    admin = User.objects.create_superuser(username="admin", password="password")
+    client = APIClient()
+    for token in (AccessToken.for_user(user), "not-a-token"):
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        client.get(f"/api/posts/{post.id}/", HTTP_X_PROFILE="1")
+    assert not list(tmp_path.iterdir())
+
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(admin)}")
+    assert client.get(f"/api/posts/{post.id}/", HTTP_X_PROFILE="1").status_code == 200
+    assert len(list(tmp_path.glob("post-detail__*.prof"))) == 1
+
+
+@pytest.fixture
+def async_client(settings, authenticated_client):
+    """AsyncClient с маршрутами ASGI-развертывания (mainapp.asgi_urls)."""
+    settings.ROOT_URLCONF = "mainapp.asgi_urls"
+    _, user = authenticated_client
+    client = AsyncClient()
+    client.force_login(user)
+    return client
+
+
+def async_get(client, path, headers=None):
+    return async_to_sync(client.get)(path, headers=headers)
+
+
+@pytest.mark.django_db
+def test_async_read_views_match_sync(authenticated_client, async_client, rating, global_rating, settings):
+    sync_client, _ = authenticated_client
+    forum_id, post_id = rating.post.forum_id, rating.post_id
+    for _ in range(3):
+        Post.objects.create(forum_id=forum_id, author=rating.user, title="Еще", content="Текст")
+    paths = [
+        "/api/posts/", f"/api/posts/?page_size=2&ordering=-score", f"/api/posts/{post_id}/", "/api/posts/999/",
+        "/api/forums/", f"/api/forums/{forum_id}/", f"/api/forums/?pk={forum_id}",
+        f"/api/users/global-rating/{global_rating.user_id}/", "/api/users/global-rating/999/",
+        "/api/users/leaderboard/", f"/api/users/leaderboard/?around={global_rating.user_id}&limit=1",
+        "/api/users/leaderboard/?limit=x", "/api/posts/?ordering=title", "/api/posts/?cursor=bad",
+        "/api/posts/?fields=id,title&include=author,forum", f"/api/posts/{post_id}/?include=author",
+        "/api/forums/?fields=name", "/api/posts/?include=ratings",
+    ]
+    for path in paths:
+        expected = sync_client.get(path, HTTP_ACCEPT="application/json")
+        cache.clear()
+        response_cache.clear_local()
+        response = async_get(async_client, path)
+        assert resolve(path.split("?")[0]).func.view_class.__module__ == "forum.async_views", path
+        assert (response.status_code, response.content) == (expected.status_code, expected.content), path
+        assert response["Content-Type"] == expected["Content-Type"]
+
+    next_page = async_get(async_client, "/api/posts/?page_size=2").json()["next"]
+    assert len(async_get(async_client, next_page).json()["results"]) == 2
+
+
+@pytest.mark.django_db
+def test_async_read_views_auth_and_delegation(async_client, forum, post, client):
+    anonymous = AsyncClient()
+    response = async_get(anonymous, "/api/posts/")
+    assert response.status_code == 401
+    assert response["WWW-Authenticate"] == 'Bearer realm="api"'
+    assert response.json() == {"detail": "Authentication credentials were not provided."}
+
+    # Запись и браузерный API обслуживают синхронные представления DRF
+    response = async_to_sync(async_client.post)(
+        "/api/posts/", {"forum": forum.id, "author": post.author_id, "title": "Новый", "content": "Текст"},
+        content_type="application/json",
+    )
+    assert response.status_code == 201
+    response = async_get(async_client, f"/api/forums/{forum.id}/", {"Accept": "text/html"})
+    assert response.status_code == 200
+    assert b"<html" in response.content
+
+    response = async_get(async_client, f"/api/posts/{post.id}/")
+    assert response["X-Cache"] == "MISS"
+    assert async_get(async_client, f"/api/posts/{post.id}/")["X-Cache"] == "LOCAL"
+    assert async_get(async_client, f"/api/posts/{post.id}/", {"If-None-Match": response["ETag"]}).status_code == 304
+
+
+@pytest.mark.django_db
+def test_async_read_views_are_timed(async_client, post, settings):
+    settings.SERVER_TIMING_ENABLED = True
+    settings.FORUM_RESPONSE_CACHE_ENABLED = False
+    response = async_get(async_client, f"/api/posts/{post.id}/")
+    timing = response["Server-Timing"]
+    # Запросы асинхронного ORM идут в другом потоке, но учитываются
+    assert 'queries"' in timing and 'db;dur=' in timing
+    assert int(timing.split('db;dur=')[1].split('desc="')[1].split(" ")[0]) >= 2
+    assert "serialize;dur=" in timing and "render;dur=" in timing
+
+
+@pytest.fixture
+def slow_queries(settings):
+    settings.FORUM_SLOW_QUERY_MS = 0
+    settings.FORUM_RESPONSE_CACHE_ENABLED = False
+    slow_query_log.clear()
+    yield slow_query_log
+    slow_query_log.clear()
+
+
+@pytest.mark.django_db
+def test_slow_queries_are_grouped_by_shape(authenticated_client, forum, post, slow_queries):
+    client, _ = authenticated_client
+    client.get(f"/api/posts/{post.id}/")
+    other = Post.objects.create(forum=forum, author=post.author, title="Другой", content="Текст")
+    client.get(f"/api/posts/{other.id}/")
+
+    entries = {entry["shape"]: entry for entry in slow_queries.entries()}
+    detail = next(entry for shape, entry in entries.items() if shape.startswith('SELECT "forum_post"."id"') and "LIMIT" in shape)
+    assert detail["count"] == 2
+    assert detail["origin"].startswith("forum.")
+    assert detail["path"] == f"/api/posts/{other.id}/"
+    assert detail["params"][0] == "int"
+    assert any("USING INTEGER PRIMARY KEY" in line for line in detail["plan"]), detail["plan"]
+    assert not detail["full_scan"]
+    # Сам EXPLAIN в журнал не попадает
+    assert not any(shape.startswith("EXPLAIN") for shape in entries)
+
+    with capture(0):
+        list(Post.objects.filter(content__icontains="текст"))
+    scan = next(entry for entry in slow_queries.entries() if "LIKE" in entry["shape"])
+    assert scan["full_scan"], scan["plan"]
+    assert scan["origin"].startswith("forum.tests:")
+
+
+@pytest.mark.django_db
+def test_slow_query_log_is_bounded(post, settings, slow_queries):
+    settings.FORUM_SLOW_QUERY_LOG_SIZE = 3
+    with capture(0):
+        for field in ("title", "content", "score", "created_at", "updated_at"):
+            Post.objects.values_list(field).first()
+    shapes = [entry["shape"] for entry in slow_queries.entries()]
+    assert len(shapes) == 3
+    assert not any('"title"' in shape for shape in shapes)
+
+
+@pytest.mark.django_db
+def test_slow_queries_admin_page(staff_client, post, slow_queries):
+    staff_client.get("/admin/forum/post/?forum__id__exact=%d" % post.forum_id)
+    response = staff_client.get("/admin/slow-queries/")
+    assert response.status_code == 200
+    assert b"forum_post" in response.content
+
+    dump = staff_client.get("/admin/slow-queries/?format=json").json()
+    changelist = [entry for entry in dump["entries"] if (entry["path"] or "").startswith("/admin/forum/post/")]
+    assert changelist and all(entry["origin"] for entry in changelist)
+
+    assert staff_client.post("/admin/slow-queries/").status_code == 302
+    assert [entry["path"] for entry in slow_queries.entries()] == ["/admin/slow-queries/"] * len(slow_queries.entries())
+
+
+@pytest.mark.django_db
+def test_slow_queries_admin_page_is_staff_only(client, slow_queries):
+    assert client.get("/admin/slow-queries/?format=json").status_code == 302
+
+
+@pytest.mark.django_db
+def test_post_conditional_get(authenticated_client, post, django_assert_num_queries):
+    client, user = authenticated_client
+    response = client.get(f"/api/posts/{post.id}/")
+    etag, last_modified = response["ETag"], response["Last-Modified"]
+
+    # 304 без загрузки и сериализации поста: сессия, пользователь, валидаторы
+    with django_assert_num_queries(3):
+        response = client.get(f"/api/posts/{post.id}/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+    assert client.get(f"/api/posts/{post.id}/", HTTP_IF_MODIFIED_SINCE=last_modified).status_code == 304
+
+    # Голос меняет ETag
+    client.post("/api/rating/update/", {"post_id": post.id, "score": 1})
+    response = client.get(f"/api/posts/{post.id}/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+@pytest.mark.django_db
+def test_post_last_modified_follows_votes(authenticated_client, post):
+    """Клиент, который шлет только If-Modified-Since, видит новый счет после голоса."""
+    client, user = authenticated_client
+    # Last-Modified точен до секунды: пост правился час назад
+    Post.objects.filter(pk=post.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+    last_modified = client.get(f"/api/posts/{post.id}/")["Last-Modified"]
+    assert client.get(f"/api/posts/{post.id}/", HTTP_IF_MODIFIED_SINCE=last_modified).status_code == 304
+
+    client.post("/api/rating/update/", {"post_id": post.id, "score": 1})
+    response = client.get(f"/api/posts/{post.id}/", HTTP_IF_MODIFIED_SINCE=last_modified)
+    assert response.status_code == 200
+    assert response.data["score"] == 1
+    assert response["Last-Modified"] != last_modified
+
+
+@pytest.mark.django_db
+def test_forum_collection_conditional_get(authenticated_client, forum):
+    client, _ = authenticated_client
+    etag = client.get("/api/forums/")["ETag"]
+    assert client.get("/api/forums/", HTTP_IF_NONE_MATCH=etag).status_code == 304
+    assert client.get("/api/forums/?page_size=1", HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    client.patch(f"/api/forums/{forum.id}/", {"name": "Renamed"})
+    response = client.get("/api/forums/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.data["results"][0]["name"] == "Renamed"
+
+    detail = client.get(f"/api/forums/{forum.id}/")
+    assert "Last-Modified" in detail
+    assert client.get(f"/api/forums/{forum.id}/", HTTP_IF_NONE_MATCH=detail["ETag"]).status_code == 304
+
+
 ### Тесты для рейтинга
 @pytest.mark.django_db
 def test_rating_update(authenticated_client, post):
@@ -146,6 +835,138 @@ def test_rating_update(authenticated_client, post):
     assert Rating.objects.filter(user=user, post=post).exists()
 
 
+@pytest.mark.django_db
+def test_rating_update_applies_only_delta(authenticated_client, post, django_assert_max_num_queries, settings):
+    settings.FORUM_GLOBAL_RATING_SHARDS = 1
+    client, user = authenticated_client
+    assert client.post("/api/rating/update/", {"post_id": post.id, "score": 1}).status_code == 200
+    assert client.post("/api/rating/update/", {"post_id": post.id, "score": 1}).status_code == 200
+    post.refresh_from_db()
+    assert (post.score, post.upvotes, post.downvotes) == (1, 1, 0)
+    assert read_global_rating(post.author_id) == 1
+
+    # Голос меняется на противоположный: сессия и пользователь, BEGIN,
+    # upsert оценки, UPDATE поста, UPDATE шарда, COMMIT
+    with django_assert_max_num_queries(7):
+        response = client.post("/api/rating/update/", {"post_id": post.id, "score": -1})
+    assert response.status_code == 200
+    assert response.data["post_score"] == -1
+    post.refresh_from_db()
+    assert (post.score, post.upvotes, post.downvotes) == (-1, 0, 1)
+    assert read_global_rating(post.author_id) == -1
+    assert Rating.objects.get(user=user, post=post).score == -1
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("score", [2, -5, "up", "", 0.5])
+def test_rating_update_rejects_invalid_score(authenticated_client, post, score):
+    client, _ = authenticated_client
+    response = client.post("/api/rating/update/", {"post_id": post.id, "score": score}, format="json")
+    assert response.status_code == 400
+    assert not Rating.objects.exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("post_id", [1.5, True, "abc", "1.0", None])
+def test_rating_update_rejects_invalid_post_id(authenticated_client, post, post_id):
+    client, _ = authenticated_client
+    response = client.post("/api/rating/update/", {"post_id": post_id, "score": 1}, format="json")
+    assert response.status_code == 400
+    assert not Rating.objects.exists()
+
+
+@pytest.mark.django_db
+def test_rating_update_unknown_post(authenticated_client):
+    client, _ = authenticated_client
+    response = client.post("/api/rating/update/", {"post_id": 999, "score": 1})
+    assert response.status_code == 404
+    assert not Rating.objects.exists()
+
+
+@pytest.mark.django_db
+def test_rating_batch(authenticated_client, forum, create_user, django_assert_max_num_queries):
+    client, user = authenticated_client
+    author = create_user(username="author", password="password")
+    posts = Post.objects.bulk_create([
+        Post(forum=forum, author=author, title=f"Post {i}", content="") for i in range(20)
+    ])
+    Rating.objects.create(user=user, post=posts[0], score=-1)
+    votes = [{"post_id": p.id, "score": 1} for p in posts]
+    votes += [{"post_id": posts[1].id, "score": -1}, {"post_id": 999, "score": 1}, {"post_id": posts[2].id}]
+
+    with django_assert_max_num_queries(20):
+        response = client.post("/api/rating/batch/", {"votes": votes}, format="json")
+    assert response.status_code == 200
+    results = response.data["results"]
+    assert [r["status"] for r in results] == ["ok"] * 20 + ["duplicate", "not_found", "invalid"]
+    assert results[0]["previous_score"] == -1
+    assert results[1]["previous_score"] == 0
+
+    assert Rating.objects.filter(user=user, score=1).count() == 20
+    assert set(Post.objects.values_list("score", flat=True)) == {1}
+    assert read_global_rating(author.id) == 20
+
+
+@pytest.mark.django_db
+def test_rating_batch_rejects_non_integer_post_ids(authenticated_client, post):
+    client, user = authenticated_client
+    votes = [{"post_id": post.id + 0.5, "score": 1}, {"post_id": True, "score": 1}, {"post_id": "1e0", "score": 1}]
+    response = client.post("/api/rating/batch/", {"votes": votes}, format="json")
+    assert [r["status"] for r in response.data["results"]] == ["invalid"] * 3
+    assert not Rating.objects.exists()
+
+    votes = [{"post_id": str(post.id), "score": 1}]
+    assert client.post("/api/rating/batch/", {"votes": votes}, format="json").data["results"][0]["status"] == "ok"
+
+
+@pytest.mark.django_db
+def test_rating_batch_rejects_oversized_payload(authenticated_client, settings):
+    client, _ = authenticated_client
+    settings.FORUM_VOTE_BATCH_LIMIT = 2
+    votes = [{"post_id": i, "score": 1} for i in range(3)]
+    assert client.post("/api/rating/batch/", {"votes": votes}, format="json").status_code == 400
+    assert client.post("/api/rating/batch/", {"votes": "nope"}, format="json").status_code == 400
+
+
+@pytest.mark.django_db
+def test_post_score_counters_follow_ratings(post, create_user):
+    voters = [create_user(username=f"voter{i}", password="password") for i in range(3)]
+    ratings = [Rating.objects.create(post=post, user=voter, score=1) for voter in voters]
+    post.refresh_from_db()
+    assert (post.score, post.upvotes, post.downvotes) == (3, 3, 0)
+
+    ratings[0].score = -1
+    ratings[0].save()
+    post.refresh_from_db()
+    assert (post.score, post.upvotes, post.downvotes) == (1, 2, 1)
+
+    Rating.objects.get(pk=ratings[1].pk).delete()
+    post.refresh_from_db()
+    assert (post.score, post.upvotes, post.downvotes) == (0, 1, 1)
+
+
+@pytest.mark.django_db
+def test_post_score_is_read_only_and_orderable(authenticated_client, forum, create_user):
+    client, user = authenticated_client
+    low = Post.objects.create(forum=forum, author=user, title="Low", content="")
+    high = Post.objects.create(forum=forum, author=user, title="High", content="")
+    Rating.objects.create(post=high, user=user, score=1)
+    Rating.objects.create(post=low, user=create_user(username="voter", password="password"), score=-1)
+
+    response = client.get("/api/posts/?ordering=-score")
+    assert response.status_code == 200
+    assert [item["id"] for item in response.data["results"]] == [high.id, low.id]
+    assert response.data["results"][0]["score"] == 1
+
+    response = client.patch(f"/api/posts/{high.id}/", {"score": 100})
+    assert response.status_code == 200
+    high.refresh_from_db()
+    assert high.score == 1
+
+    response = client.get("/api/posts/?ordering=title")
+    assert response.status_code == 400
+
+
 ### Тесты для глобального рейтинга
 @pytest.mark.django_db
 def test_global_rating_get(authenticated_client, global_rating):
@@ -162,6 +983,324 @@ def test_global_rating_update(authenticated_client, global_rating):
     assert response.status_code == 200
     assert response.data["rating"] == 20
 
+@pytest.mark.django_db
+def test_global_rating_follows_post_author(post, create_user):
+    voter = create_user(username="voter", password="password")
+    rating = Rating.objects.create(post=post, user=voter, score=1)
+    assert read_global_rating(post.author_id) == 1
+    assert read_global_rating(voter.id) is None
+
+    rating.score = -1
+    rating.save()
+    assert read_global_rating(post.author_id) == -1
+
+    compact_global_ratings()
+    assert GlobalRating.objects.get(user=post.author).rating == -1
+    assert not GlobalRatingShard.objects.exclude(rating=0).exists()
+    assert read_global_rating(post.author_id) == -1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_global_rating_shards_lose_no_increments(create_user):
+    """Параллельные начисления одному пользователю не теряются."""
+    author = create_user(username="author", password="password")
+    threads, per_thread = 8, 25
+    errors = []
+
+    def vote():
+        try:
+            for _ in range(per_thread):
+                while True:
+                    try:
+                        increment_global_rating(author.id, 1)
+                        break
+                    except OperationalError:
+                        # SQLite допускает одного писателя, повторяем после блокировки
+                        continue
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=vote) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert not errors
+    assert read_global_rating(author.id) == threads * per_thread
+    compact_global_ratings([author.id])
+    assert GlobalRating.objects.get(user=author).rating == threads * per_thread
+
+
+@pytest.mark.django_db
+def test_leaderboard_top_and_around(authenticated_client, create_user, django_assert_max_num_queries,
+                                    django_capture_on_commit_callbacks):
+    client, _ = authenticated_client
+    users = [create_user(username=f"leader{i}", password="password") for i in range(5)]
+    for i, user in enumerate(users):
+        GlobalRating.objects.create(user=user, rating=i * 10)
+
+    response = client.get("/api/users/leaderboard/?limit=3")
+    assert response.status_code == 200
+    assert [(r["rank"], r["user"], r["rating"]) for r in response.data["results"]] == [
+        (1, users[4].id, 40), (2, users[3].id, 30), (3, users[2].id, 20),
+    ]
+
+    # Построенный список отвечает без обхода таблицы: сессия, пользователь, имена
+    with django_assert_max_num_queries(3):
+        response = client.get(f"/api/users/leaderboard/?around={users[1].id}&limit=1")
+    assert response.data["rank"] == 4
+    assert [r["user"] for r in response.data["results"]] == [users[2].id, users[1].id, users[0].id]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        increment_global_rating(users[0].id, 100)
+    response = client.get("/api/users/leaderboard/?limit=1")
+    assert response.data["results"][0]["user"] == users[0].id
+    assert response.data["results"][0]["rating"] == 100
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client.put(f"/api/users/global-rating/{users[0].id}/", {"rating": -5})
+    response = client.get(f"/api/users/leaderboard/?around={users[0].id}&limit=0")
+    assert response.data["rank"] == 5
+    assert response.data["results"][0]["rating"] == -5
+
+    assert client.get("/api/users/leaderboard/?around=999").status_code == 404
+
+
+@pytest.fixture
+def staff_client(client):
+    admin = User.objects.create_superuser(username="admin", password="password")
+    client.force_login(admin)
+    return client
+
+
+def read_stream(response):
+    return b"".join(response.streaming_content)
+
+
+@pytest.mark.django_db
+def test_leaderboard_is_invalidated_across_processes(authenticated_client, create_user, settings):
+    settings.FORUM_LEADERBOARD_MAX_AGE = 3600
+    client, _ = authenticated_client
+    first, second = create_user(username="first", password="pw"), create_user(username="second", password="pw")
+    GlobalRating.objects.create(user=first, rating=10)
+    GlobalRating.objects.create(user=second, rating=5)
+    assert client.get("/api/users/leaderboard/?limit=1").data["results"][0]["user"] == first.id
+
+    # Сброс рейтинга в другом процессе: здесь сигналов не было, список еще свежий
+    GlobalRating.objects.filter(user=second).update(rating=50)
+    assert client.get("/api/users/leaderboard/?limit=1").data["results"][0]["user"] == first.id
+    pid = os.fork()
+    if pid == 0:
+        try:
+            invalidate_leaderboard()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert client.get("/api/users/leaderboard/?limit=1").data["results"][0] == {
+        "rank": 1, "user": second.id, "username": "second", "rating": 50,
+    }
+
+
+@pytest.mark.django_db
+def test_leaderboard_applies_votes_from_other_processes(authenticated_client, create_user, settings):
+    settings.FORUM_LEADERBOARD_MAX_AGE = 3600
+    client, _ = authenticated_client
+    first, second = create_user(username="first", password="pw"), create_user(username="second", password="pw")
+    GlobalRating.objects.create(user=first, rating=10)
+    GlobalRating.objects.create(user=second, rating=5)
+    assert client.get("/api/users/leaderboard/?limit=1").data["results"][0]["user"] == first.id
+
+    # Начисление, зафиксированное другим процессом: база этого процесса его
+    # не видит, список получает разницу из общего журнала
+    pid = os.fork()
+    if pid == 0:
+        try:
+            publish_leaderboard_delta(second.id, 20)
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert client.get("/api/users/leaderboard/?limit=2").data["results"] == [
+        {"rank": 1, "user": second.id, "username": "second", "rating": 25},
+        {"rank": 2, "user": first.id, "username": "first", "rating": 10},
+    ]
+
+
+@pytest.mark.django_db
+def test_export_posts_ndjson_incremental(staff_client, authenticated_client, forum, post):
+    api_client, user = authenticated_client
+    assert api_client.get("/api/export/posts.ndjson").status_code == 403
+    assert staff_client.get("/api/export/users.ndjson").status_code == 400
+    assert staff_client.get("/api/export/posts.ndjson", {"since": "yesterday"}).status_code == 400
+
+    second = Post.objects.create(forum=forum, author=user, title="Второй", content="Текст")
+    response = staff_client.get("/api/export/posts.ndjson")
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in read_stream(response).splitlines()]
+    assert [row["id"] for row in rows] == [post.id, second.id]
+    assert rows[1]["title"] == "Второй"
+
+    # Следующая выгрузка начинается после последней строки предыдущей
+    last = rows[-1]
+    since = {"since": last["updated_at"], "since_id": last["id"]}
+    assert read_stream(staff_client.get("/api/export/posts.ndjson", since)) == b""
+    post.title = "Изменен"
+    post.save()
+    rows = [json.loads(line) for line in read_stream(staff_client.get("/api/export/posts.ndjson", since)).splitlines()]
+    assert [(row["id"], row["title"]) for row in rows] == [(post.id, "Изменен")]
+
+
+@pytest.mark.django_db
+def test_export_csv_gzip(staff_client, rating, settings):
+    settings.FORUM_GLOBAL_RATING_SHARDS = 1
+    response = staff_client.get("/api/export/global-ratings.csv", HTTP_ACCEPT_ENCODING="gzip")
+    assert response["Content-Encoding"] == "gzip"
+    rows = list(csv.reader(io.StringIO(gzip.decompress(read_stream(response)).decode())))
+    # Рейтинг автора еще лежит в шарде: выгрузка отдает итоговое значение
+    assert rows == [["id", "user_id", "rating"], [str(GlobalRating.objects.get().id), str(rating.post.author_id), "1"]]
+
+    response = staff_client.get("/api/export/ratings.csv", {"since": rating.updated_at.isoformat(), "since_id": rating.id})
+    assert read_stream(response).decode().splitlines() == ["id,user_id,post_id,score,updated_at"]
+
+
+@pytest.mark.django_db
+def test_export_incremental_includes_votes(staff_client, authenticated_client, post):
+    """Голос возвращает пост и оценку в следующую инкрементальную выгрузку."""
+    client, user = authenticated_client
+    assert client.post("/api/rating/update/", {"post_id": post.id, "score": 1}).status_code == status.HTTP_200_OK
+
+    def export(name, since=None):
+        response = staff_client.get(f"/api/export/{name}.ndjson", since or {})
+        return [json.loads(line) for line in read_stream(response).splitlines()]
+
+    last_post, last_rating = export("posts")[-1], export("ratings")[-1]
+    post_since = {"since": last_post["updated_at"], "since_id": last_post["id"]}
+    rating_since = {"since": last_rating["updated_at"], "since_id": last_rating["id"]}
+    assert export("posts", post_since) == export("ratings", rating_since) == []
+
+    # Тот же голос ничего не меняет и не попадает в выгрузку
+    client.post("/api/rating/update/", {"post_id": post.id, "score": 1})
+    assert export("posts", post_since) == export("ratings", rating_since) == []
+
+    client.post("/api/rating/update/", {"post_id": post.id, "score": -1})
+    assert [(row["id"], row["score"], row["downvotes"]) for row in export("posts", post_since)] == [(post.id, -1, 1)]
+    assert [(row["id"], row["score"]) for row in export("ratings", rating_since)] == [(last_rating["id"], -1)]
+
+
+@pytest.mark.django_db
+def test_export_forum_command(tmp_path, rating):
+    output = tmp_path / "ratings.ndjson.gz"
+    call_command("export_forum", "ratings", "--gzip", "--output", str(output))
+    rows = [json.loads(line) for line in gzip.decompress(output.read_bytes()).splitlines()]
+    assert rows == [{"id": rating.id, "user_id": rating.user_id, "post_id": rating.post_id, "score": 1, "updated_at": rating.updated_at.isoformat()}]
+    with pytest.raises(CommandError):
+        call_command("export_forum", "posts", "--since", "not-a-date", "--output", str(output))
+
+
+@pytest.mark.django_db
+def test_export_memory_stays_flat(forum, create_user, settings):
+    """Пиковая память выгрузки не растет вместе с числом строк."""
+    settings.FORUM_EXPORT_CHUNK_SIZE = 200
+    author = create_user(username="author", password="password")
+
+    def peak_memory():
+        tracemalloc.start()
+        try:
+            for _ in stream_export("posts", "ndjson"):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def add_posts(count):
+        Post.objects.bulk_create(
+            Post(forum=forum, author=author, title=f"Post {i}", content="x" * 500) for i in range(count)
+        )
+
+    add_posts(1000)
+    small = peak_memory()
+    add_posts(9000)
+    large = peak_memory()
+    # Десятикратный рост таблицы (около 5 МБ текста) почти не меняет пик
+    assert large < small * 1.5
+    assert large < 2 * 1024 * 1024
+
+
+@pytest.mark.django_db
+def test_seed_forum(django_assert_max_num_queries):
+    # Многострочные INSERT (SQLite ограничивает их 999 параметрами) и пересчеты
+    # одним запросом: десятки запросов на 2 340 строк, а не по одному на строку
+    with django_assert_max_num_queries(35):
+        created = seed(users=40, forums=3, posts=300, ratings=2000, random_seed=1)
+    assert created == {"users": 40, "forums": 3, "posts": 300, "ratings": 2000, "global_ratings": created["global_ratings"]}
+
+    users = User.objects.filter(username__startswith="seed-")
+    assert users.values("password").distinct().count() == 1
+    assert users.first().check_password("password")
+    assert Rating.objects.values("user", "post").distinct().count() == 2000
+    assert Post.objects.values("created_at").distinct().count() > 250
+    assert not Post.objects.exclude(excerpt=F("content")).exists()
+
+    post = Post.objects.annotate(total=Sum("ratings__score")).filter(total__isnull=False).first()
+    assert post.score == post.total
+    authors = Rating.objects.values("post__author").annotate(total=Sum("score"))
+    assert created["global_ratings"] == len(authors)
+    for row in authors:
+        assert read_global_rating(row["post__author"]) == row["total"]
+
+
+@pytest.mark.django_db
+def test_import_forum_round_trip(tmp_path, rating, create_user):
+    second = Post.objects.create(forum=rating.post.forum, author=rating.user, title="Второй", content="Текст")
+    Rating.objects.create(post=second, user=rating.post.author, score=-1)
+    dumps = {}
+    for name in ("posts", "ratings"):
+        dumps[name] = tmp_path / f"{name}.ndjson.gz"
+        call_command("export_forum", name, "--gzip", "--output", str(dumps[name]))
+    posts = list(Post.objects.order_by("id").values_list("id", "author_id", "title", "created_at", "updated_at", "score", "excerpt", "content_length"))
+    ratings = list(Rating.objects.order_by("id").values_list("id", "score", "updated_at"))
+
+    Post.objects.all().delete()
+    User.objects.exclude(pk=rating.post.author_id).delete()
+    GlobalRating.objects.all().delete()
+    call_command("import_forum", "posts", str(dumps["posts"]), stdout=io.StringIO())
+    call_command("import_forum", "ratings", str(dumps["ratings"]), stdout=io.StringIO())
+
+    assert list(Post.objects.order_by("id").values_list("id", "author_id", "title", "created_at", "updated_at", "score", "excerpt", "content_length")) == posts
+    assert list(Rating.objects.order_by("id").values_list("id", "score", "updated_at")) == ratings
+    # Автор второго поста не выгружался: создан пользователь-заглушка
+    assert User.objects.get(pk=rating.user_id).username == f"imported-{rating.user_id}"
+    assert read_global_rating(rating.post.author_id) == 1
+    assert read_global_rating(rating.user_id) == -1
+    assert [row[0] for row in search_posts("Второй")] == [second.id]
+
+
+@pytest.mark.django_db
+def test_import_ratings_skips_missing_posts(tmp_path, rating):
+    """Оценки отсутствующих постов пропускаются, рейтинг автора без оценок сбрасывается."""
+    author_id, voter_id = rating.post.author_id, rating.user_id
+    voter_post = Post.objects.create(forum=rating.post.forum, author_id=voter_id, title="Второй", content="Текст")
+    rating.delete()
+    # Рейтинг разошелся с оценками, например после ручной правки базы
+    GlobalRating.objects.filter(user_id=author_id).update(rating=5)
+    dump = tmp_path / "ratings.ndjson"
+    rows = [
+        {"id": 100, "user_id": voter_id, "post_id": voter_post.id + 1000, "score": 1},
+        {"id": 101, "user_id": author_id, "post_id": voter_post.id, "score": -1},
+    ]
+    dump.write_text("".join(json.dumps(row) + "\n" for row in rows))
+
+    stdout = io.StringIO()
+    call_command("import_forum", "ratings", str(dump), stdout=stdout)
+    assert "skipped 1" in stdout.getvalue()
+    assert list(Rating.objects.values_list("id", "score")) == [(101, -1)]
+    assert dict(GlobalRating.objects.values_list("user_id", "rating")) == {author_id: 0, voter_id: -1}
+    assert not GlobalRatingShard.objects.exists()
+
+
 @pytest.mark.django_db
 def test_post_creation_with_invalid_data(authenticated_client):
     """Тест создания поста с некорректными данными."""
@@ -178,4 +1317,387 @@ def test_user_profile_retrieve(authenticated_client):
     client, user = authenticated_client
     response = client.get(f"/api/users/{user.id}/")
     assert response.status_code == status.HTTP_200_OK
-    assert response.data["username"] == user.username
\ No newline at end of file
+    assert response.data["username"] == user.username
+
+def user_queries(captured):
+    return [query["sql"] for query in captured.captured_queries if "forum_customuser" in query["sql"]]
+
+
+@pytest.mark.django_db
+def test_jwt_obtain_refresh_and_cached_user(api_client, create_user, forum, settings):
+    create_user(username="jwtuser", password="testpassword")
+    response = api_client.post("/api/users/token/", {"username": "jwtuser", "password": "testpassword"}, format="json")
+    assert response.status_code == 200
+    tokens = response.json()
+
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+    assert api_client.get("/api/forums/").status_code == 200
+    # Пользователь уже в кеше процесса: аутентификация без запросов
+    with CaptureQueriesContext(connection) as captured:
+        assert api_client.get(f"/api/forums/{forum.id}/").status_code == 200
+    assert user_queries(captured) == []
+
+    settings.ROOT_URLCONF = "mainapp.asgi_urls"
+    with CaptureQueriesContext(connection) as captured:
+        response = async_get(AsyncClient(), "/api/forums/", headers={"Authorization": f"Bearer {tokens['access']}"})
+    assert response.status_code == 200
+    assert user_queries(captured) == []
+    settings.ROOT_URLCONF = "mainapp.urls"
+
+    api_client.credentials()
+    response = api_client.post("/api/users/token/refresh/", {"refresh": tokens["refresh"]}, format="json")
+    assert response.status_code == 200
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+    assert api_client.get("/api/forums/").status_code == 200
+
+
+@pytest.mark.django_db
+def test_jwt_rejects_bad_credentials_and_blocked_users(api_client, create_user):
+    user = create_user(username="jwtuser", password="testpassword")
+    response = api_client.post("/api/users/token/", {"username": "jwtuser", "password": "wrong"}, format="json")
+    assert response.status_code == 401
+
+    api_client.credentials(HTTP_AUTHORIZATION="Bearer not-a-token")
+    assert api_client.get("/api/forums/").status_code == 401
+
+    access = api_client.post("/api/users/token/", {"username": "jwtuser", "password": "testpassword"}, format="json").json()["access"]
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+    assert api_client.get("/api/forums/").status_code == 200
+    # Сохранение пользователя сбрасывает кеш: блокировка действует сразу
+    user.is_active = False
+    user.save()
+    response = api_client.get("/api/forums/")
+    assert response.status_code == 401
+    assert response.json()["code"] == "user_inactive"
+
+
+@pytest.mark.django_db
+def test_login_and_register_hash_in_pool(api_client, metrics_dir):
+    response = api_client.post("/api/users/register/",
+                               {"username": "pooluser", "email": "Pool@Example.COM", "password": "testpassword"}, format="json")
+    assert response.status_code == 201
+    user = User.objects.get(username="pooluser")
+    assert user.email == "Pool@example.com"
+    assert user.check_password("testpassword")
+
+    assert api_client.post("/api/users/login/", {"username": "pooluser", "password": "wrong"}, format="json").status_code == 400
+    assert api_client.post("/api/users/login/", {"username": "nobody", "password": "wrong"}, format="json").status_code == 400
+    assert api_client.post("/api/users/login/", {"username": "pooluser", "password": "testpassword"}, format="json").status_code == 200
+    assert api_client.get("/api/forums/").status_code == 200
+
+    samples = scrape(api_client)
+    assert samples['forum_password_hash_duration_seconds_count{operation="make"}'] == 1
+    assert samples['forum_password_hash_duration_seconds_count{operation="verify"}'] == 3
+    assert samples["forum_password_hash_queue_depth"] == 0
+
+
+@pytest.mark.django_db
+def test_login_is_rejected_when_hashing_pool_is_full(api_client, create_user, settings, metrics_dir):
+    create_user(username="pooluser", password="testpassword")
+    settings.FORUM_HASHING_QUEUE_LIMIT = 1
+    busy = hashing_pool.submit(time.sleep, 1)
+    try:
+        response = api_client.post("/api/users/login/", {"username": "pooluser", "password": "testpassword"}, format="json")
+        assert response.status_code == 503
+        assert response["Retry-After"] == "1"
+        assert response.json()["detail"].startswith("Too many password checks")
+        samples = scrape(api_client)
+        assert samples["forum_password_hash_queue_depth"] == 1
+        assert samples["forum_password_hash_rejected_total"] == 1
+    finally:
+        busy.result()
+
+
+@pytest.mark.django_db
+def test_async_login_and_register(create_user, settings):
+    settings.ROOT_URLCONF = "mainapp.asgi_urls"
+    create_user(username="pooluser", password="testpassword")
+    client = AsyncClient(enforce_csrf_checks=True)
+    post = async_to_sync(client.post)
+
+    response = post("/api/users/register/", {"username": "newuser", "email": "new@example.com", "password": "pw"},
+                    content_type="application/json")
+    assert response.status_code == 201
+    assert User.objects.get(username="newuser").check_password("pw")
+
+    response = post("/api/users/login/", {"username": "pooluser", "password": "wrong"}, content_type="application/json")
+    assert response.status_code == 400
+    response = post("/api/users/login/", {"username": "pooluser", "password": "testpassword"}, content_type="application/json")
+    assert response.status_code == 200
+    assert async_get(client, "/api/forums/").status_code == 200
+
+    # Вошедший по сессии пользователь без CSRF-токена получает 403, как в DRF
+    response = post("/api/users/login/", {"username": "pooluser", "password": "testpassword"}, content_type="application/json")
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_write_throttle_token_bucket(authenticated_client, another_authenticated_client, settings, monkeypatch):
+    settings.FORUM_THROTTLE_RATES = {"write": {"rate": "1/min", "burst": 2}}
+    client, _ = authenticated_client
+    create = lambda client, name: client.post("/api/forums/", {"name": name, "description": "d"}, format="json")
+    assert create(client, "one").status_code == 201
+    assert create(client, "two").status_code == 201
+    response = create(client, "three")
+    assert response.status_code == 429
+    assert 0 < int(response["Retry-After"]) <= 60
+    # Чтение не ограничивается, у другого пользователя своя корзина
+    assert client.get("/api/forums/").status_code == 200
+    assert create(another_authenticated_client, "four").status_code == 201
+
+    # Через минуту в корзине снова один маркер
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert create(client, "five").status_code == 201
+    assert create(client, "six").status_code == 429
+
+
+def test_write_throttle_is_shared_between_processes(rf, settings):
+    settings.FORUM_THROTTLE_RATES = {"write": {"rate": "1/hour", "burst": 10}}
+    view = type("View", (), {"throttle_scope": "write"})()
+
+    def drain():
+        request = rf.post("/api/forums/", REMOTE_ADDR="10.0.0.9")
+        request.user = AnonymousUser()
+        return sum(TokenBucketThrottle().allow_request(request, view) for _ in range(10))
+
+    # Оба процесса одновременно тратят одну корзину: вместе — не больше burst
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.write(write_end, str(drain()).encode())
+        finally:
+            os._exit(0)
+    allowed = drain()
+    os.waitpid(pid, 0)
+    allowed_in_child = int(os.read(read_end, 16))
+    # С кешем на процесс каждый получил бы все 10
+    assert allowed + allowed_in_child == 10
+
+
+@pytest.mark.django_db
+def test_register_throttle_per_ip(api_client, settings):
+    settings.FORUM_THROTTLE_RATES = {"register": {"rate": "1/hour", "burst": 1}}
+    register = lambda username, ip: api_client.post(
+        "/api/users/register/", {"username": username, "email": "", "password": "pw"}, format="json", REMOTE_ADDR=ip)
+    assert register("first", "10.0.0.1").status_code == 201
+    response = register("second", "10.0.0.1")
+    assert response.status_code == 429
+    assert 3500 < int(response["Retry-After"]) <= 3600
+    assert register("third", "10.0.0.2").status_code == 201
+
+    settings.ROOT_URLCONF = "mainapp.asgi_urls"
+    client = AsyncClient(REMOTE_ADDR="10.0.0.3")
+    register = lambda username: async_to_sync(client.post)(
+        "/api/users/register/", {"username": username, "email": "", "password": "pw"}, content_type="application/json")
+    assert register("fourth").status_code == 201
+    response = register("fifth")
+    assert response.status_code == 429
+    assert "Retry-After" in response
+
+
+@pytest.mark.django_db
+def test_sparse_fieldsets_and_includes(authenticated_client, forum, create_user):
+    client, user = authenticated_client
+    for i in range(5):
+        author = create_user(username=f"author{i}", password="pw", email=f"author{i}@example.com")
+        Post.objects.create(forum=forum, author=author, title=f"Post {i}", content="x" * 1000)
+
+    response = client.get("/api/posts/?fields=id,title,created_at")
+    assert [set(item) for item in response.data["results"]] == [{"id", "title", "created_at"}] * 5
+
+    # Авторы и форумы читаются тем же запросом, что и посты: без 1+N
+    def fetch(path):
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(path)
+        assert response.status_code == 200
+        return response, [query["sql"] for query in captured]
+
+    _, plain = fetch("/api/posts/?page_size=3")
+    response, queries = fetch("/api/posts/?fields=id,title&include=author,forum&page_size=3")
+    assert len(queries) == len(plain)
+    (select,) = [sql for sql in queries if 'FROM "forum_post"' in sql]
+    assert '"forum_post"."content"' not in select and '"forum_customuser"."password"' not in select
+    item = response.data["results"][0]
+    assert set(item) == {"id", "title", "author", "forum"}
+    assert set(item["author"]) == {"id", "username", "bio", "avatar"}
+    assert item["forum"]["name"] == forum.name
+    # Ключ курсора загружен вместе со страницей
+    response, queries = fetch(response.data["next"])
+    assert len(queries) == len(plain) and len(response.data["results"]) == 2
+
+    response = client.get(f"/api/posts/{item['id']}/?include=author")
+    assert response.data["author"]["username"] == item["author"]["username"]
+    assert "content" in response.data
+    assert set(client.get(f"/api/forums/{forum.id}/posts/?fields=id").data["results"][0]) == {"id"}
+    assert client.get(f"/api/users/{user.id}/?fields=username").data == {"username": user.username}
+    Rating.objects.create(post_id=item["id"], user=user, score=1)
+    rating = client.get("/api/ratings/?include=user,post").data["results"][0]
+    assert rating["user"]["username"] == user.username and rating["post"]["title"] == item["title"]
+
+    # Переименование автора меняет закешированный список с include=author
+    path = "/api/posts/?include=author"
+    etag = client.get(path)["ETag"]
+    renamed = User.objects.get(pk=item["author"]["id"])
+    renamed.username = "renamed"
+    renamed.save()
+    response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert "renamed" in [post["author"]["username"] for post in response.data["results"]]
+
+    response = client.get("/api/posts/?fields=id,secret&include=author,ratings")
+    assert response.status_code == 400
+    assert "secret" in str(response.data["fields"])
+    assert client.get("/api/forums/?include=author").status_code == 400
+    # Пустой список полей — ошибка, а не ответ из пустых объектов
+    assert client.get("/api/posts/?fields=").status_code == 400
+    assert client.get("/api/posts/?fields=,").status_code == 400
+    # Запись параметры не ограничивают
+    response = client.post("/api/posts/?fields=id", {"forum": forum.id, "author": user.id, "title": "New", "content": "c"})
+    assert response.status_code == 201
+    assert response.data["content"] == "c"
+
+
+@pytest.mark.django_db
+def test_fast_serialization_is_byte_identical(authenticated_client, rating, settings, monkeypatch):
+    client, user = authenticated_client
+    post = rating.post
+    Post.objects.create(forum=post.forum, author=post.author, title="Второй", content='Текст с "кавычками"\nи <тегами>')
+    paths = [
+        "/api/posts/", "/api/posts/?ordering=-score&page_size=1", f"/api/posts/{post.id}/", f"/api/posts/?pk={post.id}",
+        "/api/posts/?fields=title,created_at,author", "/api/posts/999/",
+        "/api/ratings/", f"/api/ratings/{rating.id}/", "/api/ratings/?fields=score,post&page_size=1", "/api/ratings/999/",
+        "/api/forums/", f"/api/forums/{post.forum_id}/",
+    ]
+
+    def fetch(path):
+        cache.clear()
+        response_cache.clear_local()
+        response = client.get(path, HTTP_ACCEPT="application/json")
+        next_page = response.json().get("next") if response.status_code == 200 else None
+        return response.status_code, response.content, next_page and client.get(next_page).content
+
+    settings.FORUM_FAST_SERIALIZATION = False
+    expected = {path: fetch(path) for path in paths}
+    with timezone.override("Europe/Moscow"):
+        expected_local = fetch("/api/posts/")
+
+    settings.FORUM_FAST_SERIALIZATION = True
+    def fail(*args, **kwargs):
+        raise AssertionError("ModelSerializer was used")
+    for serializer in (ForumSerializer, PostSerializer, RatingSerializer):
+        monkeypatch.setattr(serializer, "to_representation", fail)
+    for path in paths:
+        assert fetch(path) == expected[path], path
+    # Даты в зоне, отличной от UTC, переводятся как у DateTimeField
+    with timezone.override("Europe/Moscow"):
+        assert fetch("/api/posts/") == expected_local != expected["/api/posts/"]
+
+    # Асинхронные представления идут тем же путем
+    settings.ROOT_URLCONF = "mainapp.asgi_urls"
+    async_client = AsyncClient()
+    async_client.force_login(user)
+    for path in ("/api/posts/", f"/api/posts/{post.id}/", "/api/posts/?fields=title,created_at,author", "/api/posts/999/"):
+        cache.clear()
+        response_cache.clear_local()
+        response = async_get(async_client, path)
+        assert (response.status_code, response.content) == expected[path][:2], path
+
+
+@pytest.mark.django_db
+def test_fast_json_and_msgpack_renderers(authenticated_client, rating):
+    client, user = authenticated_client
+    post = rating.post
+    Post.objects.create(forum=post.forum, author=post.author, title="Ünïcode\u2028✓\u2029", content="строка")
+
+    # orjson отдает те же байты, что JSONRenderer DRF
+    response = client.get("/api/posts/", HTTP_ACCEPT="application/json")
+    assert response["Content-Type"] == "application/json"
+    assert "Accept" in response["Vary"]
+    assert response.content == JSONRenderer().render(response.data)
+    assert b"\\u2028" in response.content
+    data = {"at": post.created_at, 1: Decimal("1.5"), "nested": [(1, "два")]}
+    assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+    assert FastJSONRenderer().render({"n": 2 ** 70}) == b'{"n":1180591620717411303424}'
+
+    for path in ("/api/posts/", f"/api/ratings/{rating.id}/", "/api/posts/?include=author", "/api/posts/999/"):
+        expected = client.get(path, HTTP_ACCEPT="application/json")
+        response = client.get(path, HTTP_ACCEPT="application/msgpack")
+        assert response.status_code == expected.status_code, path
+        assert response["Content-Type"] == "application/msgpack"
+        assert msgpack.unpackb(response.content) == expected.json(), path
+        assert len(response.content) < len(expected.content)
+    assert client.get("/api/posts/?format=msgpack")["Content-Type"] == "application/msgpack"
+
+    # Тела запросов голосования в MessagePack
+    response = client.post(
+        "/api/rating/update/", msgpack.packb({"post_id": post.id, "score": -1}),
+        content_type="application/msgpack", HTTP_ACCEPT="application/msgpack",
+    )
+    assert response.status_code == 200
+    assert msgpack.unpackb(response.content) == {"message": "Rating updated successfully", "post_score": 0}
+    response = client.post(
+        "/api/rating/batch/", msgpack.packb({"votes": [{"post_id": post.id, "score": 1}]}),
+        content_type="application/msgpack",
+    )
+    assert response.status_code == 200
+    assert response.json()["results"][0]["status"] == "ok"
+    response = client.post("/api/rating/update/", b"\xc1", content_type="application/msgpack")
+    assert response.status_code == 400
+
+    # Асинхронные представления согласуют формат так же
+    with override_settings(ROOT_URLCONF="mainapp.asgi_urls"):
+        async_client = AsyncClient()
+        async_client.force_login(user)
+        for path in ("/api/posts/", f"/api/posts/{post.id}/"):
+            cache.clear()
+            response_cache.clear_local()
+            expected = client.get(path, HTTP_ACCEPT="application/msgpack")
+            cache.clear()
+            response_cache.clear_local()
+            response = async_get(async_client, path, {"Accept": "application/msgpack"})
+            assert resolve(path).func.view_class.__module__ == "forum.async_views"
+            assert (response["Content-Type"], response.content) == (expected["Content-Type"], expected.content), path
+
+
+@pytest.mark.django_db
+def test_post_lists_return_excerpt_without_content(authenticated_client, rating, settings):
+    client, user = authenticated_client
+    settings.FORUM_POST_EXCERPT_LENGTH = 40
+    post = rating.post
+    long_post = Post.objects.create(
+        forum=post.forum, author=user, title="Длинный", content="Первое предложение.\n\nДальше   идет очень длинный текст " * 50,
+    )
+    assert long_post.content_length == len(long_post.content)
+    assert long_post.excerpt == make_excerpt(long_post.content) == "Первое предложение. Дальше идет очень…"
+    assert make_excerpt("короткий\nтекст") == "короткий текст"
+
+    # Списки не читают столбец content и отдают отрывок
+    for path in ("/api/posts/", f"/api/forums/{post.forum_id}/posts/", "/api/posts/search/?q=длинный",
+                 "/api/ratings/?include=post", f"/api/posts/?pk={post.id}"):
+        for fast in (True, False):
+            settings.FORUM_FAST_SERIALIZATION = fast
+            cache.clear()
+            response_cache.clear_local()
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(path)
+            assert response.status_code == 200, path
+            items = [item.get("post", item) for item in response.json()["results"]]
+            assert items and all("content" not in item and "excerpt" in item for item in items), path
+            assert not any('"forum_post"."content"' in query["sql"] for query in queries), path
+    assert client.get("/api/posts/?fields=content").status_code == 400
+
+    # Карточка отдает полный текст, изменение текста пересчитывает отрывок
+    response = client.get(f"/api/posts/{long_post.id}/")
+    assert response.json()["content"] == long_post.content
+    response = client.patch(f"/api/posts/{long_post.id}/", {"content": "Новый текст"}, format="json")
+    assert (response.data["excerpt"], response.data["content_length"]) == ("Новый текст", 11)
+    post.content = "Сохранен с update_fields"
+    post.save(update_fields=["content"])
+    post = Post.objects.get(pk=post.pk)
+    assert (post.excerpt, post.content_length) == ("Сохранен с update_fields", 24)
+    deferred = Post.objects.defer("content").get(pk=post.pk)
+    deferred.score = 5
+    deferred.save(update_fields=["score"])
+    assert Post.objects.get(pk=post.pk).excerpt == "Сохранен с update_fields"
@@ -0,0 +1,122 @@
+"""
+Ограничение частоты записей: маркерная корзина на пользователя или IP.
+
+Бюджеты задает FORUM_THROTTLE_RATES по областям (throttle_scope
+представления): rate — скорость пополнения корзины ('60/min'), burst — ее
+емкость. Ограничиваются только небезопасные методы. Вошедшие пользователи
+считаются по идентификатору, анонимные — по IP (X-Forwarded-For
+учитывается по NUM_PROXIES настроек DRF). Сверх бюджета — 429 с
+Retry-After.
+
+Корзина — это GCRA: хранится теоретическое время прибытия (TAT), запрос
+пропускается, если новое TAT опережает текущее время не больше чем на
+burst интервалов. Корзины лежат в кеше Django без блокировок:
+каждое новое TAT записывается под следующим номером версии атомарным
+cache.add, так что из параллельных запросов версию получает ровно один, а
+остальные перечитывают ее и пробуют следующую. Номер последней версии —
+подсказка, с которой начинается поиск. Обычно проверка — четыре обращения
+к кешу и ни одного к базе.
+
+Пока корзина не полна, в кеше живет до burst версий, поэтому корзины
+хранятся в отдельном кеше FORUM_THROTTLE_CACHE и не вытесняют кеш ответов.
+По умолчанию этот кеш — файл SQLite, общий для процессов машины
+(mainapp.shared_cache); для нескольких машин — memcached или Redis.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    '60/min' -> интервал между маркерами в секундах.
+    """
+    count, period = rate.split('/')
+    return DURATIONS[period[0]] / int(count)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    def __init__(self):
+        self._wait = None
+
+    def bucket(self, request, view):
+        """
+        (ключ, интервал, емкость) корзины запроса или None без ограничения.
+        """
+        if request.method in SAFE_METHODS:
+            return None
+        scope = getattr(view, 'throttle_scope', None)
+        budget = (getattr(settings, 'FORUM_THROTTLE_RATES', None) or {}).get(scope)
+        if budget is None:
+            return None
+        user = request.user
+        ident = f'user:{user.pk}' if user and user.is_authenticated else f'ip:{self.get_ident(request)}'
+        return f'forum:throttle:{scope}:{ident}', parse_rate(budget['rate']), budget['burst']
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'FORUM_THROTTLE_CACHE', 'default')]
+
+    def claim(self, tat, interval, burst):
+        """
+        Новое TAT для запроса или None, если корзина пуста.
+        """
+        now = time.time()
+        tat = max(tat or now, now) + interval
+        if tat - now > burst * interval:
+            self._wait = tat - now - burst * interval
+            return None
+        return tat
+
+    def allow_request(self, request, view):
+        bucket = self.bucket(request, view)
+        if bucket is None:
+            return True
+        key, interval, burst = bucket
+        # Версия живет, пока ее TAT может быть в будущем; подсказка — дольше
+        timeout = math.ceil(burst * interval) + 1
+        version = self.cache.get(f'{key}:version', 0)
+        while True:
+            current, following = f'{key}:{version}', f'{key}:{version + 1}'
+            values = self.cache.get_many([current, following])
+            if following in values:
+                # Подсказка отстала от параллельных запросов
+                version += 1
+                continue
+            tat = self.claim(values.get(current), interval, burst)
+            if tat is None:
+                return False
+            if self.cache.add(following, tat, timeout):
+                self.cache.set(f'{key}:version', version + 1, timeout + 1)
+                return True
+            version += 1
+
+    async def aallow_request(self, request, view):
+        bucket = self.bucket(request, view)
+        if bucket is None:
+            return True
+        key, interval, burst = bucket
+        timeout = math.ceil(burst * interval) + 1
+        version = await self.cache.aget(f'{key}:version', 0)
+        while True:
+            current, following = f'{key}:{version}', f'{key}:{version + 1}'
+            values = await self.cache.aget_many([current, following])
+            if following in values:
+                version += 1
+                continue
+            tat = self.claim(values.get(current), interval, burst)
+            if tat is None:
+                return False
+            if await self.cache.aadd(following, tat, timeout):
+                await self.cache.aset(f'{key}:version', version + 1, timeout + 1)
+                return True
+            version += 1
+
+    def wait(self):
+        return self._wait
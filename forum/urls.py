@@ -1,5 +1,6 @@
 from rest_framework.routers import DefaultRouter
 from .views import *
+from . import async_views
 from django.urls import path, re_path
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
@@ -31,9 +32,37 @@ urlpatterns = [
     path('users/register/', RegisterView.as_view(), name='user-register'),
     path('users/login/', LoginView.as_view(), name='user-login'),
     path('users/logout/', LogoutView.as_view(), name='user-logout'),
+    path('users/token/', TokenObtainView.as_view(), name='token-obtain'),
+    path('users/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     path('rating/update/', RatingUpdateView.as_view(), name='rating-update'),
+    path('rating/batch/', RatingBatchView.as_view(), name='rating-batch'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    re_path(r'^export/(?P<name>[\w-]+)\.(?P<fmt>ndjson|csv)$', ExportView.as_view(), name='export'),
+    path('users/leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
     path('users/global-rating/<int:pk>/', GlobalRatingCreateUpdateView.as_view(), name='global-rating-create-update'),
     re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-] + router.urls
\ No newline at end of file
+] + router.urls
+
+
+# Асинхронные версии читающих эндпоинтов, входа и регистрации
+# (forum.async_views) на тех же маршрутах; mainapp/asgi_urls.py подключает
+# их раньше синхронных
+_sync_views = {
+    pattern.name: pattern.callback
+    for pattern in router.urls
+    if 'format' not in pattern.pattern.regex.groupindex
+}
+
+async_urlpatterns = [
+    re_path(r'^forums/$', async_views.ForumListView.as_view(_sync_views['forum-list']), name='forum-list'),
+    re_path(r'^forums/(?P<pk>[^/.]+)/$', async_views.ForumDetailView.as_view(_sync_views['forum-detail']), name='forum-detail'),
+    re_path(r'^posts/$', async_views.PostListView.as_view(_sync_views['post-list']), name='post-list'),
+    re_path(r'^posts/(?P<pk>[^/.]+)/$', async_views.PostDetailView.as_view(_sync_views['post-detail']), name='post-detail'),
+    path('users/login/', async_views.LoginView.as_view(LoginView.as_view()), name='user-login'),
+    path('users/register/', async_views.RegisterView.as_view(RegisterView.as_view()), name='user-register'),
+    path('users/leaderboard/', async_views.LeaderboardView.as_view(LeaderboardView.as_view()), name='leaderboard'),
+    path('users/global-rating/<int:pk>/', async_views.GlobalRatingView.as_view(GlobalRatingCreateUpdateView.as_view()),
+         name='global-rating-create-update'),
+]
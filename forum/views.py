@@ -5,16 +5,32 @@ from django.contrib.auth import get_user_model
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.contrib.auth import login, authenticate, logout
+from django.contrib.auth import login, logout
 from rest_framework.exceptions import NotFound
 from rest_framework.decorators import action
+from rest_framework_simplejwt import views as jwt_views
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from .pagination import ForumPostsPagination, IdKeysetPagination, PostKeysetPagination, SearchPagination
+from .counters import read_global_rating, reset_global_rating
+from .votes import InvalidPostId, InvalidScore, cast_vote, cast_votes, parse_post_id, parse_score
+from .leaderboard import leaderboard
+from .response_cache import cache_response, response_cache
+from .conditional import collection_validators, conditional_response, object_validators
+from .exports import FORMATS, InvalidExport, stream_export
+from .hashing import authenticate_user, create_user
+from .fieldsets import SparseQuerysetMixin
+from .fast_serialization import FastSerializationMixin
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.permissions import IsAdminUser
+from django.conf import settings
+from mainapp.server_timing import TimingMixin
 
 User = get_user_model()
 
 
-class ForumViewSet(viewsets.ModelViewSet):
+class ForumViewSet(FastSerializationMixin, SparseQuerysetMixin, TimingMixin, viewsets.ModelViewSet):
     """
     ViewSet для управления форумами.
     Позволяет создавать, читать, обновлять и удалять записи о форумах.
@@ -22,6 +38,8 @@ class ForumViewSet(viewsets.ModelViewSet):
     queryset = Forum.objects.all()
     serializer_class = ForumSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'write'
+    pagination_class = IdKeysetPagination
 
     @swagger_auto_schema(
         operation_description="Получение списка всех форумов или поиск форума по ID.",
@@ -31,6 +49,12 @@ class ForumViewSet(viewsets.ModelViewSet):
                 openapi.IN_QUERY,
                 description="ID форума для фильтрации (опционально).",
                 type=openapi.TYPE_INTEGER
+            ),
+            openapi.Parameter(
+                'fields',
+                openapi.IN_QUERY,
+                description="Поля ответа через запятую (опционально), например id,name.",
+                type=openapi.TYPE_STRING
             )
         ],
         responses={
@@ -47,8 +71,23 @@ class ForumViewSet(viewsets.ModelViewSet):
         """
         pk = self.request.query_params.get('pk')
         if pk:
-            return self.queryset.filter(pk=pk)
-        return self.queryset
+            return self.get_sparse_queryset(self.queryset.filter(pk=pk))
+        return self.get_sparse_queryset(self.queryset)
+
+    def get_serializer_class(self):
+        if self.action == 'posts':
+            return PostListSerializer
+        return super().get_serializer_class()
+
+    @conditional_response(collection_validators('forum.Forum'))
+    @cache_response('forum.Forum')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response(object_validators(Forum))
+    @cache_response('forum.Forum')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     @swagger_auto_schema(
         operation_description="Получение детальной информации о форуме по ID.",
@@ -61,8 +100,9 @@ class ForumViewSet(viewsets.ModelViewSet):
             403: openapi.Response(description="Доступ запрещен.")
         },
     )
-    @action(detail=True, methods=['get'])
-    def detail(self, request, pk=None):
+    # DRF записывает во view атрибут detail, поэтому метод назван иначе
+    @action(detail=True, methods=['get'], url_path='detail')
+    def detail_info(self, request, pk=None):
         """
         Возвращает детальную информацию о форуме по его ID.
         """
@@ -73,6 +113,31 @@ class ForumViewSet(viewsets.ModelViewSet):
         serializer = self.serializer_class(forum)
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        operation_description="Лента постов форума от новых к старым, страницами по курсору.",
+        responses={
+            200: openapi.Response(
+                description="Страница постов форума (отрывок excerpt вместо текста content).",
+                schema=PostListSerializer(many=True)
+            ),
+            404: openapi.Response(description="Форум не найден."),
+            403: openapi.Response(description="Доступ запрещен.")
+        },
+    )
+    @action(detail=True, methods=['get'])
+    @cache_response('forum.Forum', 'forum.Post')
+    def posts(self, request, pk=None):
+        """
+        Возвращает посты форума, начиная с самых новых.
+        """
+        if not Forum.objects.filter(pk=pk).exists():
+            return Response({"error": "Forum not found"}, status=status.HTTP_404_NOT_FOUND)
+        paginator = ForumPostsPagination()
+        posts = self.get_sparse_queryset(Post.objects.filter(forum_id=pk), paginator)
+        page = paginator.paginate_queryset(posts, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @swagger_auto_schema(
         operation_description="Удаление форума по ID.",
         responses={
@@ -94,7 +159,7 @@ class ForumViewSet(viewsets.ModelViewSet):
             return Response({"error": "Forum not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(FastSerializationMixin, SparseQuerysetMixin, TimingMixin, viewsets.ModelViewSet):
     """
     ViewSet для управления постами.
     Позволяет создавать, читать, обновлять и удалять записи о постах.
@@ -102,6 +167,8 @@ class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'write'
+    pagination_class = PostKeysetPagination
 
     @swagger_auto_schema(
         operation_description="Получение списка всех постов или поиск поста по ID.",
@@ -111,12 +178,30 @@ class PostViewSet(viewsets.ModelViewSet):
                 openapi.IN_QUERY,
                 description="ID поста для фильтрации (опционально).",
                 type=openapi.TYPE_INTEGER
+            ),
+            openapi.Parameter(
+                'ordering',
+                openapi.IN_QUERY,
+                description="Сортировка ленты: -created_at (по умолчанию), created_at, -score, score.",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'fields',
+                openapi.IN_QUERY,
+                description="Поля ответа через запятую (опционально), например id,title,created_at.",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'include',
+                openapi.IN_QUERY,
+                description="Вложить связанные объекты вместо ID: author, forum (через запятую).",
+                type=openapi.TYPE_STRING
             )
         ],
         responses={
             200: openapi.Response(
-                description="Успешное получение списка постов.",
-                schema=PostSerializer(many=True)
+                description="Успешное получение списка постов (отрывок excerpt вместо текста content).",
+                schema=PostListSerializer(many=True)
             ),
             403: openapi.Response(description="Доступ запрещен.")
         },
@@ -127,8 +212,25 @@ class PostViewSet(viewsets.ModelViewSet):
         """
         pk = self.request.query_params.get('pk')
         if pk:
-            return self.queryset.filter(pk=pk)
-        return self.queryset
+            return self.get_sparse_queryset(self.queryset.filter(pk=pk))
+        return self.get_sparse_queryset(self.queryset)
+
+    def get_serializer_class(self):
+        # В списках вместо текста поста — отрывок, текст отдает карточка
+        if self.action in ('list', 'search'):
+            return PostListSerializer
+        return super().get_serializer_class()
+
+    @conditional_response(collection_validators('forum.Post'))
+    @cache_response('forum.Post')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    # Счетчики оценок меняются без обновления updated_at, поэтому входят в ETag
+    @conditional_response(object_validators(Post, ('score', 'upvotes', 'downvotes')))
+    @cache_response('forum.Post')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     @swagger_auto_schema(
         operation_description="Получение детальной информации о посте по ID.",
@@ -141,8 +243,9 @@ class PostViewSet(viewsets.ModelViewSet):
             403: openapi.Response(description="Доступ запрещен.")
         },
     )
-    @action(detail=True, methods=['get'])
-    def detail(self, request, pk=None):
+    # DRF записывает во view атрибут detail, поэтому метод назван иначе
+    @action(detail=True, methods=['get'], url_path='detail')
+    def detail_info(self, request, pk=None):
         """
         Возвращает детальную информацию о посте по его ID.
         """
@@ -153,6 +256,57 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer = self.serializer_class(post)
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        operation_description="Полнотекстовый поиск постов по заголовку и тексту (BM25).",
+        manual_parameters=[
+            openapi.Parameter(
+                'q',
+                openapi.IN_QUERY,
+                description="Поисковый запрос.",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'forum',
+                openapi.IN_QUERY,
+                description="ID форума для фильтрации (опционально).",
+                type=openapi.TYPE_INTEGER
+            ),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Страница результатов: посты с фрагментом `snippet` (HTML: текст экранирован, совпадения выделены <mark>)."
+            ),
+            400: openapi.Response(description="Пустой запрос или некорректный форум."),
+            403: openapi.Response(description="Доступ запрещен.")
+        },
+    )
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ищет посты через полнотекстовый индекс и отдает их страницами по курсору.
+        """
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({"error": "Query parameter 'q' is required"}, status=status.HTTP_400_BAD_REQUEST)
+        forum_id = request.query_params.get('forum')
+        if forum_id is not None:
+            try:
+                forum_id = int(forum_id)
+            except ValueError:
+                return Response({"error": "Forum must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = SearchPagination()
+        rows = paginator.paginate_search(request, text, forum_id=forum_id)
+        posts = self.get_sparse_queryset(Post.objects.all(), paginator).in_bulk([post_id for post_id, _, _ in rows])
+        results = []
+        for post_id, _, snippet in rows:
+            if post_id in posts:
+                item = self.get_serializer(posts[post_id]).data
+                item['snippet'] = snippet
+                results.append(item)
+        return paginator.get_paginated_response(results)
+
     @swagger_auto_schema(
         operation_description="Удаление поста по ID.",
         responses={
@@ -174,7 +328,7 @@ class PostViewSet(viewsets.ModelViewSet):
             return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
-class RatingViewSet(viewsets.ModelViewSet):
+class RatingViewSet(FastSerializationMixin, SparseQuerysetMixin, TimingMixin, viewsets.ModelViewSet):
     """
     ViewSet для управления рейтингами.
     Позволяет выполнять CRUD-операции над записями рейтингов.
@@ -182,6 +336,8 @@ class RatingViewSet(viewsets.ModelViewSet):
     queryset = Rating.objects.all()
     serializer_class = RatingSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'write'
+    pagination_class = IdKeysetPagination
 
     @swagger_auto_schema(
         operation_description="Получение списка всех рейтингов или поиск рейтинга по ID.",
@@ -191,6 +347,18 @@ class RatingViewSet(viewsets.ModelViewSet):
                 openapi.IN_QUERY,
                 description="ID рейтинга для фильтрации (опционально).",
                 type=openapi.TYPE_INTEGER
+            ),
+            openapi.Parameter(
+                'fields',
+                openapi.IN_QUERY,
+                description="Поля ответа через запятую (опционально), например id,score.",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'include',
+                openapi.IN_QUERY,
+                description="Вложить связанные объекты вместо ID: user, post (через запятую).",
+                type=openapi.TYPE_STRING
             )
         ],
         responses={
@@ -207,8 +375,8 @@ class RatingViewSet(viewsets.ModelViewSet):
         """
         pk = self.request.query_params.get('pk')
         if pk:
-            return self.queryset.filter(pk=pk)
-        return self.queryset
+            return self.get_sparse_queryset(self.queryset.filter(pk=pk))
+        return self.get_sparse_queryset(self.queryset)
 
     @swagger_auto_schema(
         operation_description="Получение детальной информации о рейтинге по ID.",
@@ -221,8 +389,9 @@ class RatingViewSet(viewsets.ModelViewSet):
             403: openapi.Response(description="Доступ запрещен."),
         },
     )
-    @action(detail=True, methods=['get'])
-    def detail(self, request, pk=None):
+    # DRF записывает во view атрибут detail, поэтому метод назван иначе
+    @action(detail=True, methods=['get'], url_path='detail')
+    def detail_info(self, request, pk=None):
         """
         Возвращает детальную информацию о рейтинге по его ID.
         """
@@ -254,7 +423,7 @@ class RatingViewSet(viewsets.ModelViewSet):
             return Response({"error": "Rating not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
-class UserDetailView(generics.RetrieveUpdateAPIView):
+class UserDetailView(TimingMixin, generics.RetrieveUpdateAPIView):
     """
     Представление для получения и обновления данных текущего пользователя.
     """
@@ -303,7 +472,7 @@ class UserDetailView(generics.RetrieveUpdateAPIView):
         return self.request.user
 
 
-class LoginView(APIView):
+class LoginView(TimingMixin, APIView):
     """
     Представление для аутентификации пользователя.
     """
@@ -359,7 +528,8 @@ class LoginView(APIView):
         username = request.data.get("username")
         password = request.data.get("password")
 
-        user = authenticate(username=username, password=password)
+        # PBKDF2 считается в пуле процессов forum.hashing
+        user = authenticate_user(username, password)
 
         if user is not None:
             login(request, user)
@@ -368,7 +538,19 @@ class LoginView(APIView):
             return Response({"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class LogoutView(APIView):
+class TokenObtainView(TimingMixin, jwt_views.TokenObtainPairView):
+    """
+    Выдает пару JWT (access и refresh) по имени пользователя и паролю.
+    """
+
+
+class TokenRefreshView(TimingMixin, jwt_views.TokenRefreshView):
+    """
+    Выдает новый access-токен по refresh-токену.
+    """
+
+
+class LogoutView(TimingMixin, APIView):
     """
     Представление для выхода пользователя из системы.
     """
@@ -399,11 +581,12 @@ class LogoutView(APIView):
         return Response({"message": "Logged out successfully"}, status=status.HTTP_200_OK)
 
 
-class RegisterView(APIView):
+class RegisterView(TimingMixin, APIView):
     """
     Представление для регистрации нового пользователя.
     """
     permission_classes = [AllowAny]
+    throttle_scope = 'register'
 
     @swagger_auto_schema(
         operation_description="Регистрация нового пользователя.",
@@ -471,17 +654,18 @@ class RegisterView(APIView):
         if User.objects.filter(username=username).exists():
             return Response({"error": "Username already exists"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Создание пользователя с хешированием пароля
-        user = User.objects.create_user(username=username, email=email, password=password, bio=bio)
+        # Создание пользователя с хешированием пароля в пуле процессов
+        create_user(username, email, password, bio=bio)
 
         return Response({"message": "User created successfully"}, status=status.HTTP_201_CREATED)
 
 
-class RatingUpdateView(APIView):
+class RatingUpdateView(TimingMixin, APIView):
     """
     Представление для обновления рейтинга поста.
     """
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'vote'
 
     @swagger_auto_schema(
         operation_description="Обновление рейтинга для поста (положительная или отрицательная оценка).",
@@ -494,7 +678,7 @@ class RatingUpdateView(APIView):
                 ),
                 'score': openapi.Schema(
                     type=openapi.TYPE_INTEGER,
-                    description="Оценка: +1 или -1."
+                    description="Оценка: +1, -1 или 0 (снять голос)."
                 ),
             },
             required=['post_id', 'score']
@@ -508,10 +692,15 @@ class RatingUpdateView(APIView):
                         "message": openapi.Schema(
                             type=openapi.TYPE_STRING,
                             description="Сообщение об успешном обновлении рейтинга."
+                        ),
+                        "post_score": openapi.Schema(
+                            type=openapi.TYPE_INTEGER,
+                            description="Итоговая оценка поста."
                         )
                     }
                 )
             ),
+            400: openapi.Response(description="post_id не целое число или оценка вне допустимых значений."),
             404: openapi.Response(
                 description="Пост не найден.",
                 schema=openapi.Schema(
@@ -529,45 +718,140 @@ class RatingUpdateView(APIView):
     def post(self, request, *args, **kwargs):
         """
         Обновляет или создает рейтинг для указанного поста.
+
+        Голос записывается одним upsert-запросом, в агрегаты поста и рейтинг
+        автора переносится только разница между новой и прежней оценкой.
         """
-        post_id = request.data.get('post_id')
-        score = request.data.get('score')  # Ожидаем значение +1 или -1
+        try:
+            post_id = parse_post_id(request.data.get('post_id'))
+        except InvalidPostId:
+            return Response({"error": "post_id must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            score = parse_score(request.data.get('score'))  # Ожидаем значение -1, 0 или +1
+        except InvalidScore:
+            return Response({"error": "Score must be one of -1, 0, 1"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Находим пост
         try:
-            post = Post.objects.get(id=post_id)
+            _, post_score = cast_vote(request.user.id, post_id, score)
         except Post.DoesNotExist:
             return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Проверяем, есть ли уже оценка для этого пользователя
-        rating, created = Rating.objects.get_or_create(user=request.user, post=post)
-        
-        if not created:
-            rating.score = score  # Если оценка существует, просто обновляем
-            rating.save()
-        else:
-            rating.score = score
-            rating.save()
+        return Response({"message": "Rating updated successfully", "post_score": post_score}, status=status.HTTP_200_OK)
+
+
+class RatingBatchView(TimingMixin, APIView):
+    """
+    Представление для пакетного голосования за несколько постов.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'vote'
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Пакетное обновление оценок постов в одной транзакции. "
+            "Результат возвращается для каждого элемента в порядке запроса."
+        ),
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'votes': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    description="Список оценок (не больше FORUM_VOTE_BATCH_LIMIT).",
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            'post_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                            'score': openapi.Schema(type=openapi.TYPE_INTEGER, description="-1, 0 или +1."),
+                        },
+                        required=['post_id', 'score']
+                    )
+                ),
+            },
+            required=['votes']
+        ),
+        responses={
+            200: openapi.Response(
+                description="Результаты по каждому элементу: status = ok, invalid, not_found или duplicate.",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "results": openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(
+                                type=openapi.TYPE_OBJECT,
+                                properties={
+                                    'post_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                    'status': openapi.Schema(type=openapi.TYPE_STRING),
+                                    'score': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                    'previous_score': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                }
+                            )
+                        )
+                    }
+                )
+            ),
+            400: openapi.Response(description="Тело запроса не содержит список оценок или он слишком длинный."),
+        },
+    )
+    def post(self, request, *args, **kwargs):
+        """
+        Применяет пачку оценок текущего пользователя.
+        """
+        items = request.data.get('votes')
+        limit = getattr(settings, 'FORUM_VOTE_BATCH_LIMIT', 500)
+        if not isinstance(items, list):
+            return Response({"error": "Field 'votes' must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > limit:
+            return Response({"error": f"At most {limit} votes per batch"}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        votes = {}
+        for item in items:
+            post_id = item.get('post_id') if isinstance(item, dict) else None
+            result = {"post_id": post_id}
+            results.append(result)
+            try:
+                post_id = parse_post_id(post_id)
+                score = parse_score(item.get('score'))
+            except (InvalidPostId, InvalidScore):
+                result.update(status="invalid", error="Expected integer post_id and score in -1, 0, 1")
+                continue
+            if post_id in votes:
+                result.update(status="duplicate", error="Post already voted in this batch")
+                continue
+            result["post_id"] = post_id
+            votes[post_id] = score
 
-        return Response({"message": "Rating updated successfully"}, status=status.HTTP_200_OK)
+        previous = cast_votes(request.user.id, votes) if votes else {}
 
+        for result in results:
+            if "status" in result:
+                continue
+            post_id = result["post_id"]
+            if post_id in previous:
+                result.update(status="ok", score=votes[post_id], previous_score=previous[post_id])
+            else:
+                result.update(status="not_found", error="Post not found")
 
-class GlobalRatingCreateUpdateView(APIView):
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+class GlobalRatingCreateUpdateView(TimingMixin, APIView):
     """
     Представление для управления глобальным рейтингом пользователя.
     """
     permission_classes = [IsAuthenticated]
 
+    @cache_response('forum.GlobalRating')
     def get(self, request, pk, *args, **kwargs):
         """
         Получение глобального рейтинга пользователя по идентификатору.
         """
-        try:
-            global_rating = GlobalRating.objects.get(user__pk=pk)
-        except GlobalRating.DoesNotExist:
+        rating = read_global_rating(pk)
+        if rating is None:
             raise NotFound(detail="Global rating not found for this user.")
 
-        serializer = GlobalRatingSerializer(global_rating)
+        serializer = GlobalRatingSerializer(GlobalRating(user_id=pk, rating=rating))
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def post(self, request, pk, *args, **kwargs):
@@ -599,8 +883,8 @@ class GlobalRatingCreateUpdateView(APIView):
 
         new_rating = request.data.get('rating')
         if new_rating is not None:
-            global_rating.rating = new_rating
-            global_rating.save()
+            reset_global_rating(pk, new_rating)
+            global_rating.refresh_from_db()
 
         serializer = GlobalRatingSerializer(global_rating)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -614,5 +898,159 @@ class GlobalRatingCreateUpdateView(APIView):
         except GlobalRating.DoesNotExist:
             raise NotFound(detail="Global rating not found for this user.")
 
+        reset_global_rating(pk, 0)
         global_rating.delete()
         return Response({"message": "Global rating deleted"}, status=status.HTTP_204_NO_CONTENT)
+
+
+class LeaderboardView(TimingMixin, APIView):
+    """
+    Представление таблицы лидеров по глобальному рейтингу.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Топ пользователей по глобальному рейтингу. С параметром `around` "
+            "возвращает место пользователя и `limit` соседей выше и ниже."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'limit',
+                openapi.IN_QUERY,
+                description="Размер топа или число соседей (по умолчанию 10).",
+                type=openapi.TYPE_INTEGER
+            ),
+            openapi.Parameter(
+                'around',
+                openapi.IN_QUERY,
+                description="ID пользователя, вокруг которого строится выборка (опционально).",
+                type=openapi.TYPE_INTEGER
+            ),
+        ],
+        responses={
+            200: openapi.Response(description="Места, пользователи и рейтинги."),
+            400: openapi.Response(description="Некорректные параметры."),
+            404: openapi.Response(description="У пользователя нет глобального рейтинга."),
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        """
+        Возвращает топ-K или окрестность пользователя в таблице лидеров.
+        """
+        try:
+            limit, around = self.parse_params(request)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = {}
+        if around is None:
+            entries = leaderboard.top(limit)
+        else:
+            rank, entries = leaderboard.around(around, limit)
+            if rank is None:
+                raise NotFound(detail="Global rating not found for this user.")
+            data["rank"] = rank
+
+        usernames = dict(User.objects.filter(pk__in=[user_id for _, user_id, _ in entries]).values_list('pk', 'username'))
+        data["results"] = self.results(entries, usernames)
+        return Response(data, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def parse_params(request):
+        """
+        (limit, around) из параметров запроса; ValueError с текстом ошибки.
+        """
+        max_limit = getattr(settings, 'FORUM_LEADERBOARD_MAX_LIMIT', 100)
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), max_limit)
+            around = request.query_params.get('around')
+            around = int(around) if around is not None else None
+        except ValueError:
+            raise ValueError("limit and around must be integers")
+        if limit < 0:
+            raise ValueError("limit must be positive")
+        return limit, around
+
+    @staticmethod
+    def results(entries, usernames):
+        return [
+            {"rank": rank, "user": user_id, "username": usernames.get(user_id), "rating": rating}
+            for rank, user_id, rating in entries
+        ]
+
+
+class CacheStatsView(TimingMixin, APIView):
+    """
+    Представление статистики кеша ответов текущего процесса.
+    """
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description="Счетчики попаданий и промахов кеша ответов (только для персонала).",
+        responses={
+            200: openapi.Response(description="Счетчики local_hit, shared_hit, coalesced, miss и доля попаданий."),
+            403: openapi.Response(description="Доступ запрещен."),
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        """
+        Возвращает счетчики кеша ответов.
+        """
+        return Response(response_cache.stats.snapshot(), status=status.HTTP_200_OK)
+
+
+class ExportView(TimingMixin, APIView):
+    """
+    Представление потоковой выгрузки постов, оценок и глобальных рейтингов.
+    """
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Полная или инкрементальная выгрузка (`posts`, `ratings`, `global-ratings`) "
+            "в NDJSON или CSV, только для персонала. Ответ отдается потоком; при "
+            "`Accept-Encoding: gzip` — сжатым."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'since',
+                openapi.IN_QUERY,
+                description="Для постов и оценок — updated_at (ISO 8601), для глобальных рейтингов — id последней выгруженной строки.",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'since_id',
+                openapi.IN_QUERY,
+                description="Для постов и оценок: id последней строки с updated_at, равным since.",
+                type=openapi.TYPE_INTEGER
+            ),
+        ],
+        responses={
+            200: openapi.Response(description="Строки выгрузки."),
+            400: openapi.Response(description="Некорректные параметры."),
+            403: openapi.Response(description="Доступ запрещен."),
+        },
+    )
+    def get(self, request, name, fmt, *args, **kwargs):
+        """
+        Отдает выгрузку name в формате fmt.
+        """
+        gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        try:
+            blocks = stream_export(
+                name,
+                fmt,
+                since=request.query_params.get('since'),
+                since_id=request.query_params.get('since_id'),
+                gzip=gzip,
+            )
+        except InvalidExport as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(blocks, content_type=FORMATS[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+        if gzip:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
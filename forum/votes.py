@@ -0,0 +1,183 @@
+"""
+Быстрый путь голосования: фиксированное число запросов на голос.
+
+1. INSERT ... ON CONFLICT (user_id, post_id) DO UPDATE ... RETURNING
+   записывает оценку и возвращает предыдущую;
+2. UPDATE поста прибавляет разницу к агрегатам, сдвигает updated_at
+   и возвращает автора;
+3. UPDATE случайного шарда глобального рейтинга автора.
+
+Пакетный вариант cast_votes делает то же для многих постов: один
+многострочный upsert, по одному UPDATE на пост и по одному начислению
+на автора.
+
+Сигналы Rating здесь не срабатывают: разница применяется явно. updated_at
+оценки и поста сдвигается, только если оценка изменилась: по нему идут
+инкрементальная выгрузка и Last-Modified.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .counters import increment_global_rating
+from .models import Post, Rating
+from .response_cache import bump_versions
+
+VALID_SCORES = (-1, 0, 1)
+
+
+class InvalidScore(ValueError):
+    pass
+
+
+class InvalidPostId(ValueError):
+    pass
+
+
+def parse_post_id(value):
+    """
+    Приводит идентификатор поста из запроса к int или бросает InvalidPostId.
+    Принимаются целые числа и строки из цифр: int() молча превратил бы
+    1.9 и true в 1, и голос достался бы другому посту.
+    """
+    if isinstance(value, bool):
+        raise InvalidPostId(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        return int(value)
+    raise InvalidPostId(value)
+
+
+def parse_score(value):
+    """
+    Приводит оценку из запроса к int из VALID_SCORES или бросает InvalidScore.
+    """
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise InvalidScore(value)
+    try:
+        score = int(value)
+    except (TypeError, ValueError):
+        raise InvalidScore(value)
+    if score not in VALID_SCORES:
+        raise InvalidScore(value)
+    return score
+
+
+# Строк в одном многострочном upsert: 4 параметра на строку укладываются
+# в ограничение SQLite на число параметров запроса
+UPSERT_CHUNK_SIZE = 240
+
+
+def _now():
+    return connection.ops.adapt_datetimefield_value(timezone.now())
+
+
+def _upsert_sql(rows=1):
+    qn = connection.ops.quote_name
+    table = qn(Rating._meta.db_table)
+    values = ", ".join(["(%s, %s, %s, 0, %s)"] * rows)
+    updated_at = qn('updated_at')
+    return (
+        f"INSERT INTO {table} ({qn('user_id')}, {qn('post_id')}, {qn('score')}, {qn('previous_score')}, {updated_at}) "
+        f"VALUES {values} "
+        f"ON CONFLICT ({qn('user_id')}, {qn('post_id')}) DO UPDATE SET "
+        f"{qn('previous_score')} = {table}.{qn('score')}, {qn('score')} = EXCLUDED.{qn('score')}, "
+        f"{updated_at} = CASE WHEN {table}.{qn('score')} = EXCLUDED.{qn('score')} "
+        f"THEN {table}.{updated_at} ELSE EXCLUDED.{updated_at} END "
+        f"RETURNING {qn('post_id')}, {qn('previous_score')}"
+    )
+
+
+def _post_update_sql(returning=True, touch=True):
+    qn = connection.ops.quote_name
+    # Без touch UPDATE лишь проверяет, что пост есть (оценка не изменилась)
+    updated_at = f"{qn('updated_at')} = %s, " if touch else ""
+    sql = (
+        f"UPDATE {qn(Post._meta.db_table)} SET {updated_at}"
+        f"{qn('score')} = {qn('score')} + %s, "
+        f"{qn('upvotes')} = {qn('upvotes')} + %s, "
+        f"{qn('downvotes')} = {qn('downvotes')} + %s "
+        f"WHERE {qn('id')} = %s"
+    )
+    if returning:
+        sql += f" RETURNING {qn('author_id')}, {qn('score')}"
+    return sql
+
+
+def score_deltas(old_score, new_score):
+    """
+    Изменения (score, upvotes, downvotes) поста при смене оценки.
+    """
+    return (
+        new_score - old_score,
+        (new_score > 0) - (old_score > 0),
+        (new_score < 0) - (old_score < 0),
+    )
+
+
+def cast_vote(user_id, post_id, score):
+    """
+    Записывает оценку пользователя посту и переносит разницу в агрегаты поста
+    и глобальный рейтинг автора. Возвращает (старая оценка, новый счет поста).
+
+    Бросает Post.DoesNotExist, если поста нет; транзакция при этом откатывается.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            now = _now()
+            cursor.execute(_upsert_sql(), [user_id, post_id, score, now])
+            _, old_score = cursor.fetchone()
+
+            # UPDATE поста выполняется и при нулевой разнице: отсутствие строки
+            # означает, что поста нет (внешний ключ оценки проверится лишь при коммите)
+            touch = old_score != score
+            params = [now] if touch else []
+            cursor.execute(_post_update_sql(touch=touch), [*params, *score_deltas(old_score, score), post_id])
+            row = cursor.fetchone()
+            if row is None:
+                raise Post.DoesNotExist(f"Post {post_id} not found")
+            author_id, post_score = row
+
+        increment_global_rating(author_id, score - old_score)
+        bump_versions(Rating._meta.label, Post._meta.label)
+    return old_score, post_score
+
+
+def cast_votes(user_id, votes):
+    """
+    Записывает пачку оценок пользователя в одной транзакции.
+
+    votes — словарь {post_id: score} с уже проверенными оценками. Возвращает
+    словарь {post_id: прежняя оценка} для существующих постов; отсутствующих
+    постов в нем нет.
+    """
+    with transaction.atomic():
+        authors = dict(Post.objects.filter(pk__in=votes).values_list('id', 'author_id'))
+        pending = [(post_id, votes[post_id]) for post_id in authors]
+
+        previous = {}
+        now = _now()
+        with connection.cursor() as cursor:
+            for start in range(0, len(pending), UPSERT_CHUNK_SIZE):
+                chunk = pending[start:start + UPSERT_CHUNK_SIZE]
+                params = [value for post_id, score in chunk for value in (user_id, post_id, score, now)]
+                cursor.execute(_upsert_sql(len(chunk)), params)
+                previous.update(cursor.fetchall())
+
+            changed = [(post_id, score) for post_id, score in pending if previous[post_id] != score]
+            if changed:
+                cursor.executemany(
+                    _post_update_sql(returning=False),
+                    [(now, *score_deltas(previous[post_id], score), post_id) for post_id, score in changed],
+                )
+
+        author_deltas = defaultdict(int)
+        for post_id, score in changed:
+            author_deltas[authors[post_id]] += score - previous[post_id]
+        for author_id, delta in author_deltas.items():
+            increment_global_rating(author_id, delta)
+        if pending:
+            bump_versions(Rating._meta.label, Post._meta.label)
+    return previous
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mainapp.settings')
+# Асинхронные читающие эндпоинты (mainapp.asgi_urls)
+os.environ.setdefault('FORUM_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
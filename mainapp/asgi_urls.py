@@ -0,0 +1,15 @@
+"""
+Маршруты для развертывания под ASGI: читающие эндпоинты форума обслуживают
+асинхронные представления (forum.async_views), остальные маршруты те же,
+что в mainapp.urls.
+"""
+from django.urls import include, path
+
+from forum.urls import async_urlpatterns
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/', include(async_urlpatterns)),
+    *sync_urlpatterns,
+]
@@ -0,0 +1,361 @@
+"""
+Метрики в формате Prometheus, общие для всех рабочих процессов.
+
+Каждый процесс копит счетчики и гистограммы в памяти и раз в
+METRICS_FLUSH_INTERVAL секунд (и при чтении /metrics) атомарно переписывает
+свой файл <pid>-<метка>.json в METRICS_DIR. Эндпоинт /metrics суммирует
+файлы всех процессов: счетчики и гистограммы — включая завершившиеся
+процессы (счетчики Prometheus не должны уменьшаться), датчики (in-flight,
+register_gauge) — только живых. Процесс, полученный fork'ом, начинает с
+пустых значений.
+
+Каталог METRICS_DIR стоит очищать при развертывании, иначе счетчики
+продолжатся с прошлого запуска.
+
+/metrics отдается только с заголовком Authorization: Bearer <METRICS_TOKEN>
+(так ходит Prometheus, bearer_token в scrape_config) или персоналу в сессии
+админки: задержки, статусы и нагрузка по маршрутам не для анонимных клиентов.
+Без METRICS_TOKEN эндпоинт доступен только персоналу.
+"""
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .query_hooks import query_hook
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# имя: (тип, описание, границы корзин гистограммы)
+METRICS = {
+    'forum_http_requests_total': ('counter', 'HTTP requests by route, method and status.', None),
+    'forum_http_request_duration_seconds': ('histogram', 'Request latency by route.', LATENCY_BUCKETS),
+    'forum_http_requests_in_flight': ('gauge', 'Requests being processed right now.', None),
+    'forum_db_queries_per_request': ('histogram', 'SQL queries per request by route.', QUERY_BUCKETS),
+    'forum_db_duration_seconds': ('histogram', 'Total SQL time per request by route.', LATENCY_BUCKETS),
+}
+
+# Функции, возвращающие значения счетчиков процесса: {(имя, метки): значение}
+_collectors = []
+# Датчики процесса: имя -> функция, возвращающая текущее значение
+_gauges = {}
+# Датчики, вычисляемые по суммарным счетчикам: имя -> (описание, функция)
+_derived = {}
+
+
+def register_collector(collector, metrics=()):
+    """
+    Добавляет источник счетчиков процесса (например, статистику кеша).
+    metrics — описания его счетчиков: [(имя, описание), ...].
+    """
+    for name, description in metrics:
+        METRICS[name] = ('counter', description, None)
+    _collectors.append(collector)
+
+
+def register_metric(name, kind, description, buckets=None):
+    """
+    Описывает счетчик (kind='counter') или гистограмму (kind='histogram'),
+    которые приложение пишет через store.inc и store.observe.
+    """
+    METRICS[name] = (kind, description, buckets)
+
+
+def register_gauge(name, description, collect):
+    """
+    Добавляет датчик процесса: collect() возвращает его текущее значение.
+    В /metrics значения живых процессов суммируются.
+    """
+    METRICS[name] = ('gauge', description, None)
+    _gauges[name] = collect
+
+
+def register_derived(name, description, compute):
+    """
+    Добавляет датчик, вычисляемый compute(counters) по счетчикам всех
+    процессов; counters — {(имя, метки): значение}.
+    """
+    _derived[name] = (description, compute)
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Store:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_process(self):
+        # После fork значения родителя остаются в его файле: начинаем с нуля
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._reset()
+            self._pid = os.getpid()
+            threading.Thread(target=self._flush_periodically, name='metrics-flush', daemon=True).start()
+
+    def _reset(self):
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._in_flight = 0
+        self._dirty = False
+        self._filename = f'{os.getpid()}-{time.time_ns()}.json'
+
+    def reset(self):
+        """
+        Обнуляет значения текущего процесса и удаляет его файл.
+        """
+        self._ensure_process()
+        with self._lock:
+            path = os.path.join(directory(), self._filename)
+            self._reset()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def inc(self, name, labels, value=1):
+        self._ensure_process()
+        with self._lock:
+            self._counters[(name, _labels_key(labels))] += value
+            self._dirty = True
+
+    def observe(self, name, labels, value):
+        self._ensure_process()
+        buckets = METRICS[name][2]
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+            index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+            self._dirty = True
+
+    def track_in_flight(self, delta):
+        self._ensure_process()
+        with self._lock:
+            self._in_flight += delta
+            self._dirty = True
+
+    def _flush_periodically(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0))
+            if self._dirty:
+                self.flush()
+
+    def flush(self):
+        """
+        Атомарно записывает значения процесса в его файл.
+        """
+        self._ensure_process()
+        collected = {}
+        for collector in _collectors:
+            collected.update(collector())
+        gauges = {name: collect() for name, collect in _gauges.items()}
+        with self._lock:
+            counters = dict(self._counters)
+            counters.update(collected)
+            state = {
+                'pid': self._pid,
+                'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+                'histograms': [[name, list(labels), histogram] for (name, labels), histogram in self._histograms.items()],
+                'in_flight': self._in_flight,
+                'gauges': gauges,
+            }
+            self._dirty = False
+            path = os.path.join(directory(), self._filename)
+        os.makedirs(directory(), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory(), suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as output:
+            json.dump(state, output)
+        os.replace(temporary, path)
+
+
+store = Store()
+
+
+def directory():
+    return getattr(settings, 'METRICS_DIR', None) or os.path.join(tempfile.gettempdir(), 'forum-metrics')
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def aggregate():
+    """
+    Суммирует файлы всех процессов: (счетчики, гистограммы, датчики).
+    """
+    store.flush()
+    counters = defaultdict(float)
+    histograms = {}
+    gauges = defaultdict(float)
+    for filename in os.listdir(directory()):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory(), filename)) as source:
+                state = json.load(source)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in state['counters']:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, histogram in state['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, {'buckets': [0] * len(histogram['buckets']), 'sum': 0.0, 'count': 0})
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+            total['sum'] += histogram['sum']
+            total['count'] += histogram['count']
+        if _is_alive(state['pid']):
+            gauges['forum_http_requests_in_flight'] += state['in_flight']
+            for name, value in state.get('gauges', {}).items():
+                gauges[name] += value
+    return counters, histograms, gauges
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render():
+    counters, histograms, gauges = aggregate()
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'gauge':
+            lines.append(f'{name} {_number(gauges[name])}')
+        elif kind == 'histogram':
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], histogram['buckets']):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _number(bound)
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_number(histogram["sum"])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+        else:
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {_number(value)}')
+    for name, (description, compute) in _derived.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name} {_number(compute(counters))}')
+    return '\n'.join(lines) + '\n'
+
+
+def authorized(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+            return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+
+def metrics_view(request):
+    if not authorized(request):
+        return HttpResponseForbidden('Metrics require METRICS_TOKEN or a staff session\n', content_type='text/plain')
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MetricsMiddleware:
+    """
+    Считает запросы, задержку, число и время SQL по маршрутам (url_name).
+    Включается METRICS_ENABLED.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        queries = [0, 0.0]
+        store.track_in_flight(1)
+        started = time.perf_counter()
+        status = 500
+        try:
+            with query_hook(self.counter(queries)):
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            self.record(request, status, time.perf_counter() - started, queries)
+
+    async def __acall__(self, request):
+        queries = [0, 0.0]
+        store.track_in_flight(1)
+        started = time.perf_counter()
+        status = 500
+        try:
+            with query_hook(self.counter(queries)):
+                response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            self.record(request, status, time.perf_counter() - started, queries)
+
+    def counter(self, queries):
+        def count_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - started
+        return count_query
+
+    def record(self, request, status, elapsed, queries):
+        store.track_in_flight(-1)
+        match = getattr(request, 'resolver_match', None)
+        route = {'route': (match.url_name if match else None) or 'unmatched'}
+        store.inc('forum_http_requests_total', {**route, 'method': request.method, 'status': str(status)})
+        store.observe('forum_http_request_duration_seconds', route, elapsed)
+        store.observe('forum_db_queries_per_request', route, queries[0])
+        store.observe('forum_db_duration_seconds', route, queries[1])
@@ -0,0 +1,180 @@
+"""
+Выборочное профилирование запросов.
+
+ProfilingMiddleware (включается PROFILING_ENABLED) профилирует долю
+PROFILING_SAMPLE_RATE запросов, а также любой запрос персонала с заголовком
+PROFILING_HEADER. Персонал определяется по сессии или по JWT (Bearer):
+AuthenticationMiddleware видит только сессию, а клиенты API приходят
+с токеном. Профиль записывается в PROFILING_DIR файлом
+
+    <url_name>__<длительность>ms__<время>__<pid>.prof     (cProfile)
+    <url_name>__<длительность>ms__<время>__<pid>.folded   (сэмплирование)
+
+Режим задает PROFILING_MODE: 'cprofile' — точный профиль с заметными
+накладными расходами, 'sample' — снимки стека потока запроса раз в
+PROFILING_SAMPLE_INTERVAL секунд в формате collapsed stacks (flamegraph.pl,
+speedscope). Сводку по маршрутам печатает manage.py profile_report.
+"""
+import cProfile
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import APIException
+
+from forum.authentication import CachedJWTAuthentication
+
+# cProfile в Python 3.12+ допускает один активный профилировщик на процесс
+_cprofile_lock = threading.Lock()
+
+
+def directory():
+    return getattr(settings, 'PROFILING_DIR', None) or os.path.join(tempfile.gettempdir(), 'forum-profiles')
+
+
+def frame_label(code):
+    # Та же запись, что у pstats: файл:строка(функция)
+    return f'{code.co_filename}:{code.co_firstlineno}({code.co_name})'
+
+
+class StackSampler:
+    """
+    Снимает стек потока thread_id из отдельного потока.
+    """
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, 'w') as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f'{stack} {count}\n')
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def should_profile(self, request):
+        header = 'HTTP_' + getattr(settings, 'PROFILING_HEADER', 'X-Profile').upper().replace('-', '_')
+        if header in request.META:
+            return self.is_staff(request)
+        return random.random() < getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+
+    def is_staff(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.is_staff
+        # Токен разбирается тем же аутентификатором, что и в DRF; неверный
+        # токен здесь не ошибка — запрос просто не профилируется
+        try:
+            authenticated = CachedJWTAuthentication().authenticate(request)
+        except APIException:
+            return False
+        return bool(authenticated and authenticated[0].is_staff)
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+        if getattr(settings, 'PROFILING_MODE', 'cprofile') == 'sample':
+            return self.sample(request)
+        return self.profile(request)
+
+    def profile(self, request):
+        if not _cprofile_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            profiler.dump_stats(self.path(request, time.perf_counter() - started, 'prof'))
+        finally:
+            _cprofile_lock.release()
+        return response
+
+    def sample(self, request):
+        sampler = StackSampler(threading.get_ident(), getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.001))
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        sampler.dump(self.path(request, time.perf_counter() - started, 'folded'))
+        return response
+
+    def path(self, request, elapsed, extension):
+        match = getattr(request, 'resolver_match', None)
+        route = (match.url_name if match else None) or 'unmatched'
+        os.makedirs(directory(), exist_ok=True)
+        name = f'{route}__{elapsed * 1000:.0f}ms__{time.time_ns()}__{os.getpid()}.{extension}'
+        return os.path.join(directory(), name)
+
+
+def profile_files(path=None):
+    """
+    Файлы профилей, сгруппированные по маршруту: {url_name: [путь, ...]}.
+    """
+    path = path or directory()
+    routes = {}
+    if not os.path.isdir(path):
+        return routes
+    for filename in sorted(os.listdir(path)):
+        if filename.endswith(('.prof', '.folded')) and '__' in filename:
+            routes.setdefault(filename.split('__', 1)[0], []).append(os.path.join(path, filename))
+    return routes
+
+
+def fold_stacks(paths):
+    """
+    Суммирует collapsed stacks: (снимков всего, собственные снимки функций,
+    снимки с функцией в стеке).
+    """
+    total = 0
+    own = Counter()
+    inclusive = Counter()
+    for path in paths:
+        with open(path) as source:
+            for line in source:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if not stack:
+                    continue
+                count = int(count)
+                frames = stack.split(';')
+                total += count
+                own[frames[-1]] += count
+                for frame in set(frames):
+                    inclusive[frame] += count
+    return total, own, inclusive
@@ -0,0 +1,48 @@
+"""
+Обработчики SQL-запросов текущего HTTP-запроса.
+
+connection.execute_wrapper действует только на соединение текущего потока,
+а асинхронный ORM (aget, async for) выполняет запросы в потоке
+sync_to_async. Поэтому одна общая обертка ставится на каждое соединение при
+открытии, а обработчики запроса хранятся в ContextVar: контекст переносится
+в поток sync_to_async вместе с вызовом.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+_hooks = ContextVar('query_hooks', default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    hooks = _hooks.get()
+    # Первый установленный обработчик — внешний, как у execute_wrapper
+    for hook in reversed(hooks):
+        execute = partial(hook, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+connection_created.connect(install)
+
+
+@contextmanager
+def query_hook(hook):
+    """
+    Вызывает hook(execute, sql, params, many, context) для каждого запроса
+    блока, в том числе выполненного асинхронным ORM в другом потоке.
+    """
+    # Соединение текущего потока могло открыться до импорта модуля
+    install(connection)
+    token = _hooks.set((*_hooks.get(), hook))
+    try:
+        yield
+    finally:
+        _hooks.reset(token)
@@ -0,0 +1,235 @@
+"""
+Замеры запроса для заголовка Server-Timing и строки журнала.
+
+ServerTimingMiddleware (включается SERVER_TIMING_ENABLED) считает SQL-запросы
+через mainapp.query_hooks и время этапов:
+
+    total      — весь запрос внутри middleware;
+    db         — сумма времени SQL-запросов;
+    view       — от вызова представления до готового ответа;
+    auth       — аутентификация, права и ограничения DRF (TimingMixin);
+    serialize  — сериализаторы (TimedSerializerMixin);
+    render     — рендеринг ответа DRF.
+
+Этапы вложены друг в друга (db входит в view, auth и serialize), поэтому
+в сумме дают больше total. Запросы одной формы (SQL без чисел и с
+схлопнутыми списками IN), выполненные больше
+SERVER_TIMING_N_PLUS_ONE_THRESHOLD раз, попадают в журнал как вероятный N+1.
+"""
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .query_hooks import query_hook
+
+logger = logging.getLogger(__name__)
+
+_recorder = ContextVar('server_timing_recorder', default=None)
+
+_IN_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_SPACE_RE = re.compile(r'\s+')
+
+# Порядок метрик в заголовке
+METRICS = ('total', 'db', 'auth', 'view', 'serialize', 'render')
+
+
+def sql_shape(sql):
+    """
+    Форма запроса: одинакова у запросов, различающихся только параметрами.
+    """
+    shape = _IN_LIST_RE.sub('(...)', sql)
+    shape = _NUMBER_RE.sub('?', shape)
+    return _SPACE_RE.sub(' ', shape).strip()
+
+
+class Recorder:
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.depth = defaultdict(int)
+        self.queries = 0
+        self.shapes = defaultdict(lambda: [0, 0.0])
+        self.view_started = None
+        self.view_finished = None
+
+    def enter(self, name):
+        self.depth[name] += 1
+        return time.perf_counter()
+
+    def exit(self, name, started):
+        self.depth[name] -= 1
+        # Вложенные замеры одного этапа (например, вложенные сериализаторы)
+        # учитываются только на внешнем уровне
+        if not self.depth[name]:
+            self.durations[name] += time.perf_counter() - started
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.durations['db'] += elapsed
+            stats = self.shapes[sql_shape(sql)]
+            stats[0] += 1
+            stats[1] += elapsed
+
+    def finish_view(self, *args):
+        if self.view_started is not None and self.view_finished is None:
+            self.view_finished = time.perf_counter()
+            self.durations['view'] = self.view_finished - self.view_started
+
+    def finish_render(self, response):
+        if self.view_finished is not None:
+            self.durations['render'] = time.perf_counter() - self.view_finished
+
+    def repeated(self, threshold):
+        return [
+            {'sql': shape[:200], 'count': count, 'ms': round(elapsed * 1000, 3)}
+            for shape, (count, elapsed) in self.shapes.items()
+            if count > threshold
+        ]
+
+    def header(self, repeated):
+        parts = []
+        for name in METRICS:
+            if name not in self.durations:
+                continue
+            part = f'{name};dur={self.durations[name] * 1000:.3f}'
+            if name == 'db':
+                part += f';desc="{self.queries} queries"'
+            parts.append(part)
+        if repeated:
+            parts.append(f'n-plus-one;desc="{len(repeated)} repeated queries"')
+        return ', '.join(parts)
+
+
+class span:
+    """
+    Контекстный менеджер: добавляет время блока к этапу name текущего
+    запроса. Вне запроса (или при выключенном middleware) ничего не делает.
+    """
+    __slots__ = ('name', 'recorder', 'started')
+
+    def __init__(self, name):
+        self.name = name
+        self.recorder = _recorder.get()
+
+    def __enter__(self):
+        if self.recorder is not None:
+            self.started = self.recorder.enter(self.name)
+
+    def __exit__(self, *exc_info):
+        if self.recorder is not None:
+            self.recorder.exit(self.name, self.started)
+
+
+class TimingMixin:
+    """
+    Примесь к представлениям DRF: время initial() — аутентификации,
+    проверки прав и ограничений частоты.
+    """
+    def initial(self, request, *args, **kwargs):
+        with span('auth'):
+            super().initial(request, *args, **kwargs)
+
+
+class TimedSerializerMixin:
+    """
+    Примесь к сериализаторам: время to_representation.
+    """
+    def to_representation(self, instance):
+        with span('serialize'):
+            return super().to_representation(instance)
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SERVER_TIMING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Иначе Django вызывал бы синхронные process_* через поток
+            self.process_view = self._aprocess_view
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = Recorder()
+        token = _recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            with query_hook(recorder.execute):
+                response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self.finish(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = Recorder()
+        token = _recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            with query_hook(recorder.execute):
+                response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self.finish(request, response, recorder, started)
+
+    def finish(self, request, response, recorder, started):
+        recorder.finish_view()
+        recorder.durations['total'] = time.perf_counter() - started
+
+        repeated = recorder.repeated(getattr(settings, 'SERVER_TIMING_N_PLUS_ONE_THRESHOLD', 5))
+        response['Server-Timing'] = recorder.header(repeated)
+        self.log(request, response, recorder, repeated)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        recorder = _recorder.get()
+        if recorder is not None:
+            recorder.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся после выхода из представления
+        recorder = _recorder.get()
+        if recorder is not None:
+            recorder.finish_view()
+            response.add_post_render_callback(recorder.finish_render)
+        return response
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        ServerTimingMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    async def _aprocess_template_response(self, request, response):
+        return ServerTimingMiddleware.process_template_response(self, request, response)
+
+    def log(self, request, response, recorder, repeated):
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.queries,
+        }
+        for name in METRICS:
+            if name in recorder.durations:
+                record[f'{name}_ms'] = round(recorder.durations[name] * 1000, 3)
+        if repeated:
+            record['n_plus_one'] = repeated
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -52,16 +53,24 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
 ]
 MIDDLEWARE = [
+    'mainapp.metrics.MetricsMiddleware',
+    'mainapp.server_timing.ServerTimingMiddleware',
+    'forum.slow_queries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'mainapp.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'mainapp.urls'
+# Под ASGI (mainapp/asgi.py) читающие эндпоинты обслуживают асинхронные
+# представления forum.async_views; FORUM_ASYNC_VIEWS=0 возвращает синхронные
+if os.environ.get('FORUM_ASYNC_VIEWS') == '1':
+    ROOT_URLCONF = 'mainapp.asgi_urls'
 
 TEMPLATES = [
     {
@@ -139,7 +148,127 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'forum.CustomUser'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'forum.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
-}
\ No newline at end of file
+    'DEFAULT_THROTTLE_CLASSES': [
+        'forum.throttling.TokenBucketThrottle',
+    ],
+    # JSON через orjson и MessagePack по Accept (forum.renderers)
+    'DEFAULT_RENDERER_CLASSES': [
+        'forum.renderers.FastJSONRenderer',
+        'forum.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'forum.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# JWT (/api/users/token/) и кеш пользователей для него (forum.authentication)
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+}
+FORUM_AUTH_USER_CACHE_TTL = 60  # 0 выключает кеш
+FORUM_AUTH_USER_CACHE_SIZE = 10000
+
+# Пул процессов для хеширования паролей при входе и регистрации (forum.hashing)
+FORUM_HASHING_WORKERS = 2  # 0 — хешировать в процессе запроса
+FORUM_HASHING_QUEUE_LIMIT = 16  # заданий в очереди и в работе, сверх — 503
+
+# Маркерные корзины для записей по throttle_scope представлений (forum.throttling):
+# rate — скорость пополнения, burst — емкость корзины
+FORUM_THROTTLE_RATES = {
+    'write': {'rate': '60/min', 'burst': 30},
+    'vote': {'rate': '300/min', 'burst': 60},
+    'register': {'rate': '10/hour', 'burst': 5},
+}
+FORUM_THROTTLE_CACHE = 'throttle'
+
+# Оба кеша общие для процессов сервера: версии и общий уровень кеша ответов,
+# блокировки от повторного расчета, версия таблицы лидеров, корзины
+# ограничения частоты (файлы SQLite в каталоге временных файлов,
+# mainapp.shared_cache); для нескольких машин — memcached или Redis.
+# Корзинам — свой кеш: в общем они вытесняли бы кеш ответов
+CACHES = {
+    'default': {
+        'BACKEND': 'mainapp.shared_cache.SQLiteCache',
+        'LOCATION': 'forum-cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'throttle': {
+        'BACKEND': 'mainapp.shared_cache.SQLiteCache',
+        'LOCATION': 'forum-throttle.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Списки и карточки из простых полей — через values_list() без
+# ModelSerializer (forum.fast_serialization)
+FORUM_FAST_SERIALIZATION = True
+
+# Длина отрывка поста в списках вместо полного текста (forum.models.make_excerpt);
+# после изменения старые отрывки пересчитываются при сохранении постов
+FORUM_POST_EXCERPT_LENGTH = 200
+
+# Курсорная пагинация списков (forum.pagination)
+FORUM_PAGE_SIZE = 20
+FORUM_MAX_PAGE_SIZE = 100
+FORUM_COUNT_ESTIMATE_TTL = 300
+
+# Шардированный глобальный рейтинг (forum.counters)
+FORUM_GLOBAL_RATING_SHARDS = 8
+FORUM_GLOBAL_RATING_CACHE_TTL = 60
+
+# Пакетное голосование (POST /api/rating/batch/)
+FORUM_VOTE_BATCH_LIMIT = 500
+
+# Таблица лидеров (forum.leaderboard)
+FORUM_LEADERBOARD_MAX_AGE = 30
+FORUM_LEADERBOARD_MAX_LIMIT = 100
+
+# Полнотекстовый поиск (forum.search): веса BM25 для title и content
+FORUM_SEARCH_WEIGHTS = (10.0, 1.0)
+
+# Кеш ответов читающих эндпоинтов (forum.response_cache)
+FORUM_RESPONSE_CACHE_ENABLED = True
+FORUM_RESPONSE_CACHE_TTL = 60
+FORUM_RESPONSE_CACHE_LOCAL_SIZE = 1000
+FORUM_RESPONSE_CACHE_LOCK_TIMEOUT = 5
+
+# Потоковая выгрузка (forum.exports): строк в одной выборке из базы
+FORUM_EXPORT_CHUNK_SIZE = 2000
+
+# Массовая загрузка (forum.bulk): строк в одной пачке bulk_create
+FORUM_BULK_BATCH_SIZE = 5000
+
+# Заголовок Server-Timing и журнал замеров запросов (mainapp.server_timing).
+# Выключено: заголовок видят все клиенты, включая анонимных. Куда писать
+# журнал mainapp.server_timing, решает LOGGING развертывания
+SERVER_TIMING_ENABLED = False
+SERVER_TIMING_N_PLUS_ONE_THRESHOLD = 5
+
+# Метрики Prometheus (GET /metrics), общие для процессов через файлы в METRICS_DIR
+METRICS_ENABLED = True
+METRICS_DIR = None  # по умолчанию <tmp>/forum-metrics
+METRICS_FLUSH_INTERVAL = 1.0
+# Токен Prometheus для GET /metrics (Authorization: Bearer ...); без него —
+# только персонал
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Выборочное профилирование запросов (mainapp.profiling, manage.py profile_report)
+PROFILING_ENABLED = False
+PROFILING_MODE = 'cprofile'  # или 'sample'
+PROFILING_SAMPLE_RATE = 0.01
+PROFILING_SAMPLE_INTERVAL = 0.001
+PROFILING_HEADER = 'X-Profile'  # профилирует любой запрос персонала с этим заголовком
+PROFILING_DIR = None  # по умолчанию <tmp>/forum-profiles
+
+# Журнал медленных SQL-запросов (forum.slow_queries, /admin/slow-queries/)
+FORUM_SLOW_QUERY_MS = 100  # None выключает журнал
+FORUM_SLOW_QUERY_LOG_SIZE = 200  # различных форм запросов в журнале
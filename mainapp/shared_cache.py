@@ -0,0 +1,141 @@
+"""
+Кеш Django в файле SQLite, общий для рабочих процессов одной машины.
+
+У LocMemCache каждый процесс видит только свои значения: при N процессах
+версии кеша ответов, блокировки и корзины ограничения частоты действуют
+внутри процесса. Этот бэкенд хранит значения в отдельном файле SQLite
+(LOCATION; относительный путь — внутри каталога временных файлов), и все
+процессы видят одно и то же. add(), incr() и touch() — одиночные запросы
+SQLite и атомарны между процессами. Файл не связан с базой приложения, так
+что его блокировка записи не конкурирует с записями форума; журнал WAL
+позволяет читать, не дожидаясь записей.
+
+Целые числа хранятся как есть (их увеличивает incr() в самом SQL), остальные
+значения — через pickle. Истекшие записи удаляются раз в CULL_EVERY
+записей процесса, тогда же число записей ограничивается MAX_ENTRIES.
+
+Для нескольких машин вместо него нужен memcached или Redis.
+"""
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL) WITHOUT ROWID"
+ALIVE = "(expires IS NULL OR expires > ?)"
+UPSERT = (
+    "INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) "
+    "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires"
+)
+# Записей процесса между удалениями истекших значений
+CULL_EVERY = 1000
+
+
+def _encode(value):
+    if type(value) is int:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _decode(value):
+    return value if isinstance(value, int) else pickle.loads(value)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = os.path.join(tempfile.gettempdir(), location or 'forum-cache.sqlite3')
+        timeout = params.get('OPTIONS', {}).get('timeout', 5)
+        self._timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _db(self):
+        # Соединение на поток; процесс после fork открывает свои
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self._timeout, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(SCHEMA)
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def _write(self, sql, params):
+        rowcount = self._db.execute(sql, params).rowcount
+        self._writes += 1
+        if self._writes % CULL_EVERY == 0:
+            self._cull()
+        return rowcount
+
+    def _cull(self):
+        db = self._db
+        db.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+        count = db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            db.execute("DELETE FROM cache")
+            return
+        db.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)",
+            (count // self._cull_frequency,),
+        )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._db.execute(f"SELECT value FROM cache WHERE key = ? AND {ALIVE}", (key, time.time())).fetchone()
+        return default if row is None else _decode(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not keys:
+            return {}
+        rows = self._db.execute(
+            f"SELECT key, value FROM cache WHERE key IN ({', '.join('?' * len(keys))}) AND {ALIVE}",
+            (*keys, time.time()),
+        )
+        return {keys[key]: _decode(value) for key, value in rows}
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._db.execute(f"SELECT 1 FROM cache WHERE key = ? AND {ALIVE}", (key, time.time())).fetchone() is not None
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write(UPSERT, (key, _encode(value), self.get_backend_timeout(timeout)))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        # Существующая запись заменяется, только если она истекла
+        sql = f"{UPSERT} WHERE cache.expires IS NOT NULL AND cache.expires <= ?"
+        return self._write(sql, (key, _encode(value), self.get_backend_timeout(timeout), time.time())) == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        sql = f"UPDATE cache SET expires = ? WHERE key = ? AND {ALIVE}"
+        return self._write(sql, (self.get_backend_timeout(timeout), key, time.time())) == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        # fetchall() доводит запрос до конца: иначе транзакция записи осталась бы открытой
+        rows = self._db.execute(
+            f"UPDATE cache SET value = value + ? WHERE key = ? AND typeof(value) = 'integer' AND {ALIVE} RETURNING value",
+            (delta, key, time.time()),
+        ).fetchall()
+        if not rows:
+            raise ValueError(f"Key '{key}' not found")
+        return rows[0][0]
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._write("DELETE FROM cache WHERE key = ?", (key,)) == 1
+
+    def clear(self):
+        self._db.execute("DELETE FROM cache")
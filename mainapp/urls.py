@@ -1,7 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from forum.slow_queries import slow_queries_view
+
+from .metrics import metrics_view
+
 urlpatterns = [
+    path('admin/slow-queries/', admin.site.admin_view(slow_queries_view), name='slow-queries'),
     path('admin/', admin.site.urls),
     path('api/', include('forum.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]